@@ -109,6 +109,7 @@ import ECC
 import Google
 import GoogleAuth
 import googleapiclient
+import migration_manifest
 
 from oauth2client import tools
 from apiclient.errors import HttpError
@@ -145,7 +146,8 @@ class GFile:
         else:
             return f"Unknown MIGRATION value ({val})"
 
-    def __init__(self, id, mimeType, name, kind, webViewLink, parent_ids, parent_gfile):
+    def __init__(self, id, mimeType, name, kind, webViewLink, parent_ids, parent_gfile,
+                 md5Checksum=None, size=None):
         self.id = id                       # string
         self.name = name                   # string
         self.mimeType = mimeType           # string
@@ -153,6 +155,8 @@ class GFile:
         self.webViewLink = webViewLink     # string (URL)
         self.parent_ids = parent_ids       # list of all parent ID strings (from Google)
         self.parent_gfile = parent_gfile   # GFile (just this object's single parent GFile)
+        self.md5Checksum = md5Checksum     # string or None (Google docs/folders have no checksum)
+        self.size = size                   # int or None
 
         #------------------------------------------------------------------
         # This information will be set after __init__.
@@ -297,7 +301,30 @@ def create_folder(service, parent_folder, new_folder_name):
 
 #-------------------------------------------------------------------
 
-def migrate(service, source_root, dest_root):
+# Look for an entry with a given name and mime type in a destination
+# folder.  Used when resuming a migration and the manifest says we
+# started to migrate an entry but does not know if we finished.
+def find_in_dest_folder(service, name, mimeType, dest_folder):
+    escaped = name.replace('\\', '\\\\').replace("'", "\\'")
+    query = (f"'{dest_folder.id}' in parents and name='{escaped}' and "
+             f"mimeType='{mimeType}' and trashed=false")
+    response = doit(service.files()
+                    .list(q=query,
+                          corpora='allDrives',
+                          includeItemsFromAllDrives=True,
+                          supportsAllDrives=True,
+                          fields='files(id,md5Checksum)'))
+    if response is None:
+        return None
+
+    files = response.get('files', [])
+    if len(files) == 0:
+        return None
+    return files[0]
+
+#-------------------------------------------------------------------
+
+def migrate(service, source_root, dest_root, manifest):
 
     def _move_file(service, source_file, dest_folder):
         migrated_file = doit(service
@@ -306,10 +333,13 @@ def migrate(service, source_root, dest_root):
                                     addParents=dest_folder.id,
                                     removeParents=source_file.parent_gfile.id,
                                     supportsAllDrives=True,
-                                    fields='id'),
+                                    fields='id,md5Checksum'),
                             can_fail=True)
         if migrated_file is not None:
             log.info("--> Moved!")
+            manifest.finish(source_file.id, migration_manifest.STATE_MOVED,
+                            migrated_file['id'],
+                            dest_checksum=migrated_file.get('md5Checksum'))
             return True
         else:
             return False
@@ -323,11 +353,42 @@ def migrate(service, source_root, dest_root):
                                  body={ 'parents' : [ dest_folder.id ],
                                         'name' : source_file.name },
                                  supportsAllDrives=True,
-                                 fields='id'))
+                                 fields='id,md5Checksum'))
         if copied_file is None:
             log.error("ERROR: Failed to copy file!")
+            manifest.fail(source_file.id, "Failed to copy file")
         else:
             log.info("--> Copied")
+            manifest.finish(source_file.id, migration_manifest.STATE_COPIED,
+                            copied_file['id'],
+                            dest_checksum=copied_file.get('md5Checksum'))
+
+    #---------------------------------------------------------------
+
+    # If the manifest says that we started -- but did not finish -- to
+    # migrate this entry on a prior run, see if it made it to the
+    # destination.
+    def _finished_on_prior_run(service, entry, dest_folder):
+        prior = manifest.get(entry.id)
+        if prior is None or prior['state'] != migration_manifest.STATE_STARTED:
+            return False
+
+        found = find_in_dest_folder(service, entry.name, entry.mimeType,
+                                    dest_folder)
+        if found is None:
+            return False
+
+        if (entry.md5Checksum is not None and
+            found.get('md5Checksum') is not None and
+            entry.md5Checksum != found['md5Checksum']):
+            return False
+
+        log.info(f"--> Was migrated on a prior run (ID: {found['id']})")
+        state = (migration_manifest.STATE_CREATED if entry.is_folder
+                 else migration_manifest.STATE_COPIED)
+        manifest.finish(entry.id, state, found['id'],
+                        dest_checksum=found.get('md5Checksum'))
+        return True
 
     #---------------------------------------------------------------
 
@@ -347,6 +408,9 @@ def migrate(service, source_root, dest_root):
 
             elif entry.migration_state == GFile.MIGRATION_FILE_ALREADY_MIGRATED:
                 log.info(f"Already migrated: {entry.relative_name()} file")
+                if entry.migrated_gfile is not None:
+                    manifest.existed(entry.id, entry.name, False,
+                                     entry.migrated_gfile.id)
             elif entry.migration_state == GFile.MIGRATION_FILE_NEED_TO_MIGRATE:
                 log.info(f"NEED TO MIGRATE:  {entry.relative_name()} file")
 
@@ -355,6 +419,12 @@ def migrate(service, source_root, dest_root):
                     log.error("How is the dest folder None????")
                     exit(1)
 
+                if _finished_on_prior_run(service, entry, dest_folder):
+                    continue
+
+                manifest.start(entry.id, entry.name, False,
+                               checksum=entry.md5Checksum, size=entry.size)
+
                 # Try to move the file to the shared drive
                 moved = _move_file(service, entry, dest_folder)
 
@@ -379,6 +449,9 @@ def migrate(service, source_root, dest_root):
 
             elif entry.migration_state == GFile.MIGRATION_FOLDER_ALREADY_CREATED:
                 log.info(f"Already created:  {entry.relative_name()} folder")
+                if entry.migrated_gfile is not None:
+                    manifest.existed(entry.id, entry.name, True,
+                                     entry.migrated_gfile.id)
             elif entry.migration_state == GFile.MIGRATION_FOLDER_NEED_TO_CREATE:
                 log.info(f"NEED TO CREATE:   {entry.relative_name()} folder")
 
@@ -390,8 +463,16 @@ def migrate(service, source_root, dest_root):
                 if dest_parent_folder is None:
                     # If we're at the root, then the dest_parent_folder is the root
                     dest_parent_folder = dest_root
-                dest_folder = create_folder(service, dest_parent_folder, entry.name)
-                entry.migrated_gfile = dest_folder
+
+                if _finished_on_prior_run(service, entry, dest_parent_folder):
+                    entry.migrated_gfile = manifest_dest_gfile(manifest.get(entry.id),
+                                                               entry, dest_parent_folder)
+                else:
+                    manifest.start(entry.id, entry.name, True)
+                    dest_folder = create_folder(service, dest_parent_folder, entry.name)
+                    manifest.finish(entry.id, migration_manifest.STATE_CREATED,
+                                    dest_folder.id)
+                    entry.migrated_gfile = dest_folder
 
             else:
                 log.error(f"Unknown file entry state: {GFile.state_name(entry.migration_state)}")
@@ -596,6 +677,20 @@ def link_src_dest(source_root, dest_root):
 
 #-------------------------------------------------------------------
 
+# Make a GFile for the destination of a source entry, from its
+# manifest entry.
+def manifest_dest_gfile(manifest_entry, source_entry, dest_parent_gfile):
+    return GFile(id=manifest_entry['dest_id'],
+                 mimeType=source_entry.mimeType,
+                 name=source_entry.name,
+                 kind=source_entry.kind,
+                 webViewLink=None,
+                 parent_ids=[ dest_parent_gfile.id ] if dest_parent_gfile else [],
+                 parent_gfile=dest_parent_gfile,
+                 md5Checksum=manifest_entry['dest_checksum'])
+
+#-------------------------------------------------------------------
+
 def create_index_by_id(folder, ids):
     for id, entry in folder.folder_contents_by_id.items():
         ids[id] = entry
@@ -605,110 +700,155 @@ def create_index_by_id(folder, ids):
 
 #-------------------------------------------------------------------
 
+# Read the entire folder tree under source_folder (breadth-first, with
+# several concurrent Drive queries; see Google.walk_drive_tree()).
 def google_read_folder_tree(service, source_folder):
-    log.info(f'Discovering contents of folder: {source_folder.relative_name()} (ID: {source_folder.id})')
+    log.info(f'Discovering contents of folder tree: {source_folder.relative_name()} (ID: {source_folder.id})')
 
     num_folders = 0
     num_files = 0
 
-    # Iterate through everything in this root folder
+    # Folders that we have traversed, indexed by ID
+    folders = { source_folder.id : source_folder }
+
+    # All the files we have seen in this tree
     all_file_ids = dict()
-    page_token = None
-    query = f"'{source_folder.id}' in parents and trashed=false"
-    log.debug(f"Query: {query}")
-    while True:
-        response = doit(service.files()
-                        .list(q=query,
-                              corpora='allDrives',
-                              includeItemsFromAllDrives=True,
-                              fields='nextPageToken,files(name,id,kind,mimeType,parents,webViewLink)',
-                              pageToken=page_token,
-                              supportsAllDrives=True))
-
-        # Iterate through each of the files found
-        sentinel = '000 DO NOT MIGRATE'
-        for file in response.get('files', []):
-            log.info(f'Found: "{file["name"]}" (ID: {file["id"]})')
-
-            # SPECIAL EXCEPTION:
-            # Skip any folder named "000 DO NOT MIGRATE"
-            if file['name'] == sentinel:
-                log.warning(f"Found file with sentinel name ('{sentinel}') -- skipping!")
-                continue
 
-            # Save this content entry in the list of contents for this
-            # folder
-            gfile = GFile(id=file['id'],
-                          mimeType=file['mimeType'],
-                          name=file['name'],
-                          kind=file['kind'],
-                          webViewLink=file['webViewLink'],
-                          parent_ids=file['parents'],
-                          parent_gfile=source_folder)
-
-            # gfile.is_folder and gfile.traverse both default to False
-            if file['mimeType'] == Google.mime_types['folder']:
-                gfile.is_folder = True
-                num_folders += 1
-            else:
-                num_files += 1
+    # Folders that we have seen before under another parent in this
+    # tree.  The walker only lists each folder once, so these get a
+    # copy of the contents of the traversed folder after the walk.
+    folder_copies = list()
 
-            # We have already seen this file before
-            if file['id'] in all_file_ids:
-                log.debug('--- We already know this file; cross-referencing...')
+    sentinel = '000 DO NOT MIGRATE'
 
-                # If this is a folder that we already know, then do
-                # not traverse down into it (again).
-                if gfile.is_folder:
-                    log.debug('--- Is a folder, but we already know it; NOT adding to pending traversal list')
+    def _visit(parent_id, file):
+        nonlocal num_folders, num_files
 
-            # We have *NOT* already seen this file before
-            else:
-                log.debug('--- We do not already know this file; saving...')
-                all_file_ids[file['id']] = gfile
-                # Admittedly, this is a hack.  But it works. :-)
-                # Google filenames cannot contain newlines, so an easy way to
-                # hash a list of Google filenames is to join them by \n.
-                all_file_ids['\n'.join(gfile.relative_name())] = gfile
-
-                # If it's a folder, add it to the pending traversal list
-                if gfile.is_folder:
-                    gfile.traverse = True
-                    log.debug("--- Is a folder; adding to pending traversal list")
-
-            # Add this gfile to the parent folder's dict of lists of GFiles
-            # (because multiple files in the same folder can have the same name)
-            if gfile.name not in source_folder.folder_contents_by_name:
-                source_folder.folder_contents_by_name[gfile.name] = list()
-            source_folder.folder_contents_by_name[gfile.name].append(gfile)
-
-            # The folder_contents_by_id entries are GFiles (not lists of
-            # GFiles), because there can never be two files with the same ID in
-            # the same folder.  But check for this error condition, anyway.
-            if gfile.id in source_folder.folder_contents_by_id:
-                log.error("Somehow there's two files with the same ID in this source folder!")
-                log.error(f"Folder: {source_folder.relative_name()} (ID: {source_folder.id})")
-                f1 = source_folder.folder_contents_by_id[gfile.id]
-                log.error(f"File 1: {f1.relative_name()} (ID: {f1.id})")
-                log.error(f"File 2: {gfile.relative_name()} (ID: {gfile.id})")
-                log.error("Cannot continue")
-                exit(1)
+        parent_folder = folders[parent_id]
+        log.info(f'Found: "{file["name"]}" (ID: {file["id"]})')
 
-            source_folder.folder_contents_by_id[gfile.id] = gfile
+        # SPECIAL EXCEPTION:
+        # Skip any folder named "000 DO NOT MIGRATE"
+        if file['name'] == sentinel:
+            log.warning(f"Found file with sentinel name ('{sentinel}') -- skipping!")
+            return False
+
+        # Save this content entry in the list of contents for this
+        # folder
+        gfile = GFile(id=file['id'],
+                      mimeType=file['mimeType'],
+                      name=file['name'],
+                      kind=file['kind'],
+                      webViewLink=file['webViewLink'],
+                      parent_ids=file['parents'],
+                      parent_gfile=parent_folder,
+                      md5Checksum=file.get('md5Checksum'),
+                      size=int(file['size']) if 'size' in file else None)
+
+        # gfile.is_folder and gfile.traverse both default to False
+        if file['mimeType'] == Google.mime_types['folder']:
+            gfile.is_folder = True
+            num_folders += 1
+        else:
+            num_files += 1
+
+        # We have already seen this file before
+        if file['id'] in all_file_ids:
+            log.debug('--- We already know this file; cross-referencing...')
+
+            # If this is a folder that we already know, then do
+            # not list it (again), but do give this parent its own copy
+            # of the folder's contents after the walk -- each parent
+            # needs the whole folder.
+            if gfile.is_folder:
+                log.debug('--- Is a folder, but we already know it; NOT adding to pending traversal list')
+                gfile.traverse = True
+                folder_copies.append(gfile)
+
+        # We have *NOT* already seen this file before
+        else:
+            log.debug('--- We do not already know this file; saving...')
+            all_file_ids[file['id']] = gfile
+            # Admittedly, this is a hack.  But it works. :-)
+            # Google filenames cannot contain newlines, so an easy way to
+            # hash a list of Google filenames is to join them by \n.
+            all_file_ids['\n'.join(gfile.relative_name())] = gfile
+
+            # If it's a folder, add it to the pending traversal list
+            if gfile.is_folder:
+                gfile.traverse = True
+                folders[gfile.id] = gfile
+                log.debug("--- Is a folder; adding to pending traversal list")
+
+        # Add this gfile to the parent folder's dict of lists of GFiles
+        # (because multiple files in the same folder can have the same name)
+        if gfile.name not in parent_folder.folder_contents_by_name:
+            parent_folder.folder_contents_by_name[gfile.name] = list()
+        parent_folder.folder_contents_by_name[gfile.name].append(gfile)
+
+        # The folder_contents_by_id entries are GFiles (not lists of
+        # GFiles), because there can never be two files with the same ID in
+        # the same folder.  But check for this error condition, anyway.
+        if gfile.id in parent_folder.folder_contents_by_id:
+            log.error("Somehow there's two files with the same ID in this source folder!")
+            log.error(f"Folder: {parent_folder.relative_name()} (ID: {parent_folder.id})")
+            f1 = parent_folder.folder_contents_by_id[gfile.id]
+            log.error(f"File 1: {f1.relative_name()} (ID: {f1.id})")
+            log.error(f"File 2: {gfile.relative_name()} (ID: {gfile.id})")
+            log.error("Cannot continue")
+            exit(1)
+
+        parent_folder.folder_contents_by_id[gfile.id] = gfile
+
+        # Tell the walker whether to traverse down into this folder (only
+        # the first time we see it)
+        return gfile.traverse and folders.get(gfile.id) is gfile
+
+    Google.walk_drive_tree(service, [source_folder.id], _visit, log,
+                           file_fields='name,id,kind,mimeType,parents,webViewLink,md5Checksum,size',
+                           list_kwargs={
+                               'corpora' : 'allDrives',
+                               'includeItemsFromAllDrives' : True,
+                               'supportsAllDrives' : True,
+                           },
+                           max_workers=args.workers)
+
+    # Copy the contents of the traversed folders into the other
+    # places where they appear in the tree
+    def _copy_contents(source, dest):
+        nonlocal num_folders, num_files
+
+        for entries in source.folder_contents_by_name.values():
+            for entry in entries:
+                gfile = GFile(id=entry.id,
+                              mimeType=entry.mimeType,
+                              name=entry.name,
+                              kind=entry.kind,
+                              webViewLink=entry.webViewLink,
+                              parent_ids=entry.parent_ids,
+                              parent_gfile=dest,
+                              md5Checksum=entry.md5Checksum,
+                              size=entry.size)
+                gfile.is_folder = entry.is_folder
+                gfile.traverse  = entry.traverse
+                if gfile.is_folder:
+                    num_folders += 1
+                else:
+                    num_files += 1
 
-        page_token = response.get('nextPageToken', None)
-        if page_token is None:
-            break
+                if gfile.name not in dest.folder_contents_by_name:
+                    dest.folder_contents_by_name[gfile.name] = list()
+                dest.folder_contents_by_name[gfile.name].append(gfile)
+                dest.folder_contents_by_id[gfile.id] = gfile
 
-    # Traverse all the sub folders
-    for name, entries in source_folder.folder_contents_by_name.items():
-        for entry in entries:
-            if entry.traverse:
-                log.debug(f"Traversing down into {entry.relative_name()}")
-                nfolders, nfiles = google_read_folder_tree(service, entry)
+                # Always copy from the traversed folder (the entry may
+                # itself be a copy that has not been filled in yet)
+                if gfile.traverse:
+                    _copy_contents(folders[gfile.id], gfile)
 
-                num_folders += nfolders
-                num_files += nfiles
+    for gfile in folder_copies:
+        log.debug(f"Copying contents of {gfile.relative_name()} (ID: {gfile.id}) from its other parent")
+        _copy_contents(folders[gfile.id], gfile)
 
     return num_folders, num_files
 
@@ -775,6 +915,15 @@ def add_cli_args():
                                  action='store_true',
                                  help='If any file or folder has multiple parents, ignore them and proceed with the conversion anyway (multi-parent files/folders will NOT be put in the destination)')
 
+    tools.argparser.add_argument('--manifest',
+                                 default='migration-manifest.sqlite3',
+                                 help='SQLite3 file recording the progress of the migration (kept separately for each source / destination folder pair); re-running with the same manifest resumes from where it left off')
+
+    tools.argparser.add_argument('--workers',
+                                 type=int,
+                                 default=4,
+                                 help='Number of concurrent Google Drive queries to use when reading folder trees')
+
     tools.argparser.add_argument('--logfile',
                                  required=False,
                                  help='Store verbose/debug logging to the specified file')
@@ -845,6 +994,15 @@ def main():
             log.error("These files/folders must be converted to having a single parent before converting over to a shared Drive.")
             return 1
 
+    manifest = migration_manifest.MigrationManifest(args.manifest,
+                                                    source_folder.id,
+                                                    dest_folder.id, log)
+
+    # Always read the dest tree, even when resuming from the manifest:
+    # a prior run may have died after putting something at the dest but
+    # before recording it in the manifest.  The dest tree is what
+    # decides what still needs to be migrated; the manifest is used to
+    # check entries that a prior run left "started" (see migrate()).
     log.info("=== Reading dest folder tree")
     dest_num_folders, dest_num_files = google_read_folder_tree(service, dest_folder)
     dest_files_by_id = dict()
@@ -869,7 +1027,10 @@ def main():
 
     # Actually do the migration
     log.info("=== Migrating files...")
-    migrate(service, source_folder, dest_folder)
+    migrate(service, source_folder, dest_folder, manifest)
+
+    manifest.report()
+    manifest.close()
 
 if __name__ == '__main__':
     exit(main())
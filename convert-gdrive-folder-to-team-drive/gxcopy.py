@@ -43,6 +43,19 @@ import logging
 import logging.handlers
 import traceback
 
+# We assume that there is a "ecc-python-modules" sym link in this
+# directory that points to the directory with ECC.py and friends.
+moddir = os.path.join(os.getcwd(), 'ecc-python-modules')
+if not os.path.exists(moddir):
+    print("ERROR: Could not find the ecc-python-modules directory.")
+    print("ERROR: Please make a ecc-python-modules sym link and run again.")
+    exit(1)
+
+sys.path.insert(0, moddir)
+
+import Google
+import migration_manifest
+
 from pprint import pprint
 
 from recordclass import recordclass
@@ -63,6 +76,7 @@ sheet_mime_type = 'application/vnd.google-apps.spreadsheet';
 folder_mime_type = 'application/vnd.google-apps.folder'
 args = None
 log = None
+manifest = None
 # JMS this is probably a lie, but it's useful for comparisons
 team_drive_mime_type = 'application/vnd.google-apps.team_drive'
 # Scopes documented here:
@@ -288,6 +302,50 @@ def create_folder(service, parent_folder, new_folder_name):
 
 #-------------------------------------------------------------------
 
+# Look for a file / folder with this name and mime type in the Team
+# Drive folder.  Returns the Google file resource, or None.
+def find_in_team_folder(service, name, mimeType, team_folder):
+    escaped = name.replace('\\', '\\\\').replace("'", "\\'")
+    query = (f"'{team_folder.id}' in parents and name='{escaped}' and "
+             f"mimeType='{mimeType}' and trashed=false")
+    response = doit(service.files()
+                    .list(q=query,
+                          corpora='allDrives',
+                          includeItemsFromAllDrives=True,
+                          supportsAllDrives=True,
+                          fields='files(id,md5Checksum)'))
+    if response is None:
+        return None
+
+    files = response.get('files', [])
+    if len(files) == 0:
+        return None
+    return files[0]
+
+# If the manifest says that we started -- but did not finish -- to
+# migrate this entry on a prior run, see if it made it to the Team
+# Drive.  If it did, record it as done in the manifest and return the
+# manifest entry; otherwise, return None.
+def finished_on_prior_run(service, source_entry, team_folder):
+    source_id = source_entry.gfile.id
+    prior = manifest.get(source_id)
+    if prior is None or prior['state'] != migration_manifest.STATE_STARTED:
+        return None
+
+    found = find_in_team_folder(service, source_entry.gfile.name,
+                                source_entry.gfile.mimeType, team_folder)
+    if found is None:
+        return None
+
+    log.debug(f"--> Was migrated on a prior run (ID: {found['id']})")
+    state = (migration_manifest.STATE_CREATED if source_entry.is_folder
+             else migration_manifest.STATE_COPIED)
+    manifest.finish(source_id, state, found['id'],
+                    dest_checksum=found.get('md5Checksum'))
+    return manifest.get(source_id)
+
+#-------------------------------------------------------------------
+
 # Traverse the source tree.  For each entry:
 #
 # - If it's a folder, make the corresponding folder in the Team Drive
@@ -327,6 +385,19 @@ def migrate_file_to_team_drive(service, source_root, team_root,
               .format(source=source_root.root_folder.name,
                       file=source_file_entry.gfile.name))
 
+    # If a prior run already migrated this file, skip it
+    if manifest.done(source_file_entry.gfile.id):
+        log.debug("--> Already migrated (according to the manifest)")
+        return
+
+    # If a prior run died partway through migrating this file, it may
+    # have already made it to the Team Drive
+    if finished_on_prior_run(service, source_file_entry, team_root):
+        return
+
+    manifest.start(source_file_entry.gfile.id, source_file_entry.gfile.name,
+                   False)
+
     # Try to move the file to the team drive
     moved = move_file_to_team_drive(service, source_root, team_root,
                                     all_files, source_file_entry)
@@ -344,10 +415,14 @@ def move_file_to_team_drive(service, source_root, team_root,
 				 addParents=team_root.id,
 				 removeParents=source_file_entry.gfile.parents[0],
                                  supportsTeamDrives=True,
-				 fields='id'),
+				 fields='id,md5Checksum'),
                          can_fail=True)
     if migrated_file is not None:
         log.debug("--> Moved!")
+        manifest.finish(source_file_entry.gfile.id,
+                        migration_manifest.STATE_MOVED,
+                        migrated_file['id'],
+                        dest_checksum=migrated_file.get('md5Checksum'))
         return True
     else:
         return False
@@ -360,12 +435,17 @@ def copy_file_to_team_drive(service, source_root, team_root,
                              body={ 'parents' : [team_root.id],
                                     'name' : source_file_entry.gfile.name },
                              supportsTeamDrives=True,
-                             fields='id'))
+                             fields='id,md5Checksum'))
     if copied_file is None:
         print("ERROR: Failed to copy file!")
+        manifest.fail(source_file_entry.gfile.id, "Failed to copy file")
         exit(1)
     else:
         log.debug("--> Copied")
+        manifest.finish(source_file_entry.gfile.id,
+                        migration_manifest.STATE_COPIED,
+                        copied_file['id'],
+                        dest_checksum=copied_file.get('md5Checksum'))
 
 def make_folder_in_team_drive(service, source_root, team_root,
                                  all_files, source_folder_entry):
@@ -373,10 +453,29 @@ def make_folder_in_team_drive(service, source_root, team_root,
                   .format(old=source_root.root_folder.name,
                           new=source_folder_entry.gfile.name))
 
-    # Make the folder in the Team Drive
+    # Make the folder in the Team Drive (unless a prior run already
+    # made it)
     source_id = source_folder_entry.gfile.id
-    team_folder = create_folder(service, team_root,
-                                source_folder_entry.gfile.name)
+    prior = manifest.done(source_id)
+    if not prior:
+        # If a prior run died partway through creating this folder, it
+        # may have already been created in the Team Drive
+        prior = finished_on_prior_run(service, source_folder_entry, team_root)
+    if prior:
+        log.debug("--> Already created (according to the manifest)")
+        team_folder = GFile(id=prior['dest_id'],
+                            mimeType=folder_mime_type,
+                            name=source_folder_entry.gfile.name,
+                            parents=[ team_root.id ],
+                            webViewLink=None,
+                            team_file=None)
+        team_folder.team_file = team_folder
+    else:
+        manifest.start(source_id, source_folder_entry.gfile.name, True)
+        team_folder = create_folder(service, team_root,
+                                    source_folder_entry.gfile.name)
+        manifest.finish(source_id, migration_manifest.STATE_CREATED,
+                        team_folder.id)
     all_files[source_id].team_file = team_folder
 
     # Traverse into the source subfolder
@@ -489,107 +588,109 @@ def traverse_multiparents(service, root, all_files, seen):
 #       .parent_folder_url: None (*may* be populated later)
 #    .team_file: None (will be populated later)
 #
-def read_source_tree(service, prefix, root_folder, all_files = dict()):
-    log.info('Discovering contents of folder: "{0}" (ID: {1})'
+# The tree is read breadth-first, with several concurrent Drive
+# queries (see Google.walk_drive_tree()).
+#
+def read_source_tree(service, prefix, root_folder, all_files = None):
+    log.info('Discovering contents of folder tree: "{0}" (ID: {1})'
              .format(root_folder.name, root_folder.id))
 
-    parent_folder_name_abs = '{0}/{1}'.format(prefix, root_folder.name)
-    log.debug('parent folder name abs: {0}=={1}'
-              .format(prefix, root_folder.name))
-    tree = Tree(root_folder=root_folder, contents=[])
+    if all_files is None:
+        all_files = dict()
 
-    # Iterate through everything in this root folder
-    page_token = None
-    query = "'{0}' in parents and trashed=false".format(root_folder.id)
-    log.debug("Query: {0}".format(query))
-    while True:
-        response = doit(service.files()
-                        .list(q=query,
-                              spaces='drive',
-                              corpora='user',
-                              fields='nextPageToken,files(name,id,mimeType,parents,webViewLink)',
-                              pageToken=page_token,
-                              supportsTeamDrives=True))
-        for file in response.get('files', []):
-            log.info('Found: "{0}"'.format(file['name']))
-            id = file['id']
-            traverse = False
-            is_folder = False
-            if file['mimeType'] == folder_mime_type:
-                is_folder = True
-
-            # We have already seen this file before
-            if id in all_files:
-                log.debug('--- We already know this file; cross-referencing...')
-
-                # If this is a folder that we already know, then do
-                # not traverse down into it (again).
-                if is_folder:
-                    log.debug('--- Is a folder, but we already know it; NOT adding to pending traversal list')
-                    traverse = False
-
-            # We have *NOT* already seen this file before
-            else:
-                log.debug('--- We do not already know this file; saving...')
-                all_files[id] = AllFiles(name=file['name'],
-                                         webViewLink=file['webViewLink'],
-                                         parents=[],
-                                         team_file=None)
-
-                # If it's a folder, add it to the pending traversal list
-                if is_folder:
-                    traverse = True
-                    log.debug("--- Is a folder; adding to pending traversal list")
-
-            # Save this content entry in the list of contents for this
-            # folder
-            gfile = GFile(id=id,
-                          mimeType=file['mimeType'],
-                          webViewLink=file['webViewLink'],
-                          name=file['name'],
-                          parents=file['parents'],
-                          team_file=None)
-            content_entry = ContentEntry(gfile=gfile,
-                                         is_folder=is_folder,
-                                         traverse=traverse,
-                                         contents=[],
-                                         tree=None)
-            tree.contents.append(content_entry)
-
-            # JMS delete me
-            log.debug("Created gfile for content entry: {0}"
-                      .format(gfile))
-
-            # Save this file in the master list of *all* files found.
-            # Basically, add a parent listing to this ID in the
-            # all_files index.
-            parent_wvl = '<Unknown>'
-            if root_folder.id in all_files:
-                parent_wvl = all_files[root_folder.id].webViewLink
-
-            parent = Parent(id=root_folder.id, name=root_folder.name,
-                            name_abs=parent_folder_name_abs,
-                            webViewLink=parent_wvl)
-            all_files[id].parents.append(parent)
+    root_tree = Tree(root_folder=root_folder, contents=[])
 
-        page_token = response.get('nextPageToken', None)
-        if page_token is None:
-            break
+    # Trees (and their absolute names) of the folders that we are
+    # traversing, indexed by folder ID
+    trees = { root_folder.id : root_tree }
+    names_abs = { root_folder.id : '{0}/{1}'.format(prefix, root_folder.name) }
+
+    def _visit(parent_id, file):
+        tree = trees[parent_id]
+        parent_folder = tree.root_folder
+        parent_folder_name_abs = names_abs[parent_id]
+
+        log.info('Found: "{0}"'.format(file['name']))
+        id = file['id']
+        traverse = False
+        is_folder = False
+        if file['mimeType'] == folder_mime_type:
+            is_folder = True
+
+        # We have already seen this file before
+        if id in all_files:
+            log.debug('--- We already know this file; cross-referencing...')
 
-    # Traverse all the sub folders
-    for entry in tree.contents:
-        if entry.traverse:
+            # If this is a folder that we already know, then do
+            # not traverse down into it (again).
+            if is_folder:
+                log.debug('--- Is a folder, but we already know it; NOT adding to pending traversal list')
+                traverse = False
+
+        # We have *NOT* already seen this file before
+        else:
+            log.debug('--- We do not already know this file; saving...')
+            all_files[id] = AllFiles(name=file['name'],
+                                     webViewLink=file['webViewLink'],
+                                     parents=[],
+                                     team_file=None)
+
+            # If it's a folder, add it to the pending traversal list
+            if is_folder:
+                traverse = True
+                log.debug("--- Is a folder; adding to pending traversal list")
+
+        # Save this content entry in the list of contents for this
+        # folder
+        gfile = GFile(id=id,
+                      mimeType=file['mimeType'],
+                      webViewLink=file['webViewLink'],
+                      name=file['name'],
+                      parents=file['parents'],
+                      team_file=None)
+        content_entry = ContentEntry(gfile=gfile,
+                                     is_folder=is_folder,
+                                     traverse=traverse,
+                                     contents=[],
+                                     tree=None)
+        tree.contents.append(content_entry)
+
+        # Save this file in the master list of *all* files found.
+        # Basically, add a parent listing to this ID in the
+        # all_files index.
+        parent_wvl = '<Unknown>'
+        if parent_folder.id in all_files:
+            parent_wvl = all_files[parent_folder.id].webViewLink
+
+        parent = Parent(id=parent_folder.id, name=parent_folder.name,
+                        name_abs=parent_folder_name_abs,
+                        webViewLink=parent_wvl)
+        all_files[id].parents.append(parent)
+
+        # Make the sub-tree that the walker will fill in when it
+        # traverses down into this folder
+        if traverse:
             new_prefix = '{0}/{1}'.format(parent_folder_name_abs,
-                                          entry.gfile.name)
-            log.debug("== Traversing down into {0}"
-                          .format(new_prefix))
-            (t, all_files) = read_source_tree(service,
-                                              parent_folder_name_abs,
-                                              entry.gfile, all_files)
-            entry.tree = t
+                                          gfile.name)
+            log.debug("== Will traverse down into {0}"
+                      .format(new_prefix))
+            content_entry.tree = Tree(root_folder=gfile, contents=[])
+            trees[id] = content_entry.tree
+            names_abs[id] = new_prefix
+
+        return traverse
+
+    Google.walk_drive_tree(service, [root_folder.id], _visit, log,
+                           file_fields='name,id,mimeType,parents,webViewLink',
+                           list_kwargs={
+                               'spaces' : 'drive',
+                               'corpora' : 'user',
+                               'supportsTeamDrives' : True,
+                           },
+                           max_workers=args.workers)
 
     # Done!
-    return (tree, all_files)
+    return (root_tree, all_files)
 
 #-------------------------------------------------------------------
 
@@ -715,6 +816,15 @@ def add_cli_args():
                                  action='store_true',
                                  help='If any file or folder has multiple parents, ignore them and proceed with the conversion anyway (multi-parent files/folders will NOT be put in the new Team Drive)')
 
+    tools.argparser.add_argument('--manifest',
+                                 default='gxcopy-manifest.sqlite3',
+                                 help='SQLite3 file recording the progress of the copy; re-running with the same manifest resumes from where it left off')
+
+    tools.argparser.add_argument('--workers',
+                                 type=int,
+                                 default=4,
+                                 help='Number of concurrent Google Drive queries to use when reading the source tree')
+
     tools.argparser.add_argument('--verbose',
                                  action='store_true',
                                  help='Be a bit verbose in what the script is doing')
@@ -783,10 +893,20 @@ def main():
     if team_drive is None:
         team_drive = create_team_drive(service, source_folder)
 
+    # Record progress in the manifest so that an interrupted run can
+    # be resumed
+    global manifest
+    manifest = migration_manifest.MigrationManifest(args.manifest,
+                                                    source_folder.id,
+                                                    team_drive.id, log)
+
     # Create a folder tree skeleton in the new Team Drive (i.e., just
     # folders -- no files yet).
     migrate_to_team_drive(service, source_root, team_drive, all_files)
 
+    manifest.report()
+    manifest.close()
+
     log.debug("END OF MAIN")
 
 if __name__ == '__main__':
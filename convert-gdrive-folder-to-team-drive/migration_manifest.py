@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+#
+# Persistent SQLite manifest of a Google Drive folder migration.
+#
+# Each source file / folder gets one row per migration (i.e., per
+# source root folder and destination root folder, so that one manifest
+# file can hold several migrations without mixing them up), recording
+# its destination ID, its state, its MD5 checksum (when Google has one), and when we
+# started / finished migrating it.  Every change is committed
+# immediately, so if the migration dies partway through (crash, quota
+# error, laptop goes to sleep...), the next run can pick up where the
+# last one left off without re-checking everything that was already
+# migrated.
+#
+
+import time
+import sqlite3
+
+#-------------------------------------------------------------------
+
+# States of an entry in the manifest
+STATE_STARTED = 'started'    # We started to migrate it, but don't know if it finished
+STATE_MOVED   = 'moved'      # File was moved to the destination
+STATE_COPIED  = 'copied'     # File was copied to the destination
+STATE_CREATED = 'created'    # Folder was created at the destination
+STATE_EXISTED = 'existed'    # Already existed at the destination before we started
+STATE_FAILED  = 'failed'     # We tried and failed
+
+# States that mean "this entry is done; don't touch it again"
+done_states = [ STATE_MOVED, STATE_COPIED, STATE_CREATED, STATE_EXISTED ]
+
+#-------------------------------------------------------------------
+
+class MigrationManifest:
+    def __init__(self, filename, source_root_id, dest_root_id, log):
+        self.filename     = filename
+        self.source_root  = source_root_id
+        self.dest_root    = dest_root_id
+        self.log          = log
+
+        self.conn = sqlite3.connect(filename)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+
+        # Manifests from before rows were kept per migration cannot be
+        # told apart; set them aside (the destination is always read
+        # again before anything is copied, so nothing is lost).
+        columns = [ row['name'] for row in
+                    self.conn.execute('PRAGMA table_info(manifest)') ]
+        if columns and 'source_root' not in columns:
+            log.warning(f"Migration manifest {filename} has entries not recorded per migration; renaming them to manifest_unscoped")
+            self.conn.execute('ALTER TABLE manifest RENAME TO manifest_unscoped')
+            self.conn.execute('DROP INDEX IF EXISTS manifest_state')
+
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS manifest (
+                                 source_root   TEXT,
+                                 dest_root     TEXT,
+                                 source_id     TEXT,
+                                 dest_id       TEXT,
+                                 name          TEXT,
+                                 is_folder     INTEGER,
+                                 state         TEXT,
+                                 checksum      TEXT,
+                                 dest_checksum TEXT,
+                                 size          INTEGER,
+                                 started       REAL,
+                                 finished      REAL,
+                                 error         TEXT,
+                                 PRIMARY KEY (source_root, dest_root, source_id)
+                             )''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS manifest_state
+                             ON manifest (source_root, dest_root, state)''')
+        self.conn.commit()
+
+        log.info(f"Opened migration manifest: {filename} ({self.count()} entries for source {source_root_id} -> destination {dest_root_id})")
+
+    def close(self):
+        self.conn.close()
+
+    def count(self):
+        cur = self.conn.execute('''SELECT COUNT(*) FROM manifest
+                                   WHERE source_root=? AND dest_root=?''',
+                                (self.source_root, self.dest_root))
+        return cur.fetchone()[0]
+
+    def get(self, source_id):
+        cur = self.conn.execute('''SELECT * FROM manifest
+                                   WHERE source_root=? AND dest_root=? AND source_id=?''',
+                                (self.source_root, self.dest_root, source_id))
+        return cur.fetchone()
+
+    # Return the manifest entry if this source ID has already been
+    # migrated, otherwise None.
+    def done(self, source_id):
+        entry = self.get(source_id)
+        if entry is not None and entry['state'] in done_states:
+            return entry
+        return None
+
+    # Record that we are about to migrate this source file / folder
+    def start(self, source_id, name, is_folder, checksum=None, size=None):
+        self.conn.execute('''INSERT INTO manifest
+                                 (source_root, dest_root, source_id, name,
+                                  is_folder, state, checksum, size, started)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                             ON CONFLICT(source_root, dest_root, source_id) DO UPDATE SET
+                                 state=excluded.state,
+                                 checksum=excluded.checksum,
+                                 size=excluded.size,
+                                 started=excluded.started,
+                                 finished=NULL,
+                                 error=NULL''',
+                          (self.source_root, self.dest_root, source_id, name,
+                           1 if is_folder else 0, STATE_STARTED, checksum,
+                           size, time.time()))
+        self.conn.commit()
+
+    def finish(self, source_id, state, dest_id, dest_checksum=None):
+        self.conn.execute('''UPDATE manifest
+                             SET state=?, dest_id=?, dest_checksum=?, finished=?
+                             WHERE source_root=? AND dest_root=? AND source_id=?''',
+                          (state, dest_id, dest_checksum, time.time(),
+                           self.source_root, self.dest_root, source_id))
+        self.conn.commit()
+
+    # Record a source file / folder that was found to already exist at
+    # the destination (e.g., by comparing the source and destination
+    # trees).
+    def existed(self, source_id, name, is_folder, dest_id):
+        now = time.time()
+        self.conn.execute('''INSERT OR IGNORE INTO manifest
+                                 (source_root, dest_root, source_id, dest_id,
+                                  name, is_folder, state, started, finished)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                          (self.source_root, self.dest_root, source_id,
+                           dest_id, name, 1 if is_folder else 0,
+                           STATE_EXISTED, now, now))
+        self.conn.commit()
+
+    def fail(self, source_id, error):
+        self.conn.execute('''UPDATE manifest
+                             SET state=?, error=?, finished=?
+                             WHERE source_root=? AND dest_root=? AND source_id=?''',
+                          (STATE_FAILED, str(error), time.time(),
+                           self.source_root, self.dest_root, source_id))
+        self.conn.commit()
+
+    # Log a summary of how much has been migrated and how fast
+    def report(self):
+        log = self.log
+
+        cur = self.conn.execute('''SELECT state,
+                                          COUNT(*) AS num,
+                                          SUM(COALESCE(size, 0)) AS bytes,
+                                          SUM(finished - started) AS seconds,
+                                          MIN(started) AS first,
+                                          MAX(finished) AS last
+                                   FROM manifest
+                                   WHERE source_root=? AND dest_root=?
+                                   GROUP BY state
+                                   ORDER BY state''',
+                                (self.source_root, self.dest_root))
+        rows = cur.fetchall()
+
+        log.info(f"Migration manifest summary ({self.filename}):")
+        if len(rows) == 0:
+            log.info("  Nothing has been migrated yet")
+            return
+
+        for row in rows:
+            line = f"  {row['state']:8}: {row['num']} entries, {row['bytes']} bytes"
+            if row['seconds'] and row['state'] in done_states:
+                line += f", {row['seconds']:.1f} seconds of API time"
+                line += f" ({row['num'] / row['seconds']:.2f} entries/sec)"
+            log.info(line)
+
+        cur = self.conn.execute('''SELECT MIN(started), MAX(finished), COUNT(*)
+                                   FROM manifest
+                                   WHERE source_root=? AND dest_root=?
+                                     AND finished IS NOT NULL''',
+                                (self.source_root, self.dest_root))
+        first, last, num = cur.fetchone()
+        if first and last and last > first:
+            log.info(f"  Overall: {num} entries in {last - first:.1f} seconds ({num / (last - first):.2f} entries/sec)")
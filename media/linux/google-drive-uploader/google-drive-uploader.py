@@ -28,6 +28,7 @@ sys.path.insert(0, moddir)
 
 import ECC
 import Google
+import ECCUploader
 
 import argparse
 
@@ -57,12 +58,47 @@ def google_login(args, log):
 
 #===================================================================
 
-def gd_upload_file(drive, dest_folder_id, upload_filename, log):
+# Return the Drive file in dest_folder_id with the same name and MD5
+# checksum as upload_filename, or None if there isn't one.  The local
+# file is only hashed here if there is a file with the same name;
+# otherwise, it is hashed as it is uploaded.
+def gd_find_identical_file(drive, dest_folder_id, upload_filename, hash_cache, log):
+    basename = ECCUploader.drive_query_escape(os.path.basename(upload_filename))
+    query = f"'{dest_folder_id}' in parents and title='{basename}' and trashed=false"
+    files = drive.ListFile({'q'                         : query,
+                            'supportsAllDrives'         : True,
+                            'includeItemsFromAllDrives' : True}).GetList()
+    if len(files) == 0:
+        return None
+
+    md5 = hash_cache.md5(upload_filename)
+    for file in files:
+        if file.get('md5Checksum') == md5:
+            return file
+
+    return None
+
+def gd_upload_file(drive, dest_folder_id, upload_filename, log,
+                   hash_cache=None):
+    # If we have a hash cache, we're in dedupe mode: don't upload
+    # files that are already in the target folder with the same
+    # contents.
+    if hash_cache is not None:
+        existing = gd_find_identical_file(drive, dest_folder_id,
+                                          upload_filename, hash_cache, log)
+        if existing:
+            basename = os.path.basename(upload_filename)
+            log.info(f'Identical file already in Google Drive; skipping: "{basename}" (Google Drive file ID {existing["id"]})')
+            return
+
     data = {
         'parents' : [ {'id' : dest_folder_id } ],
     }
     file = drive.CreateFile(data)
     file.SetContentFile(upload_filename)
+    # Hash the file as it is uploaded (instead of reading it twice)
+    file.content.close()
+    file.content = ECCUploader.HashingFile(upload_filename)
     try:
         file.Upload()
     except Exception as e:
@@ -71,6 +107,11 @@ def gd_upload_file(drive, dest_folder_id, upload_filename, log):
             exit(1)
         else:
             raise
+    finally:
+        file.content.close()
+
+    ECCUploader.check_uploaded_md5(upload_filename, file.content,
+                                   file.get('md5Checksum'), hash_cache, log)
 
     basename = os.path.basename(upload_filename)
     log.debug(f'Successfully uploaded file: "{basename}" --> Google Drive file ID {file["id"]}')
@@ -106,6 +147,13 @@ def add_cli_args():
                         required=True,
                         help='ID of target Google Folder')
 
+    parser.add_argument('--dedupe',
+                        action='store_true',
+                        help='Skip files that are already in the target folder with the same name and MD5 checksum')
+    parser.add_argument('--hash-cache',
+                        default=ECCUploader.hash_cache_filename,
+                        help='In --dedupe mode, file in which to remember MD5 checksums of local files (so unchanged files are not re-hashed)')
+
     parser.add_argument('--verbose',
                         required=False,
                         action='store_true',
@@ -149,10 +197,14 @@ def main():
                             slack_token_filename=args.slack_token_filename)
     check_cli_args(args, log)
 
+    hash_cache = None
+    if args.dedupe:
+        hash_cache = ECCUploader.HashCache(args.hash_cache)
+
     gauth, drive = google_login(args, log)
     for f in args.files:
         log.info("Uploading file: {f}".format(f=f))
-        gd_upload_file(drive, args.dest, f, log)
+        gd_upload_file(drive, args.dest, f, log, hash_cache=hash_cache)
 
     log.info("Finished uploading files")
 
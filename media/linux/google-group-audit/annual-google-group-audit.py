@@ -1,9 +1,5 @@
 #!/usr/bin/env python3
 
-#####################################################################
-# THIS SCRIPT CAN TAKE A VERY LONG TIME TO RUN -- e.g., 2-3 hours.
-#####################################################################
-#
 # This script makes a trivial CSV containing a list of all the Google
 # Groups in the epiphanycatholicchurch.org Google Workspace domain.
 # It includes columns for:
@@ -11,9 +7,9 @@
 # - group email address
 # - number of google shared drives using this group for permissions
 # - list of google shared drives using this group for permissions
-#   --> NOTE: itadmin doesn't have access to *all* ECC Google Shared
-#       Drives.  So this is not a 100% comprehensive list.  But it's a
-#       pretty good approximation.
+#   --> NOTE: this is based on the membership (i.e., permissions) of
+#       each Google Shared Drive, not on sharing of individual files
+#       inside the drives.
 # - group description
 # - number of members
 #
@@ -32,6 +28,7 @@
 import os
 import csv
 import sys
+import concurrent.futures
 
 # We assume that there is a "ecc-python-modules" sym link in this
 # directory that points to the directory with ECC.py and friends.
@@ -65,6 +62,7 @@ guser_cred_file = 'user-credentials.json'
 verbose = True
 debug = False
 logfile = "log.txt"
+workers = 8
 
 ####################################################################
 #
@@ -101,38 +99,78 @@ def find_all_google_shared_drives(service, log):
 
 #-------------------------------------------------------------------
 
-# See if a given email address has "read" access to any files in a
-# specific Google Shared Drive.
+# List all the permissions on a single Google Shared Drive.
 #
-# Return a list of the first 10 files that this email address has
-# "read" access to.
-@retry.Retry(predicate=Google.retry_errors)
-def query_shared_drive_for_reader(service, drive, address, log):
-    log.info(f"Searching contents of Google Shared Drive: {drive['name']} ({drive['id']}) for {address}")
+# This is run in a worker thread, so use a thread-private HTTP object.
+# Google.call_api() rate limits all the threads together.
+def list_shared_drive_permissions(service, drive, log):
+    log.info(f"Listing permissions of Google Shared Drive: {drive['name']} ({drive['id']})")
 
-    # We could iterate over all the pages of data, but really, we only
-    # need to know that a given email address is used in the
-    # permissions by *any* files.  As a courtesy, get the first 10
-    # files, but don't bother getting any more.
+    http        = GoogleAuth.thread_http(service)
+    permissions = list()
 
-    files = list()
-    try:
-        response = (service
-                    .files()
-                    .list(pageToken=None,
-                          pageSize=10,
-                          corpora='drive',
-                          q=f"trashed=false and '{address}' in readers",
-                          driveId=drive['id'],
-                          includeItemsFromAllDrives=True,
-                          supportsAllDrives=True)
-                    .execute())
-        files.extend(response.get('files', []))
-    except googleapiclient.errors.HttpError as e:
-        log.error(f"Got permission denied {drive['name']} ({drive['id']}) -- skipping")
+    # Iterate over all (pages of) permissions
+    page_token = None
+    while True:
+        request = (service
+                   .permissions()
+                   .list(fileId=drive['id'],
+                         pageToken=page_token,
+                         pageSize=100,
+                         supportsAllDrives=True,
+                         useDomainAdminAccess=True,
+                         fields='nextPageToken,permissions(id,type,role,emailAddress)'))
+        request.http = http
+        response = Google.call_api(request, log=log)
+        if response is None:
+            log.error(f"Got permission denied {drive['name']} ({drive['id']}) -- skipping")
+            break
+
+        permissions.extend(response.get('permissions', []))
 
-    log.debug(f"Found {len(files)} files in {drive['name']} ({drive['id']})")
-    return files
+        page_token = response.get('nextPageToken', None)
+        if page_token is None:
+            break
+
+    log.debug(f"Found {len(permissions)} permissions in {drive['name']} ({drive['id']})")
+    return permissions
+
+#-------------------------------------------------------------------
+
+# List the permissions of all the Google Shared Drives (concurrently)
+# and build an index of grantee email address -> list of drives (and
+# the role that the grantee has on each drive).
+def build_shared_drive_permission_index(service, drives, num_workers, log):
+    index = dict()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = {
+            executor.submit(list_shared_drive_permissions,
+                            service, drive, log) : drive
+            for drive in drives
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            drive = futures[future]
+            for permission in future.result():
+                email = permission.get('emailAddress')
+                if not email:
+                    continue
+
+                email = email.lower()
+                if email not in index:
+                    index[email] = list()
+                index[email].append({
+                    'drive' : drive,
+                    'role'  : permission['role'],
+                })
+
+    # Make the output deterministic, regardless of which thread
+    # finished first
+    for entries in index.values():
+        entries.sort(key=lambda entry: entry['drive']['name'])
+
+    return index
 
 #-------------------------------------------------------------------
 
@@ -181,7 +219,8 @@ def write_csv(groups, log_type, log):
             gsd = 'not yet discovered'
             if key in group:
                 num_gsd = group['drives']['num drives']
-                gsd = ', '.join([drive['name'] for drive in group['drives']['drives found']])
+                gsd = ', '.join([f"{entry['drive']['name']} ({entry['role']})"
+                                 for entry in group['drives']['drives found']])
 
             writer.writerow({
                 'Group email address' : group['email'],
@@ -224,6 +263,11 @@ def setup_cli_args():
     tools.argparser.add_argument('--logfile',
                                  default=logfile,
                                  help='Store verbose/debug logging to the specified file')
+    global workers
+    tools.argparser.add_argument('--workers',
+                                 type=int,
+                                 default=workers,
+                                 help='Number of Google Shared Drives to query concurrently')
 
     global args
     args = tools.argparser.parse_args()
@@ -281,51 +325,27 @@ def main():
     shared_drives = find_all_google_shared_drives(service_drive, log)
     log.info(f"Found {len(shared_drives)} Google Shared Drives")
 
-    log.warning("=================================================================")
-    log.warning("This may take a LONG time to run!")
-    log.warning("It may take an hour or three")
-    log.warning("=================================================================")
+    # List the permissions of each Google Shared Drive exactly once,
+    # and index them by grantee email address.
+    index = build_shared_drive_permission_index(service_drive, shared_drives,
+                                                args.workers, log)
+    log.info(f"Indexed {len(index)} grantees across {len(shared_drives)} Google Shared Drives")
 
-    # For each of the Google Groups, check each shared drive and see
-    # if that Group has read access (which is the lowest access) to
-    # any files in that Google Shared Drive.
+    # For each of the Google Groups, look up which Google Shared
+    # Drives it has access to (and with what role).
     for group in groups:
-        num_drives = 0
-        num_files = 0
-        drives_found = list()
-        for drive in shared_drives:
-            # Remember: we're only bothering to get the first 10 files
-            # in the drive that this group has access to (no need to
-            # get *all* files -- we really only care if there are >0
-            # files; we get the first 10 files just as a matter of
-            # course).
-            contents = query_shared_drive_for_reader(service_drive, drive,
-                                                     group['email'], log)
-            if len(contents) > 0:
-                num_drives += 1
-                num_files += len(contents)
-                drives_found.append(drive)
+        drives_found = index.get(group['email'].lower(), list())
 
         group['drives'] = {
-            'num files' : num_files,
-            'num drives' : num_drives,
+            'num drives' : len(drives_found),
             'drives found' : drives_found,
         }
-        if num_files == 0:
+        if len(drives_found) == 0:
             log.info(f"Did not find any Google Shared Drives readable by {group['email']}")
         else:
-            log.info(f"Found {num_drives} Google Shared Drives / {num_files} files readable by {group['email']}")
-
-        # Write out the results to a CSV as we go along.  This process
-        # takes a long time, so write out partial results as we go
-        # along, just in case something happens and this script aborts
-        # before it is able to complete the entire
-        # (num_groups*num_drives) examination process.
-        write_csv(groups, "partial results", log)
-
-    # Write out the final results.  This should be no different than
-    # the last CSV we wrote, but emit something slightly different for
-    # the log message.
+            log.info(f"Found {len(drives_found)} Google Shared Drives readable by {group['email']}")
+
+    # Write out the final results.
     write_csv(groups, "final results", log)
 
 if __name__ == '__main__':
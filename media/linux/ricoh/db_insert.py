@@ -6,8 +6,10 @@
 import os
 import csv
 import sys
+import time
 import sqlite3
 import argparse
+import calendar
 import datetime
 
 # Load the ECC python modules.  There will be a sym link off this directory.
@@ -132,9 +134,12 @@ def extract_csv_data(log, csv_rows):
 
 
 def open_db(log, filename):
-    # If the database exists, just open and return it
+    # If the database exists, just open it (and make sure that its
+    # schema is up to date)
     if os.path.exists(filename):
-        return sqlite3.connect(filename)
+        conn = sqlite3.connect(filename)
+        migrate_db(log, conn)
+        return conn
 
     # Otherwise, create the database and its schema.
     # Specifically mention the non-integer fields that are not in the
@@ -161,33 +166,314 @@ def open_db(log, filename):
     c.execute(sql)
     conn.commit()
 
+    migrate_db(log, conn)
+
     return conn
 
+# Convert a GMT "yyyy-mm-dd hh:mm:ss" timestamp to seconds since the
+# epoch
+def timestamp_to_epoch(timestamp):
+    ts = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    return calendar.timegm(ts.timetuple())
+
+# Bring an older database schema up to date:
+#
+# - TimestampEpoch: integer version of the (GMT) Timestamp column, so
+#   that we can search / sort by time without parsing text on every
+#   row
+# - A unique index on (TimestampEpoch, department), so that importing
+#   the same CSV twice is a no-op.  This also serves as the composite
+#   index for looking up all departments at a given timestamp.
+# - An index on (department, TimestampEpoch) for looking up a single
+#   department over time
+#
+# All of this is idempotent; it is cheap to run every time we open the
+# database.
+def migrate_db(log, conn):
+    c = conn.cursor()
+    c.execute('PRAGMA table_info(printlog)')
+    columns = [ row[1] for row in c.fetchall() ]
+
+    c.execute('BEGIN')
+    if 'TimestampEpoch' not in columns:
+        log.info("Migrating database: adding TimestampEpoch column")
+        c.execute('ALTER TABLE printlog ADD COLUMN TimestampEpoch integer')
+        c.execute('''UPDATE printlog
+                     SET TimestampEpoch=CAST(strftime('%s', Timestamp) AS integer)''')
+
+        # Older databases may have had the same CSV imported more than
+        # once.  Keep the first copy so that we can add the unique
+        # index.
+        c.execute('''DELETE FROM printlog
+                     WHERE Key NOT IN (SELECT MIN(Key) FROM printlog
+                                       GROUP BY TimestampEpoch, department)''')
+        if c.rowcount > 0:
+            log.info(f"Migrating database: removed {c.rowcount} duplicate rows")
+
+    c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS printlog_timestamp_department
+                 ON printlog (TimestampEpoch, department)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS printlog_department_timestamp
+                 ON printlog (department, TimestampEpoch)''')
+
+    # Create (and fill in) the rollup tables if they don't exist yet
+    for period, fmt in rollup_periods.items():
+        table = f'printlog_{period}'
+        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+                  [table])
+        if c.fetchone() is None:
+            log.info(f"Migrating database: creating {table} rollup table")
+            create_rollup_table(c, table)
+            rebuild_rollup(c, table, fmt)
+
+    conn.commit()
+
+# Return a list of what migrate_db() would still have to do to this
+# database (an empty list if the schema is up to date).  This only
+# reads the database, so it is safe on a read-only connection.
+def schema_problems(conn):
+    c = conn.cursor()
+    c.execute('PRAGMA table_info(printlog)')
+    columns = [ row[1] for row in c.fetchall() ]
+    c.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'index')")
+    names = [ (row[0], row[1]) for row in c.fetchall() ]
+
+    problems = list()
+    if 'TimestampEpoch' not in columns:
+        problems.append('printlog has no TimestampEpoch column')
+    for index in [ 'printlog_timestamp_department',
+                   'printlog_department_timestamp' ]:
+        if ('index', index) not in names:
+            problems.append(f'missing index {index}')
+    for period in rollup_periods:
+        if ('table', f'printlog_{period}') not in names:
+            problems.append(f'missing rollup table printlog_{period}')
+
+    return problems
+
+###########################################################
+
+# Rollup tables.
+#
+# For each department and each (local time) day / month, these tables
+# contain the sum of the increments of each counter, where an
+# "increment" is how much a counter went up between one snapshot of
+# that department and the next.  An increment counts towards the
+# period of the *earlier* of the two snapshots.
+#
+# Hence the sum of the rollup rows from period A up to (but not
+# including) period B is exactly the difference between the first
+# snapshot at or after the start of A and the first snapshot at or
+# after the start of B -- which is what the report computes from the
+# raw snapshots.  first_epoch / last_epoch are the first and last
+# snapshots that contributed to each row.
+#
+# The rollups are updated in the same transaction that inserts the
+# snapshots (see write_to_db()).
+rollup_periods = {
+    'daily'   : '%Y-%m-%d',
+    'monthly' : '%Y-%m',
+}
 
-def write_to_db(log, timestamp, csv, conn):
+def create_rollup_table(c, table):
+    sql  = f'CREATE TABLE IF NOT EXISTS {table} ('
+    sql += 'period text NOT NULL,'
+    sql += 'department text NOT NULL,'
+    sql += 'name text,'
+    sql += 'first_epoch integer NOT NULL,'
+    sql += 'last_epoch integer NOT NULL,'
+    for sql_fieldname in fields:
+        sql += f'{sql_fieldname} integer NOT NULL DEFAULT 0,'
+    sql += 'PRIMARY KEY (period, department))'
+    c.execute(sql)
+
+def _rollup_period_sql(fmt, column):
+    return f"strftime('{fmt}', {column}, 'unixepoch', 'localtime')"
+
+# Upsert SQL that adds a set of increments into a rollup table.  The
+# SELECT must return: period, department, name, first epoch, last
+# epoch, and then the increment for each field.
+def _rollup_upsert_sql(table, select):
+    updates = [ f'{field}={field}+excluded.{field}' for field in fields ]
+    return f'''INSERT INTO {table}
+                   (period, department, name, first_epoch, last_epoch,
+                    {', '.join(fields)})
+               {select}
+               ON CONFLICT(period, department) DO UPDATE SET
+                   name=CASE WHEN excluded.last_epoch >= last_epoch
+                             THEN excluded.name ELSE name END,
+                   first_epoch=MIN(first_epoch, excluded.first_epoch),
+                   last_epoch=MAX(last_epoch, excluded.last_epoch),
+                   {', '.join(updates)}'''
+
+# Recompute an entire rollup table from the raw printlog snapshots
+def rebuild_rollup(c, table, fmt):
+    increments = [ f'COALESCE(LEAD({field}) OVER w - {field}, 0) AS {field}'
+                   for field in fields ]
+    sums = [ f'SUM({field})' for field in fields ]
+    c.execute(f'DELETE FROM {table}')
+    c.execute(f'''INSERT INTO {table}
+                      (period, department, name, first_epoch, last_epoch,
+                       {', '.join(fields)})
+                  SELECT {_rollup_period_sql(fmt, 'TimestampEpoch')} AS p,
+                         department, MAX(name),
+                         MIN(TimestampEpoch), MAX(next_epoch),
+                         {', '.join(sums)}
+                  FROM (SELECT TimestampEpoch, department, name,
+                               COALESCE(LEAD(TimestampEpoch) OVER w,
+                                        TimestampEpoch) AS next_epoch,
+                               {', '.join(increments)}
+                        FROM printlog
+                        WINDOW w AS (PARTITION BY department
+                                     ORDER BY TimestampEpoch))
+                  GROUP BY p, department''')
+
+# Add the snapshots with Key > min_key (i.e., the ones that were just
+# inserted) into the rollup tables.
+#
+# Inserting snapshot N for a department splits the interval between
+# the department's previous snapshot P and next snapshot X (if any):
+#
+# - N -> X is a new interval, in N's period
+# - P -> X becomes P -> N, in P's period
+#
+# Snapshots are usually inserted in time order (i.e., there is no X),
+# but this also handles importing an old CSV.
+def update_rollups(c, min_key):
+    new = f'''WITH new AS (
+                  SELECT cur.*,
+                         (SELECT MAX(TimestampEpoch) FROM printlog p
+                          WHERE p.department=cur.department AND
+                                p.TimestampEpoch<cur.TimestampEpoch) AS prev_epoch,
+                         (SELECT MIN(TimestampEpoch) FROM printlog p
+                          WHERE p.department=cur.department AND
+                                p.TimestampEpoch>cur.TimestampEpoch) AS next_epoch
+                  FROM printlog cur
+                  WHERE cur.Key>{int(min_key)}
+              )'''
+    join_next = '''LEFT JOIN printlog next
+                   ON next.department=new.department AND
+                      next.TimestampEpoch=new.next_epoch'''
+
+    for period, fmt in rollup_periods.items():
+        table = f'printlog_{period}'
+
+        # N -> X
+        increments = [ f'COALESCE(next.{field} - new.{field}, 0)'
+                       for field in fields ]
+        select = f'''{new}
+                     SELECT {_rollup_period_sql(fmt, 'new.TimestampEpoch')},
+                            new.department, new.name,
+                            new.TimestampEpoch,
+                            COALESCE(new.next_epoch, new.TimestampEpoch),
+                            {', '.join(increments)}
+                     FROM new
+                     {join_next}
+                     WHERE true'''
+        c.execute(_rollup_upsert_sql(table, select))
+
+        # P -> X becomes P -> N
+        corrections = [ f'(new.{field} - prev.{field}) - COALESCE(next.{field} - prev.{field}, 0)'
+                        for field in fields ]
+        select = f'''{new}
+                     SELECT {_rollup_period_sql(fmt, 'prev.TimestampEpoch')},
+                            prev.department, prev.name,
+                            prev.TimestampEpoch, new.TimestampEpoch,
+                            {', '.join(corrections)}
+                     FROM new
+                     JOIN printlog prev
+                       ON prev.department=new.department AND
+                          prev.TimestampEpoch=new.prev_epoch
+                     {join_next}
+                     WHERE true'''
+        c.execute(_rollup_upsert_sql(table, select))
+
+        # If P -> X was the last interval in P's period, that period
+        # now ends at a different snapshot
+        period_sql = _rollup_period_sql(fmt, 'TimestampEpoch')
+        c.execute(f'''{new}
+                      UPDATE {table}
+                      SET last_epoch=(
+                          SELECT COALESCE(MIN(TimestampEpoch), last_start)
+                          FROM (SELECT MAX(TimestampEpoch) AS last_start
+                                FROM printlog
+                                WHERE department={table}.department AND
+                                      {period_sql}={table}.period)
+                          LEFT JOIN printlog
+                            ON department={table}.department AND
+                               TimestampEpoch>last_start)
+                      WHERE (period, department) IN (
+                          SELECT {_rollup_period_sql(fmt, 'prev_epoch')},
+                                 department
+                          FROM new
+                          WHERE prev_epoch IS NOT NULL AND
+                                next_epoch IS NOT NULL)''')
+
+# Compact raw printlog snapshots that are older than retention_days:
+# keep only the first snapshot of each (local time) day for each
+# department (i.e., the snapshots that the report uses for day
+# boundaries).  The rollup tables already contain every increment.
+#
+# NOTE: importing a CSV that is older than the retention window after
+# it has been compacted will attribute its increments to the wrong
+# periods.  Don't do that.
+def compact_db(log, c, retention_days):
+    cutoff = int(time.time()) - retention_days * 24 * 60 * 60
+    day = _rollup_period_sql(rollup_periods['daily'], 'TimestampEpoch')
+    c.execute(f'''DELETE FROM printlog
+                  WHERE TimestampEpoch<? AND Key NOT IN (
+                      SELECT Key FROM (
+                          SELECT Key,
+                                 ROW_NUMBER() OVER (PARTITION BY department, {day}
+                                                    ORDER BY TimestampEpoch) AS num
+                          FROM printlog
+                          WHERE TimestampEpoch<?)
+                      WHERE num=1)''',
+              [cutoff, cutoff])
+    if c.rowcount > 0:
+        log.info(f"Compacted {c.rowcount} raw snapshots older than {retention_days} days")
+
+
+def write_to_db(log, timestamp, csv, conn, retention_days=None):
     c = conn.cursor()
 
     # Use the first extracted CSV row to make the template SQL
-    # (because all the CSV rows will contain the same fields)
+    # (because all the CSV rows will contain the same fields).  If
+    # this timestamp / department was already imported, skip it (so
+    # that re-importing the same CSV does nothing).
     sorted_fields = sorted(csv[0])
     sql = ('INSERT INTO printlog (' +
             ','.join(sorted_fields) +
-            ', Timestamp) VALUES (' +
+            ', Timestamp, TimestampEpoch) VALUES (' +
             ('?,' * len(sorted_fields)) +
-            '?)')
+            '?, ?) ON CONFLICT(TimestampEpoch, department) DO NOTHING')
     log.debug(f"Insert row template SQL: {sql}")
 
-    # Insert each CSV row's value into the database
+    epoch = timestamp_to_epoch(timestamp)
+    values = list()
     for row in csv:
-        values = [ row[x] for x in sorted_fields ]
-        values.append(timestamp)
-        values_tuple = tuple(values)
+        values_tuple = tuple([ row[x] for x in sorted_fields ] +
+                             [ timestamp, epoch ])
         log.debug(f"SQL insert values tuple: {values_tuple}")
-        c.execute(sql, values_tuple)
+        values.append(values_tuple)
+
+    # Insert all the CSV rows -- and update the rollup tables -- in a
+    # single transaction
+    c.execute('BEGIN')
+    c.execute('SELECT COALESCE(MAX(Key), 0) FROM printlog')
+    max_key = c.fetchone()[0]
 
-    # Commit those inserts to the database
+    before = conn.total_changes
+    c.executemany(sql, values)
+    inserted = conn.total_changes - before
+
+    update_rollups(c, max_key)
+    if retention_days:
+        compact_db(log, c, retention_days)
     conn.commit()
-    log.info(f"Inserted {len(csv)} rows into the database")
+
+    log.info(f"Inserted {inserted} rows into the database")
+    if inserted < len(csv):
+        log.info(f"Skipped {len(csv) - inserted} rows that were already in the database")
 
 
 def setup_cli_args():
@@ -202,6 +488,11 @@ def setup_cli_args():
                         default=datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
                         help='Use this GMT "yyyy-mm-dd hh:mm:ss" timestamp when inserting into the database')
 
+    parser.add_argument('--retention-days',
+                        type=int,
+                        default=None,
+                        help='If specified, compact raw snapshots older than this many days down to one per department per day (the daily / monthly rollup tables are not affected)')
+
     parser.add_argument('--logfile',
                         default=None,
                         help='Optional output logfile')
@@ -234,7 +525,8 @@ def main():
     csv_rows = load_csv(log, args.csv)
     csv      = extract_csv_data(log, csv_rows)
     conn     = open_db(log, args.db)
-    write_to_db(log, args.timestamp, csv, conn)
+    write_to_db(log, args.timestamp, csv, conn,
+                retention_days=args.retention_days)
     conn.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+# Benchmark the Ricoh report's database queries against synthetic
+# databases with different amounts of history.
+#
+# For each --years value, a scratch database is filled with a snapshot
+# of every department's counters every --interval-mins minutes (as if
+# db_insert.py had imported a CSV that often), and the rollup tables
+# are built from them.  Then the report for the last whole month is
+# computed, several times, both ways that report.py does it:
+#
+# - "raw":    find_timestamp() + fetch_data(), from the raw snapshots
+#             (used when --first / --last are not both dates)
+# - "rollup": fetch_rollup_data(), from the daily / monthly rollups
+#             (used when --first / --last are both dates)
+#
+# The median time of each is reported per history size.  Both should
+# stay flat as the history grows, because both only look at the report
+# window via the indexes.  The two ways must also compute the same
+# deltas; the benchmark checks that too.
+#
+# Generating the databases takes roughly half a minute per year of
+# history; use --db-dir to keep them between runs.
+#
+# Usage (from this folder):
+#     ./report-benchmark.py --years 1 3 5
+#     ./report-benchmark.py --years 1 5 --db-dir /tmp/ricoh-bench --json results.json
+#
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import datetime
+import tempfile
+import statistics
+
+import db_insert
+import report
+
+###########################################################
+
+def setup_cli_args():
+    parser = argparse.ArgumentParser(description='Benchmark the Ricoh report queries against synthetic history')
+    parser.add_argument('--years',
+                        type=int,
+                        nargs='+',
+                        default=[1, 3, 5],
+                        help='Years of history in each synthetic database')
+    parser.add_argument('--departments',
+                        type=int,
+                        default=12,
+                        help='Number of departments in each snapshot')
+    parser.add_argument('--interval-mins',
+                        type=int,
+                        default=15,
+                        help='Minutes between snapshots')
+    parser.add_argument('--runs',
+                        type=int,
+                        default=5,
+                        help='Number of times to compute the report on each database')
+    parser.add_argument('--db-dir',
+                        default=None,
+                        help='Directory for the synthetic databases.  Existing databases in it are reused (default: a new temporary directory)')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=1,
+                        help='Random seed for the synthetic counters')
+    parser.add_argument('--json',
+                        default=None,
+                        help='Also write the results to this JSON filename')
+
+    args = parser.parse_args()
+
+    if args.db_dir is None:
+        args.db_dir = tempfile.mkdtemp(prefix='ricoh-bench-')
+    os.makedirs(args.db_dir, exist_ok=True)
+
+    return args
+
+###########################################################
+
+# The synthetic history ends a day into the current month (so that
+# there is a snapshot at the local midnight that ends the report
+# window)
+def history_end():
+    today = datetime.date.today()
+    return datetime.datetime(today.year, today.month, 2).astimezone()
+
+# The report window: the last whole month, from local midnight to
+# local midnight
+def report_window():
+    last  = datetime.datetime(datetime.date.today().year,
+                              datetime.date.today().month, 1)
+    first = (last - datetime.timedelta(days=1)).replace(day=1)
+    return first.astimezone(), last.astimezone()
+
+# Fill a new database with years of snapshots, the same way
+# db_insert.write_to_db() would have inserted them (but in one
+# transaction, and building the rollups once at the end)
+def make_db(log, filename, years, args):
+    conn = db_insert.open_db(log, filename)
+    c    = conn.cursor()
+
+    rnd = random.Random(args.seed)
+    depts = [ { 'department'    : f'{i + 1:04}',
+                'name'          : f'Department {i + 1}',
+                'lastResetDate' : '' }
+              for i in range(args.departments) ]
+    for dept in depts:
+        for field in db_insert.fields:
+            dept[field] = 0
+
+    # Most counters rarely change; make a few of them busy
+    busy = [ 'total', 'bwTotal', 'colorTotal', 'bwPrinter',
+             'colorPrinter', 'bwCopier', 'scannerTotal' ]
+
+    sorted_fields = sorted(depts[0])
+    sql = ('INSERT INTO printlog (' +
+           ','.join(sorted_fields) +
+           ', Timestamp, TimestampEpoch) VALUES (' +
+           ('?,' * len(sorted_fields)) +
+           '?, ?)')
+
+    end   = int(history_end().timestamp())
+    epoch = end - years * 365 * 24 * 60 * 60
+    step  = args.interval_mins * 60
+
+    c.execute('BEGIN')
+    values = list()
+    while epoch <= end:
+        timestamp = datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc)
+        timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        for dept in depts:
+            for field in busy:
+                if rnd.random() < 0.2:
+                    dept[field] += rnd.randint(1, 20)
+            values.append(tuple([ dept[x] for x in sorted_fields ] +
+                                [ timestamp, epoch ]))
+
+        if len(values) >= 10000:
+            c.executemany(sql, values)
+            values = list()
+        epoch += step
+
+    c.executemany(sql, values)
+    for period, fmt in db_insert.rollup_periods.items():
+        db_insert.rebuild_rollup(c, f'printlog_{period}', fmt)
+    conn.commit()
+    conn.close()
+
+###########################################################
+
+def run_raw(log, conn, fields, first, last):
+    timestamp_first = report.find_timestamp(log, conn, first)
+    timestamp_last  = report.find_timestamp(log, conn, last)
+    depts = report.fetch_data(log, conn, fields,
+                              timestamp_first, timestamp_last)
+    report.compute_deltas(log, depts)
+    return depts
+
+def run_rollup(log, conn, fields, first, last):
+    depts = report.fetch_rollup_data(log, conn, fields, first, last)
+    report.compute_deltas(log, depts)
+    return depts
+
+# Median wall clock time of args.runs runs, in milliseconds, and the
+# deltas from the last run
+def time_runs(func, log, conn, fields, first, last, args):
+    times = list()
+    for i in range(args.runs):
+        start = time.perf_counter()
+        depts = func(log, conn, fields, first, last)
+        times.append((time.perf_counter() - start) * 1000)
+
+    deltas = { dept : { field : item['deltas'][field]
+                        for field in db_insert.fields }
+               for dept, item in depts.items() }
+    return statistics.median(times), deltas
+
+def benchmark(log, years, args):
+    filename = os.path.join(args.db_dir,
+                            f'ricoh-bench-{years}y-{args.departments}d-{args.interval_mins}m.sqlite3')
+    if os.path.exists(filename):
+        print(f"Reusing {filename}")
+    else:
+        print(f"Generating {years} year(s) of history in {filename}...")
+        start = time.perf_counter()
+        make_db(log, filename, years, args)
+        print(f"Generated in {time.perf_counter() - start:.1f} seconds")
+
+    conn, fields = report.open_db(log, filename)
+    rows = conn.execute('SELECT COUNT(*) FROM printlog').fetchone()[0]
+
+    first, last = report_window()
+    raw_ms, raw_deltas = time_runs(run_raw, log, conn, fields,
+                                   first, last, args)
+    rollup_ms, rollup_deltas = time_runs(run_rollup, log, conn, fields,
+                                         first, last, args)
+    conn.close()
+
+    return {
+        'years'     : years,
+        'rows'      : rows,
+        'db_mb'     : round(os.path.getsize(filename) / (2 ** 20), 1),
+        'raw_ms'    : round(raw_ms, 2),
+        'rollup_ms' : round(rollup_ms, 2),
+        'same'      : raw_deltas == rollup_deltas,
+    }
+
+###########################################################
+
+def main():
+    args = setup_cli_args()
+
+    # The report functions log every query at debug level; keep the
+    # output quiet
+    log = logging.getLogger('ricoh-report-benchmark')
+    log.addHandler(logging.NullHandler())
+    log.propagate = False
+
+    first, last = report_window()
+    print(f"Report window: {first} to {last}")
+    print(f"{args.departments} departments, a snapshot every {args.interval_mins} minutes, median of {args.runs} runs")
+
+    results = [ benchmark(log, years, args) for years in sorted(args.years) ]
+
+    print()
+    print(f"{'years':>5} {'rows':>10} {'db MB':>8} {'raw ms':>8} {'rollup ms':>10}  same deltas")
+    for result in results:
+        print(f"{result['years']:5} {result['rows']:10} {result['db_mb']:8} "
+              f"{result['raw_ms']:8.2f} {result['rollup_ms']:10.2f}  {result['same']}")
+
+    if len(results) > 1:
+        print()
+        print(f"{results[-1]['rows'] / results[0]['rows']:.1f}x the history: "
+              f"raw {results[-1]['raw_ms'] / results[0]['raw_ms']:.2f}x the time, "
+              f"rollup {results[-1]['rollup_ms'] / results[0]['rollup_ms']:.2f}x the time")
+
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump({ 'options' : vars(args), 'results' : results }, fp, indent=4)
+        print(f"Results written to {args.json}")
+
+    if not all(result['same'] for result in results):
+        print("ERROR: raw and rollup reports computed different deltas")
+        exit(1)
+
+if __name__ == '__main__':
+    main()
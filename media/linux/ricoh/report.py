@@ -6,11 +6,11 @@
 import re
 import os
 import sys
-import pytz
 import tzlocal
 import sqlite3
 import argparse
 import datetime
+import urllib.parse
 
 # We assume that there is a "ecc-python-modules" sym link in this
 # directory that points to the directory with ECC.py and friends.
@@ -31,6 +31,8 @@ sys.path.insert(0, moddir)
 import ECC
 import Google
 
+import db_insert
+
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 
@@ -146,28 +148,28 @@ def setup_cli_args():
 
 ###########################################################
 
-# Find the first and last timestamps in the database
-def find_first_last_timestamp(log, conn):
-    def _doit(direction):
-        c    = conn.cursor()
-        sql  = f'SELECT timestamp FROM printlog GROUP BY timestamp ORDER BY datetime(timestamp) {direction} LIMIT 1'
-        log.debug(f"SQL: {sql}")
-        c.execute(sql)
-        rows = c.fetchall()
-
-        return rows
+# Timestamps in the database are GMT.  Return them as timezone-aware
+# Python datetimes so that they render properly in the local timezone.
+def epoch_to_datetime(epoch):
+    return datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc)
 
+# Find the first and last timestamps in the database.
+#
+# NOTE: All the timestamp lookups here use the integer TimestampEpoch
+# column (not datetime(timestamp)) so that SQLite can answer them
+# straight from the index instead of scanning the whole table.
+def find_first_last_timestamp(log, conn):
     log.debug(f"Looking for first and last timestamps")
-    rows = _doit("ASC")
-    if len(rows) < 1:
-        log.verbose("Database is empty: there is no first and last timestamp")
+    c = conn.cursor()
+    c.execute('SELECT MIN(TimestampEpoch), MAX(TimestampEpoch) FROM printlog')
+    first, last = c.fetchone()
+    if first is None:
+        log.info("Database is empty: there is no first and last timestamp")
         return None, None
 
-    first = datetime.datetime.fromisoformat(rows[0]['timestamp'])
+    first = epoch_to_datetime(first)
+    last  = epoch_to_datetime(last)
     log.debug(f"Found first timestamp: {first}")
-
-    rows = _doit("DESC")
-    last = datetime.datetime.fromisoformat(rows[0]['timestamp'])
     log.debug(f"Found last timestamp: {last}")
 
     return first, last
@@ -177,128 +179,159 @@ def find_first_last_timestamp(log, conn):
 # timestamps in the database are in GMT.
 def find_timestamp(log, conn, target_timestamp):
     c = conn.cursor()
-    gmt = pytz.timezone("GMT")
-    gmt_ts = target_timestamp.astimezone(gmt)
+    epoch = int(target_timestamp.timestamp())
 
-    log.debug(f"Looking for timestamp: {gmt_ts}")
-    sql  = f'SELECT timestamp FROM printlog WHERE datetime(timestamp)>=datetime(?) GROUP BY timestamp ORDER BY datetime(timestamp) LIMIT 1'
-    log.debug(f"SQL: {sql}")
-    c.execute(sql, [gmt_ts])
-    rows = c.fetchall()
+    log.debug(f"Looking for timestamp: {target_timestamp} (epoch {epoch})")
+    c.execute('SELECT MIN(TimestampEpoch) FROM printlog WHERE TimestampEpoch>=?',
+              [epoch])
+    found = c.fetchone()[0]
 
-    log.debug(f"Found {len(rows)} rows greater than {gmt_ts}")
-    if len(rows) < 1:
+    if found is None:
+        log.debug(f"Found no timestamps greater than {target_timestamp}")
         return None
-    return datetime.datetime.fromisoformat(rows[0]['timestamp'])
-
-###########################################################
-
-def fetch_depts_at_timestamp(log, conn, timestamp):
-    c     = conn.cursor()
-    c.execute('SELECT department FROM printlog WHERE timestamp=?', [timestamp])
-    rows  = c.fetchall()
-    depts = { row['department'] : timestamp for row in rows }
-
-    log.debug(f"Found {len(depts)} departments at timestamp {timestamp}: {depts}")
-    return depts
-
-###########################################################
-
-def compute_depts_union(log, depts_first, depts_last):
-    def _compute(depts, label):
-        for dept, timestamp in depts.items():
-            if dept not in depts_union:
-                depts_union[dept] = {
-                    'id' : dept,
-                }
-            depts_union[dept][label] = timestamp
-
-    depts_union = dict()
-    _compute(depts_first, "first")
-    _compute(depts_last, "last")
-
-    log.debug(f"Union of all departments: {depts_union}")
-    return depts_union
+    return epoch_to_datetime(found)
 
 ###########################################################
 
-# Examine each department:
+# Get the first and last data for each department between the two
+# timestamps, in a single query.
 #
-# - if we are missing a "first" timestamp, this means that the department was
-#   added between the two timestamps specified on the command line.  Go find
-#   the first timestamp where we have data for that new department.
-# - if we are missing a "last" timestamp, this means that the department was
-#   deleted between the two timestamps specified on the command line.  Go find
-#   the last timestamp where we have data for that now-deleted department.
-def fetch_missing_timestamps(log, conn, timestamp_first, timestamp_last, depts):
+# Departments may have been added or deleted between the two
+# timestamps.  So for each department, use the first and last
+# timestamps *for that department* in the window.
+#
+# The database computes the deltas between the first and last rows:
+# LAG() gives us the department's first row values alongside its last
+# row.  A department that only has one row in the window gets deltas
+# of 0.
+def fetch_data(log, conn, fields, timestamp_first, timestamp_last):
     c = conn.cursor()
 
-    for dept in depts.values():
-        label = None
-        if 'first' not in dept:
-            # Find first timestamp with this department
-            desc      = ''
-            timestamp = timestamp_first
-            label     = 'first'
-
-        elif 'last' not in dept:
-            # Find last timestamp with this department
-            desc      = 'DESC'
-            timestamp = timestamp_last
-            label     = 'last'
-
-        if label is not None:
-            sql         = f'SELECT timestamp FROM printlog WHERE department=? AND datetime(timestamp)>=datetime(?) GROUP BY timestamp ORDER BY datetime(timestamp) {desc} LIMIT 1'
-            values      = [ dept['id'], timestamp ]
-            c.execute(sql, values)
-            rows        = c.fetchall()
-            dept[label] = datetime.datetime.fromisoformat(rows[0]['timestamp'])
-
-    log.debug(f"Depts with all timestamps filled in: {depts}")
+    # Compute deltas for all the integer columns
+    c.execute('PRAGMA table_info(printlog)')
+    int_fields = [ row['name'] for row in c.fetchall()
+                   if row['type'].lower() == 'integer' and
+                   row['name'] in fields ]
+
+    deltas = [ f'COALESCE({field} - LAG({field}) OVER w, 0) AS "delta_{field}"'
+               for field in int_fields ]
+    sql = f'''WITH bounds AS (
+                SELECT department,
+                       MIN(TimestampEpoch) AS first,
+                       MAX(TimestampEpoch) AS last
+                FROM printlog
+                WHERE TimestampEpoch BETWEEN ? AND ?
+                GROUP BY department
+             )
+             SELECT printlog.*,
+                    {', '.join(deltas)}
+             FROM printlog
+             JOIN bounds
+               ON printlog.department = bounds.department AND
+                  printlog.TimestampEpoch IN (bounds.first, bounds.last)
+             WINDOW w AS (PARTITION BY printlog.department
+                          ORDER BY printlog.TimestampEpoch)
+             ORDER BY printlog.department, printlog.TimestampEpoch'''
+    values = [ int(timestamp_first.timestamp()),
+               int(timestamp_last.timestamp()) ]
+    log.debug(f"SQL: {sql}")
+    log.debug(f"SQL values: {values}")
+    c.execute(sql, values)
+
+    # The rows are sorted by department and then timestamp, so each
+    # department's first row comes before its last row (if it has
+    # more than one).
+    depts = dict()
+    for row in c.fetchall():
+        dept = row['department']
+        timestamp = epoch_to_datetime(row['TimestampEpoch'])
+        if dept not in depts:
+            depts[dept] = {
+                'id'         : dept,
+                'first'      : timestamp,
+                'first_data' : row,
+            }
+
+        item = depts[dept]
+        item['last']      = timestamp
+        item['last_data'] = row
+        item['sql_deltas'] = { field : row[f'delta_{field}']
+                               for field in int_fields }
+
+    log.debug(f"Full set of data: {depts}")
+    return depts
 
 ###########################################################
 
-# Get the data for each department and timestamp.
+# Get the data for each department between two local midnights from
+# the daily / monthly rollup tables that db_insert.py maintains.
 #
-# We could do something clever to minimize the number of SQL lookups, but
-# the Python is simpler to read if we just have a simple loop to look
-# up each one.  For a database/application this small, the performance
-# difference is negligible.
-def fetch_data(log, conn, depts):
-    def _fetch(log, id, timestamp):
-        sql    = 'SELECT * FROM printlog WHERE department=? AND timestamp=?'
-        values = [ id, timestamp ]
-        c.execute(sql, values)
-        rows = c.fetchall()
-        return rows[0]
+# This gives exactly the same deltas as fetch_data() over the first
+# snapshots at / after those two midnights, but it never looks at the
+# raw snapshots (which may have been compacted).  Whole months come
+# from the monthly table; partial months at either end come from the
+# daily table.
+def fetch_rollup_data(log, conn, fields, first, last):
+    day_first = first.strftime('%Y-%m-%d')
+    day_last  = last.strftime('%Y-%m-%d')
+
+    # The whole months in [first, last)
+    if first.day == 1:
+        month_first = first.strftime('%Y-%m')
+    else:
+        month_first = (first.replace(day=1) +
+                       datetime.timedelta(days=32)).strftime('%Y-%m')
+    month_last = last.strftime('%Y-%m')
+
+    counter_fields = [ field for field in db_insert.fields
+                       if field in fields ]
+    sums = [ f'SUM({field}) AS {field}' for field in counter_fields ]
+    sql = f'''SELECT department,
+                    MAX(name) AS name,
+                    MIN(first_epoch) AS first_epoch,
+                    MAX(last_epoch) AS last_epoch,
+                    {', '.join(sums)}
+             FROM (SELECT * FROM printlog_monthly
+                   WHERE period>=? AND period<?
+                   UNION ALL
+                   SELECT * FROM printlog_daily
+                   WHERE period>=? AND period<? AND
+                         NOT (substr(period, 1, 7)>=? AND
+                              substr(period, 1, 7)<?))
+             GROUP BY department
+             ORDER BY department'''
+    values = [ month_first, month_last,
+               day_first, day_last, month_first, month_last ]
+    log.debug(f"SQL: {sql}")
+    log.debug(f"SQL values: {values}")
 
     c = conn.cursor()
-
-    for dept, item in depts.items():
-        log.debug(item)
-        data = _fetch(log, dept, item['first'])
-        item['first_data'] = data
-
-        data = _fetch(log, dept, item['last'])
-        item['last_data'] = data
+    c.execute(sql, values)
+
+    depts = dict()
+    for row in c.fetchall():
+        dept = row['department']
+        data = { 'name' : row['name'] }
+        depts[dept] = {
+            'id'         : dept,
+            'first'      : epoch_to_datetime(row['first_epoch']),
+            'last'       : epoch_to_datetime(row['last_epoch']),
+            'first_data' : data,
+            'last_data'  : data,
+            'sql_deltas' : { field : row[field]
+                             for field in counter_fields },
+        }
 
     log.debug(f"Full set of data: {depts}")
+    return depts
 
 ###########################################################
 
-# finds the deltas between the sets of data, returns a list of department deltas
+# The database already computed the deltas between the sets of data;
+# just put them where write_to_xlsx() expects them.
 def compute_deltas(log, depts):
     for dept, item in depts.items():
-        # Assumption: the column names are the same between the old and new data
-        delta = dict()
-        for col in item['first_data'].keys():
-            data_old = item['first_data'][col]
-            data_new = item['last_data'][col]
-            # do not compare any data that is not an integer
-            if type(data_old) == str and type(data_new) == str:
-                continue
-            delta[col] = data_new - data_old
-        item['deltas'] = delta
+        item['deltas'] = item.pop('sql_deltas')
 
     log.debug("Computed deltas")
     log.debug(depts)
@@ -427,7 +460,23 @@ def write_to_xlsx(log, fields, depts, filename, timestamp_first, timestamp_last)
 ###########################################################
 
 def open_db(log, filename):
-    conn = sqlite3.connect(filename)
+    # Open the database read-only: the report must never write to (or
+    # take the write lock on) the database that db_insert.py is
+    # filling in
+    if not os.path.exists(filename):
+        log.error(f"Database {filename} does not exist")
+        exit(1)
+    uri  = 'file:' + urllib.parse.quote(os.path.abspath(filename)) + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True)
+
+    # The report needs the TimestampEpoch column, indexes and rollup
+    # tables that db_insert.py adds; it won't add them itself
+    problems = db_insert.schema_problems(conn)
+    if problems:
+        log.error(f"Database {filename} has an old schema: {'; '.join(problems)}")
+        log.error("Run db_insert.py (which upgrades the schema) before running the report")
+        exit(1)
+
     conn.row_factory = sqlite3.Row
 
     # Fetch a list of the SQL table field names.  We do this because we know
@@ -440,6 +489,10 @@ def open_db(log, filename):
     c      = conn.cursor()
     c.execute("SELECT * FROM printlog ORDER BY key LIMIT 1")
     fields = [ description[0] for description in c.description ]
+
+    # TimestampEpoch is just another representation of Timestamp; it
+    # is not a counter
+    fields = [ field for field in fields if field != 'TimestampEpoch' ]
     log.debug(f"SQL field names: {fields}")
 
     return conn, fields
@@ -563,41 +616,47 @@ def main():
 
     conn, fields = open_db(log, args.db)
 
-    # If the first and last timestamps were not specified, use the first and
-    # last timestamps in the database.
-    first, last = find_first_last_timestamp(log, conn)
-    if args.first == None:
-        args.first = first
-    if args.last == None:
-        args.last = last
-
-    # Find the earliest timestamp in the database that is greater than or equal
-    # to the timestamps that were specified on the command line.
-    def _check(label, timestamp):
-        ts = find_timestamp(log, conn, timestamp)
-        if ts is None:
-            log.error(f"Could not find suitable timestamp in database for {timestamp}")
+    # If --first and --last are both dates (i.e., local midnight), we
+    # can get everything we need from the rollup tables.
+    def _is_date(timestamp):
+        return timestamp is not None and timestamp.time() == datetime.time(0)
+
+    if _is_date(args.first) and _is_date(args.last):
+        log.debug("Using rollup tables")
+        timestamp_first = args.first
+        timestamp_last  = args.last
+        depts = fetch_rollup_data(log, conn, fields,
+                                  timestamp_first, timestamp_last)
+        if len(depts) == 0:
+            log.error(f"Could not find any data in database between {timestamp_first} and {timestamp_last}")
             exit(1)
-        return ts
-
-    timestamp_first = _check('first', args.first)
-    timestamp_last  = _check('last', args.last)
-
-    # Fetch all the departments that are available at those two timestamps.
-    depts_first = fetch_depts_at_timestamp(log, conn, timestamp_first)
-    depts_last  = fetch_depts_at_timestamp(log, conn, timestamp_last)
-
-    # We may have found a different set of departments at the first and last
-    # timestamps (e.g., if a department was added or deleted between the two
-    # timestamps).  Compute the union of departments that we found.
-    depts = compute_depts_union(log, depts_first, depts_last)
-
-    # Go fetch any missing data (i.e., a department for which we have only a
-    # first or last set of data).
-    fetch_missing_timestamps(log, conn, timestamp_first, timestamp_last, depts)
 
-    # Now that we have all the timestamps, fetch all the data
-    fetch_data(log, conn, depts)
+    else:
+        # If the first and last timestamps were not specified, use the
+        # first and last timestamps in the database.
+        first, last = find_first_last_timestamp(log, conn)
+        if args.first == None:
+            args.first = first
+        if args.last == None:
+            args.last = last
+
+        # Find the earliest timestamp in the database that is greater
+        # than or equal to the timestamps that were specified on the
+        # command line.
+        def _check(label, timestamp):
+            ts = find_timestamp(log, conn, timestamp)
+            if ts is None:
+                log.error(f"Could not find suitable timestamp in database for {timestamp}")
+                exit(1)
+            return ts
+
+        timestamp_first = _check('first', args.first)
+        timestamp_last  = _check('last', args.last)
+
+        # Fetch the first and last data for every department between
+        # those two timestamps (including departments that were added
+        # or deleted between the two timestamps).
+        depts = fetch_data(log, conn, fields, timestamp_first, timestamp_last)
 
     # Now that we have first and last data for every single department, compute
     # the deltas for all of them.
@@ -617,4 +676,5 @@ def main():
 
     conn.close()
 
-main()
+if __name__ == '__main__':
+    main()
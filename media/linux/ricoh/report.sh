@@ -0,0 +1,54 @@
+#!/bin/bash
+
+set -xeuo pipefail
+
+base=$HOME/git/epiphany/media/linux
+prog_dir=$base/ricoh
+credential_dir=/home/coeadmin/credentials
+slack_token=$credential_dir/slack-token.txt
+smtp_creds=$credential_dir/smtp-auth.txt
+
+cd $prog_dir
+
+# We're already running under a top-level runner.py (which reports
+# Python errors to Slack), so we can just directly invoke our script
+# here.
+#
+# run-all.py runs this after run.sh has succeeded, so the database
+# already has today's data in it.
+
+# Run once a month, on the 9th.  This job can start a while after
+# run-all.py did (i.e., after run.sh), so use the time that run-all.py
+# started to decide whether this is the first run after midnight.
+start=${RUN_ALL_START:-now}
+day=`date '+%d' -d "$start"`
+t=`date '+%H%M' -d "$start"`
+if test $day -eq 9 && test $t -le 14; then
+    # This folder is in the ECC Tech Committee Google Shared Drive,
+    # under "Data/Ricoh".
+    google_folder=1zPjpPSFiNttptZ_TEi6FCVOzaBi7O5dD
+    email_to=ricoh-reporting@epiphanycatholicchurch.org
+
+    name=upload-ricoh-to-google-drive
+    cred_base=$HOME/credentials
+    cred_dir=$cred_base/$name
+    client_id=$cred_dir/$name-client-id.json
+    user_creds=$cred_dir/$name-user-credentials.json
+
+    first=`date +%Y-%m-%d -d "1 month ago"`
+    last=`date +%Y-%m-%d -d yesterday`
+    ./report.py \
+        --debug \
+        --smtp-recipient $email_to \
+        --smtp-auth-file $smtp_creds \
+        --db ricoh.sqlite3 \
+        --first $first \
+        --last $last \
+        --xlsx "$first to $last ricoh data.xlsx" \
+        --app-id $client_id \
+        --user-creds $user_creds \
+        --google-parent-folder-id $google_folder \
+        --slack-token-filename $slack_token
+fi
+
+exit 0
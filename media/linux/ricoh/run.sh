@@ -41,34 +41,8 @@ if test $t -le 14; then
         --timestamp "$gmt_timestamp"
 fi
 
-# Run once a month, on the 9th
-day=`date '+%d'`
-if test $day -eq 9 && test $t -le 14; then
-    # This folder is in the ECC Tech Committee Google Shared Drive,
-    # under "Data/Ricoh".
-    google_folder=1zPjpPSFiNttptZ_TEi6FCVOzaBi7O5dD
-    email_to=ricoh-reporting@epiphanycatholicchurch.org
-
-    name=upload-ricoh-to-google-drive
-    cred_base=$HOME/credentials
-    cred_dir=$cred_base/$name
-    client_id=$cred_dir/$name-client-id.json
-    user_creds=$cred_dir/$name-user-credentials.json
-
-    first=`date +%Y-%m-%d -d "1 month ago"`
-    last=`date +%Y-%m-%d -d yesterday`
-    ./report.py \
-        --debug \
-        --smtp-recipient $email_to \
-        --smtp-auth-file $smtp_creds \
-        --db ricoh.sqlite3 \
-        --first $first \
-        --last $last \
-        --xlsx "$first to $last ricoh data.xlsx" \
-        --app-id $client_id \
-        --user-creds $user_creds \
-        --google-parent-folder-id $google_folder \
-        --slack-token-filename $slack_token
-fi
+# The monthly report is run by report.sh, which run-all.py only starts
+# after this script has succeeded (i.e., after today's data is in the
+# database).
 
 exit 0
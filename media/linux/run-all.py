@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 
+import concurrent.futures
 import subprocess
+import threading
+import argparse
 import datetime
 import logging
 import logging.handlers
+import sqlite3
+import signal
+import json
 import time
 import sys
 import os
@@ -27,94 +33,567 @@ out = subprocess.run(['git', 'rev-parse', '--show-toplevel'],
 git_top = out.stdout.decode('utf-8').strip()
 
 # Globals
-logfile  = os.path.join(os.environ['HOME'], 'logfiles', 'lock-logfile.txt')
-lockfile = os.path.join(git_top, 'media', 'linux', 'ps-run-all.lock')
+logfile    = os.path.join(os.environ['HOME'], 'logfiles', 'lock-logfile.txt')
+history_db = os.path.join(os.environ['HOME'], 'logfiles', 'run-all-history.sqlite3')
+lock_dir   = os.path.join(git_top, 'media', 'linux')
+
+# How many jobs to run at the same time
+max_parallel = 4
+
+# The jobs that we run.  Each job is the run.sh script in
+# media/linux/<job name>, unless the job says otherwise:
+#
+# - dir: the subdirectory of media/linux to run the job in (default:
+#   the job name).
+# - script: the script in that directory to run (default: run.sh).
+# - depends: jobs that must have completed successfully in this same
+#   run before this job is started.  If a job fails (or is skipped),
+#   the jobs that depend on it are skipped.
+# - timeout: kill the job if it runs longer than this.
+# - concurrency: how many copies of this job may run at the same time
+#   (e.g., from overlapping cron runs of this script).  If that many
+#   copies are already running, this run skips the job.
+# - budget: if the job runs longer than this, send an alert to Slack
+#   (but let it keep running until its timeout).
+#
+# Since each job has its own lock, a slow job (e.g., the daily PS
+# roster rebuild) can overlap the next cron run of this script
+# without stopping the fast jobs from running in that cron run.
+jobs = {
+    'ricoh' : {
+        'depends'     : [],
+        'timeout'     : datetime.timedelta(minutes=14),
+        'concurrency' : 1,
+        'budget'      : datetime.timedelta(minutes=10),
+    },
+    # The monthly Ricoh report needs the data that the ricoh job
+    # just put in the database
+    'ricoh-report' : {
+        'dir'         : 'ricoh',
+        'script'      : 'report.sh',
+        'depends'     : [ 'ricoh' ],
+        'timeout'     : datetime.timedelta(minutes=14),
+        'concurrency' : 1,
+        'budget'      : datetime.timedelta(minutes=10),
+    },
+    'email-patch-tuesday' : {
+        'depends'     : [],
+        'timeout'     : datetime.timedelta(minutes=14),
+        'concurrency' : 1,
+        'budget'      : datetime.timedelta(minutes=10),
+    },
+    'ps-queries' : {
+        'depends'     : [],
+        'timeout'     : datetime.timedelta(minutes=60),
+        'concurrency' : 1,
+        'budget'      : datetime.timedelta(minutes=45),
+    },
+    'calendar-audit' : {
+        'depends'     : [],
+        'timeout'     : datetime.timedelta(minutes=14),
+        'concurrency' : 1,
+        'budget'      : datetime.timedelta(minutes=10),
+    },
+    'calendar-reservations' : {
+        'depends'     : [],
+        'timeout'     : datetime.timedelta(minutes=14),
+        'concurrency' : 1,
+        'budget'      : datetime.timedelta(minutes=10),
+    },
+    'ecobee-control' : {
+        'depends'     : [],
+        'timeout'     : datetime.timedelta(minutes=14),
+        'concurrency' : 1,
+        'budget'      : datetime.timedelta(minutes=10),
+    },
+}
 
 ###############################################################################
 
-# A lockfile class so that we can use this lockfile in a context
-# manager (so that we can guarantee that the lockfile is removed
-# whenever the process exits, for any reason).
-class LockFile:
-    def __init__(self, lockfile, log):
-        self.lockfile = lockfile
-        self.opened = False
-        self.log = log
+def pid_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
-        # JMS Oct 2022: Change max lockfile timeout to 16 minutes
-        self.max_lockfile_age = datetime.timedelta(minutes=16)
+# Kill an orphaned job and everything that it started: ask nicely,
+# then give it up to 10 seconds before killing it with prejudice
+def kill_process_group(pid, log):
+    try:
+        os.killpg(pid, signal.SIGTERM)
+        for _ in range(10):
+            time.sleep(1)
+            os.killpg(pid, 0)
+        log.error(f"Process group {pid} did not exit after SIGTERM; sending SIGKILL")
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
 
-    def __enter__(self):
-        while True:
-            try:
-                fp = open(self.lockfile, mode='x')
-                fp.write(time.ctime())
-                fp.close()
-                self.log.debug("Locked!")
-                self.opened = True
-                return
-            except:
-                # We weren't able to create the file, so that means
-                # someone else has it locked.  If the lockfile is "old"
-                # (e.g., over an hour old), then something is wrong --
-                # alert a human.
-                try_again = self._check_lockfile_age()
-                if try_again:
-                    continue
-
-                # If we get here, the lock file isn't old.  So this is not
-                # an error -- we just exit.
-                self.log.warning("Unable to obtain lockfile -- exiting")
-                exit(0)
-
-    def _check_lockfile_age(self):
+###############################################################################
+
+# A per-job lockfile class so that we can use this lockfile in a
+# context manager (so that we can guarantee that the lockfile is
+# removed whenever the process exits, for any reason).
+#
+# A job with a concurrency of N has N lockfiles ("slots"); we take the
+# first one that is available.  Each lockfile contains the PID of the
+# run-all process that holds it and the PID of the job's script, so
+# that we can tell if a lockfile is stale (vs. the job is just still
+# running).
+class JobLock:
+    def __init__(self, name, job, log):
+        self.name     = name
+        self.timeout  = job['timeout']
+        self.log      = log
+        self.lockfile = None
+        self.slots    = [ os.path.join(lock_dir, f'run-all-{name}.{i}.lock')
+                          for i in range(job['concurrency']) ]
+
+    # Returns True if we got a lock slot, False otherwise
+    def acquire(self):
+        for filename in self.slots:
+            if self._create(filename):
+                return True
+
+            # If the lockfile is stale, remove it and try again
+            if self._check_stale(filename) and self._create(filename):
+                return True
+
+        return False
+
+    def _create(self, filename):
         try:
-            lockfile_stat = os.stat(self.lockfile)
-        except:
-            self.log.error(f"Unable to stat() the lockfile {self.lockfile}")
-            exit(1)
+            fd = os.open(filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
 
-        now = datetime.datetime.now()
-        lockfile_create = datetime.datetime.fromtimestamp(lockfile_stat.st_ctime)
-        age = now - lockfile_create
-        if age >= self.max_lockfile_age:
-            self.log.error(f"Lockfile is too old ({self.lockfile})")
-            self.log.error(f"Created: {lockfile_create}")
-            self.log.error(f"Age: {age}")
-            # In Oct 2022, some "awk" process is hanging every day,
-            # and we get stale lockfiles.  Hence, after the timeout,
-            # just remove the lockfile (vs. exiting in error).
-            #exit(1)
-            self.log.error("REMOVING LOCKFILE")
-            os.unlink(self.lockfile)
+        self.started = time.time()
+        with os.fdopen(fd, 'w') as fp:
+            json.dump({ 'pid' : os.getpid(), 'child' : None,
+                        'started' : self.started }, fp)
+
+        self.lockfile = filename
+        self.log.debug(f"{self.name}: Locked {filename}")
+        return True
+
+    # Record the PID of the job's script in the lockfile
+    def set_child(self, pid):
+        with open(self.lockfile, 'w') as fp:
+            json.dump({ 'pid' : os.getpid(), 'child' : pid,
+                        'started' : self.started }, fp)
+
+    # Returns True if the lockfile was stale (and was removed)
+    def _check_stale(self, filename):
+        try:
+            with open(filename) as fp:
+                info = json.load(fp)
+            pid     = info['pid']
+            child   = info['child']
+            started = info['started']
+        except FileNotFoundError:
             return True
+        except Exception:
+            # Old-style or partially-written lockfile: fall back to
+            # its age
+            pid     = None
+            child   = None
+            started = os.stat(filename).st_ctime
 
-        # If we get here, the lockfile isn't too old.  So just return.
-        return False
+        age = datetime.timedelta(seconds=time.time() - started)
 
-    def __exit__(self, exception_type, exception_value, exeception_traceback):
-        if self.opened:
+        # If the run-all that owns this lock is still running, it will
+        # enforce the timeout on its job.  The lock isn't stale.
+        if pid_alive(pid):
+            return False
+
+        if pid_alive(child):
+            # The run-all that owns this lock died, but its job is
+            # still running.  Leave it alone unless it's past its
+            # timeout.
+            if age < self.timeout:
+                return False
+
+            self.log.error(f"{self.name}: Orphaned job (PID {child}) has been running for {age}; killing it")
+            kill_process_group(child, self.log)
+
+        elif pid is None and age < self.timeout:
+            return False
+
+        self.log.error(f"{self.name}: REMOVING STALE LOCKFILE {filename} (age: {age})")
+        try:
+            os.unlink(filename)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def release(self):
+        if self.lockfile:
             os.unlink(self.lockfile)
-            self.log.debug("Unlocked")
+            self.log.debug(f"{self.name}: Unlocked")
+            self.lockfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exeception_traceback):
+        self.release()
+
+###############################################################################
+
+# Job states
+JOB_SUCCESS = 'success'
+JOB_FAILED  = 'failed'
+JOB_SKIPPED = 'skipped'
+JOB_TIMEOUT = 'timeout'
+
+# Serialize writing job output to stdout so that the output of jobs
+# running in parallel does not get interleaved
+output_lock = threading.Lock()
+
+# Wait for a job to exit (up to timeout seconds).  Returns the job's
+# resource usage (i.e., the same information that
+# resource.getrusage(RUSAGE_CHILDREN) would give, but for just this
+# job, even when other jobs are running in parallel), or None if the
+# job did not exit in time.
+#
+# If the job is still running after budget seconds, call over_budget()
+# (once), so that we can alert about a hung job without waiting for it
+# to finish or time out.
+def wait_for_job(proc, timeout, budget=None, over_budget=None):
+    start    = time.time()
+    deadline = start + timeout
+    while True:
+        pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        if pid == proc.pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return rusage
+
+        now = time.time()
+        if over_budget and now - start >= budget:
+            over_budget()
+            over_budget = None
+        if now >= deadline:
+            return None
+        time.sleep(0.5)
+
+def run_job(name, job, log):
+    job_dir = os.path.join(git_top, 'media', 'linux', job.get('dir', name))
+    script  = job.get('script', 'run.sh')
+
+    with JobLock(name, job, log) as lock:
+        if not lock.acquire():
+            log.warning(f"{name}: Already running {job['concurrency']} time(s) -- skipping")
+            return JOB_SKIPPED
+
+        log.info(f"{name}: Starting")
+        start = time.time()
+
+        # Run the job in its own session so that we can kill it (and
+        # anything it started) if it times out
+        proc = subprocess.Popen([f"./{script}"], cwd=job_dir, env=os.environ,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                start_new_session=True)
+        lock.set_child(proc.pid)
+
+        # Read the job's output in the background (so that the job
+        # doesn't block on a full pipe) while we wait for it
+        output = list()
+        reader = threading.Thread(target=lambda: output.append(proc.stdout.read()))
+        reader.start()
+
+        # Alert as soon as the job goes over its budget (i.e., while
+        # it is still running)
+        alerted = list()
+        def _over_budget():
+            alerted.append(True)
+            log.critical(f"{name}: Still running after its budget of {job['budget']}")
+
+        timed_out = False
+        rusage = wait_for_job(proc, job['timeout'].total_seconds(),
+                              budget=job['budget'].total_seconds(),
+                              over_budget=_over_budget)
+        if rusage is None:
+            timed_out = True
+            log.error(f"{name}: Timed out after {job['timeout']}; killing it")
+            os.killpg(proc.pid, signal.SIGTERM)
+            rusage = wait_for_job(proc, 10)
+            if rusage is None:
+                os.killpg(proc.pid, signal.SIGKILL)
+                rusage = wait_for_job(proc, 24 * 60 * 60)
+
+        end = time.time()
+        reader.join()
+        proc.stdout.close()
+
+        with output_lock:
+            sys.stdout.write(f"===== {name} output\n")
+            sys.stdout.write(output[0].decode('utf-8', errors='replace'))
+            sys.stdout.flush()
+
+        if timed_out:
+            state = JOB_TIMEOUT
+        elif proc.returncode != 0:
+            state = JOB_FAILED
+        else:
+            state = JOB_SUCCESS
+
+        record_job_run(name, start, end, state, proc.returncode, rusage, log)
+
+        elapsed = datetime.timedelta(seconds=round(end - start))
+        if alerted:
+            log.warning(f"{name}: Ran for {elapsed}, which is over its budget of {job['budget']}")
+        elif elapsed > job['budget']:
+            log.critical(f"{name}: Ran for {elapsed}, which is over its budget of {job['budget']}")
+
+        if state != JOB_SUCCESS:
+            log.error(f"{name}: Failed with exit status {proc.returncode} (ran for {elapsed})")
+            return JOB_FAILED
+
+        log.info(f"{name}: Finished (ran for {elapsed})")
+        return JOB_SUCCESS
+
+###############################################################################
+#
+# Job history
+#
+###############################################################################
+
+def open_history_db():
+    conn = sqlite3.connect(history_db, timeout=60)
+    conn.execute('''CREATE TABLE IF NOT EXISTS job_runs (
+                        id          INTEGER PRIMARY KEY,
+                        job         TEXT NOT NULL,
+                        start       REAL NOT NULL,
+                        end         REAL NOT NULL,
+                        duration    REAL NOT NULL,
+                        state       TEXT NOT NULL,
+                        exit_status INTEGER,
+                        max_rss_kb  INTEGER,
+                        user_cpu    REAL,
+                        system_cpu  REAL
+                    )''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS job_runs_job_start
+                    ON job_runs (job, start)''')
+    return conn
+
+# Save the metrics of a single run of a job.  Don't let a problem with
+# the history database affect running the jobs.
+def record_job_run(name, start, end, state, exit_status, rusage, log):
+    try:
+        conn = open_history_db()
+        with conn:
+            conn.execute('''INSERT INTO job_runs
+                                (job, start, end, duration, state,
+                                 exit_status, max_rss_kb, user_cpu,
+                                 system_cpu)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (name, start, end, end - start, state,
+                          exit_status, rusage.ru_maxrss,
+                          rusage.ru_utime, rusage.ru_stime))
+        conn.close()
+    except Exception as e:
+        log.error(f"{name}: Unable to record job history in {history_db}: {e}")
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = max(0, int(round(pct / 100 * len(values))) - 1)
+    return values[index]
+
+def _minutes(seconds):
+    return f'{seconds / 60:6.1f}m'
+
+# Print a summary of the job history for the last "days" days: per
+# job, the p50 / p95 / max duration, peak RSS, and CPU time, and then
+# the per-week p50 duration (to see if jobs are creeping up).
+def report_history(days):
+    conn = open_history_db()
+    since = time.time() - days * 24 * 60 * 60
+    cur = conn.execute('''SELECT job, start, duration, state, max_rss_kb,
+                                   user_cpu + system_cpu
+                            FROM job_runs
+                            WHERE start>=?
+                            ORDER BY job, start''', (since,))
+
+    history = dict()
+    for job, start, duration, state, rss, cpu in cur.fetchall():
+        if job not in history:
+            history[job] = list()
+        history[job].append((start, duration, state, rss, cpu))
+    conn.close()
+
+    if not history:
+        print(f"No job history in the last {days} days ({history_db})")
+        return
+
+    print(f"Job history for the last {days} days ({history_db})\n")
+    print(f"{'Job':24} {'Runs':>5} {'Fail':>5} {'p50':>7} {'p95':>7} {'max':>7} {'budget':>7} {'RSS MB':>7} {'CPU p50':>8}")
+    for name, runs in sorted(history.items()):
+        durations = [ run[1] for run in runs ]
+        failures  = len([ run for run in runs if run[2] != JOB_SUCCESS ])
+        rss       = max(run[3] or 0 for run in runs) / 1024
+        cpu       = percentile([ run[4] or 0 for run in runs ], 50)
+        budget    = jobs[name]['budget'].total_seconds() if name in jobs else None
+        print(f"{name:24} {len(runs):5} {failures:5} "
+              f"{_minutes(percentile(durations, 50))} "
+              f"{_minutes(percentile(durations, 95))} "
+              f"{_minutes(max(durations))} "
+              f"{_minutes(budget) if budget else '      -':>7} "
+              f"{rss:7.1f} {cpu:7.1f}s")
+
+    print(f"\nWeekly p50 duration (oldest week first)\n")
+    for name, runs in sorted(history.items()):
+        weeks = dict()
+        for run in runs:
+            week = int((run[0] - since) // (7 * 24 * 60 * 60))
+            weeks.setdefault(week, list()).append(run[1])
+        trend = [ _minutes(percentile(weeks[week], 50)).strip()
+                  if week in weeks else '-'
+                  for week in range(max(weeks) + 1) ]
+        print(f"{name:24} {' '.join(trend)}")
+
+#---------------------------------------------------------------------------
+
+# Make sure that all dependencies exist and that there are no cycles
+def check_jobs(jobs, log):
+    for name, job in jobs.items():
+        for dep in job['depends']:
+            if dep not in jobs:
+                log.critical(f"Job {name} depends on unknown job {dep}")
+                exit(1)
+
+    visiting = set()
+    visited  = set()
+    def _visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            log.critical(f"Job dependency cycle involving {name}")
+            exit(1)
+        visiting.add(name)
+        for dep in jobs[name]['depends']:
+            _visit(dep)
+        visiting.remove(name)
+        visited.add(name)
+
+    for name in jobs:
+        _visit(name)
+
+# Run all the jobs, each as soon as all of its dependencies have
+# completed.  Returns a dictionary of job name -> job state.
+def run_jobs(jobs, max_parallel, log):
+    check_jobs(jobs, log)
+
+    states  = dict()
+    pending = list(jobs.keys())
+    running = dict()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while pending or running:
+            for name in list(pending):
+                deps = [ states.get(dep) for dep in jobs[name]['depends'] ]
+                if any(state in [JOB_FAILED, JOB_SKIPPED] for state in deps):
+                    log.warning(f"{name}: A job that it depends on did not succeed -- skipping")
+                    states[name] = JOB_SKIPPED
+                    pending.remove(name)
+                elif all(state == JOB_SUCCESS for state in deps):
+                    future = executor.submit(run_job, name, jobs[name], log)
+                    running[future] = name
+                    pending.remove(name)
+
+            if not running:
+                continue
+
+            done, _ = concurrent.futures.wait(running,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    states[name] = future.result()
+                except Exception as e:
+                    log.error(f"{name}: Unable to run job: {e}")
+                    states[name] = JOB_FAILED
+
+    return states
 
 #---------------------------------------------------------------------------
 
+def setup_cli_args():
+    parser = argparse.ArgumentParser(description='Run all the Linux cron jobs')
+    parser.add_argument('--max-parallel',
+                        type=int,
+                        default=max_parallel,
+                        help='Maximum number of jobs to run at the same time')
+    parser.add_argument('--budget',
+                        action='append',
+                        default=list(),
+                        metavar='JOB=MINUTES',
+                        help='Override the run time budget of a job (can be specified multiple times)')
+    parser.add_argument('--slack-token-filename',
+                        help='File containing the Slack bot authorization token (for alerts about jobs that are over their budget)')
+
+    parser.add_argument('--report',
+                        action='store_true',
+                        help='Instead of running the jobs, print a report of the job run history')
+    parser.add_argument('--report-days',
+                        type=int,
+                        default=28,
+                        help='Number of days of history to include in --report')
+
+    parser.add_argument('jobs',
+                        nargs='*',
+                        metavar='job',
+                        help='Only run these jobs (and ignore their dependencies)')
+
+    args = parser.parse_args()
+
+    for name in args.jobs:
+        if name not in jobs:
+            print(f"ERROR: Unknown job: {name}")
+            exit(1)
+
+    for budget in args.budget:
+        name, _, minutes = budget.partition('=')
+        if name not in jobs:
+            print(f"ERROR: Unknown job in --budget: {name}")
+            exit(1)
+        try:
+            jobs[name]['budget'] = datetime.timedelta(minutes=float(minutes))
+        except ValueError:
+            print(f"ERROR: Invalid --budget value: {budget}")
+            exit(1)
+
+    return args
+
 def main():
+    args = setup_cli_args()
+    if args.report:
+        report_history(args.report_days)
+        exit(0)
+
     log = ECC.setup_logging(info=True, debug=True,
-                            logfile=logfile, rotate=True)
-
-    # Only run if we can get the logfile
-    with LockFile(lockfile, log) as lockfile_obj:
-        for subdir in [
-                'ricoh',
-                'email-patch-tuesday',
-                'ps-queries',
-                'calendar-audit',
-                'calendar-reservations',
-                'ecobee-control',
-            ]:
-            os.chdir(os.path.join(git_top, 'media', 'linux', subdir))
-            subprocess.run(["./run.sh"], env=os.environ, check=True)
+                            logfile=logfile, rotate=True,
+                            slack_token_filename=args.slack_token_filename)
+
+    # Jobs that only run at certain times of day use this (rather than
+    # the time that they happen to start, which may be well after this
+    # run started if they depend on other jobs)
+    os.environ['RUN_ALL_START'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    to_run = jobs
+    if args.jobs:
+        to_run = { name : dict(jobs[name], depends=[]) for name in args.jobs }
+
+    states = run_jobs(to_run, args.max_parallel, log)
+
+    failed = [ name for name, state in states.items() if state == JOB_FAILED ]
+    if failed:
+        log.error(f"Failed jobs: {', '.join(failed)}")
+        exit(1)
 
 if __name__ == '__main__':
     main()
@@ -12,13 +12,15 @@ set +ux
 . ./py310/bin/activate
 set -ux
 
-# Set timeout for 14.5 minutes because periodically Google APIs
-# take a long time for no apparent reason
+# run-all.py enforces a timeout on each of its jobs (the longest is
+# 60 minutes), and jobs may overlap the next cron run.  So this
+# timeout is just a backstop in case run-all.py itself hangs.
 $TOP/slack/runner.py \
     --slack-token-filename $HOME/credentials/slack-token.txt \
     --logfile $HOME/logfiles/linux/runner-log.txt \
-    --child-timeout 900 \
+    --child-timeout 3900 \
     --verbose \
     --comment "Linux cron run-all automation" \
     -- \
-    ./run-all.py
+    ./run-all.py \
+    --slack-token-filename $HOME/credentials/slack-token.txt
@@ -23,16 +23,25 @@ import ECC
 import Google
 
 import re
+import json
 import time
 import calendar
 import shutil
 import argparse
 import humanize
+import select
+import signal
+import struct
+import threading
+import concurrent.futures
 
 from pprint import pprint
 
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
+from pydrive2.files import ApiRequestError
+from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
 
 # Globals
 guser_cred_file = 'user-credentials.json'
@@ -54,6 +63,16 @@ verbose = True
 debug = False
 logfile = "log.txt"
 file_stable_secs = 60
+upload_workers = 1
+# --watch mode: seconds that an incoming file must be quiet after
+# being closed / moved in before we process it, and how often to
+# re-scan the incoming directory anyway (just in case we missed an
+# event)
+watch_debounce_secs = 5
+watch_rescan_secs = 300
+# Resumable upload chunk size, in MiB (Google requires chunks to be a
+# multiple of 256KiB)
+upload_chunk_mib = 8
 # "ECC Recordings" Google Shared Drive ID
 google_shared_drive_id = '0AJQlNh2zkxqWUk9PVA'
 
@@ -72,8 +91,160 @@ class GTDFile:
         self.folder_webviewlink = folder_webviewlink
         self.file_webviewlink   = file_webviewlink
 
+# Resumable upload session URIs, persisted in a JSON file in the data
+# dir so that an upload that is interrupted (e.g., by a dropped
+# connection) resumes from its last uploaded chunk on the next run.
+# Sessions are indexed by filename, and are only re-used if the file's
+# size and mtime have not changed.
+class UploadSessions:
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock     = threading.Lock()
+        self.sessions = dict()
+
+        if os.path.exists(filename):
+            try:
+                with open(filename) as fp:
+                    self.sessions = json.load(fp)
+            except Exception as e:
+                log.warning(f"Unable to read upload sessions file {filename} ({e}); ignoring it")
+
+    def _write(self):
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(self.sessions, fp, indent=4)
+        os.replace(tmp, self.filename)
+
+    def get(self, filename, size, mtime):
+        with self.lock:
+            session = self.sessions.get(os.path.basename(filename))
+            if (session is None or
+                session['size'] != size or
+                session['mtime'] != mtime):
+                return None
+            return session['uri']
+
+    def save(self, filename, uri, size, mtime):
+        with self.lock:
+            self.sessions[os.path.basename(filename)] = {
+                'uri'   : uri,
+                'size'  : size,
+                'mtime' : mtime,
+            }
+            self._write()
+
+    def remove(self, filename):
+        with self.lock:
+            if self.sessions.pop(os.path.basename(filename), None) is not None:
+                self._write()
+
+#-------------------------------------------------------------------
+
+# Cache of Google Drive folder IDs, indexed by "parent ID/folder name".
+# It is persisted in a JSON file in the data dir, and memoized in
+# memory.  Each cached folder is checked once per upload pass (i.e.,
+# once per process when run from cron): uploading into a folder in the
+# trash succeeds, and the local file would then be deleted.  If the
+# folder is gone (404) or in the trash, it is dropped from the cache
+# and found / created again.
+class FolderCache:
+    def __init__(self, filename):
+        self.filename  = filename
+        self.lock      = threading.Lock()
+        self.folders   = dict()
+        self.checked   = set()
+
+        if os.path.exists(filename):
+            try:
+                with open(filename) as fp:
+                    self.folders = json.load(fp)
+            except Exception as e:
+                log.warning(f"Unable to read folder cache file {filename} ({e}); ignoring it")
+
+    def _write(self):
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(self.folders, fp, indent=4)
+        os.replace(tmp, self.filename)
+
+    @staticmethod
+    def _key(parent_id, folder_name):
+        return f'{parent_id}/{folder_name}'
+
+    # Returns the folder, or None if not cached
+    def get(self, parent_id, folder_name):
+        with self.lock:
+            return self.folders.get(self._key(parent_id, folder_name))
+
+    # Has this folder ID been checked against Google during this pass?
+    def is_checked(self, folder_id):
+        with self.lock:
+            return folder_id in self.checked
+
+    def mark_checked(self, folder_id):
+        with self.lock:
+            self.checked.add(folder_id)
+
+    def put(self, parent_id, folder_name, folder):
+        key = self._key(parent_id, folder_name)
+        with self.lock:
+            self.checked.add(folder['id'])
+            self.folders[key] = {
+                'id'            : folder['id'],
+                'alternateLink' : folder['alternateLink'],
+            }
+            self._write()
+            return self.folders[key]
+
+    # Forget a folder (and anything cached underneath it)
+    def invalidate(self, folder_id):
+        with self.lock:
+            parents = set([folder_id])
+            changed = True
+            while changed:
+                changed = False
+                for key, folder in list(self.folders.items()):
+                    parent_id = key.split('/', 1)[0]
+                    if folder['id'] in parents or parent_id in parents:
+                        parents.add(folder['id'])
+                        del self.folders[key]
+                        changed = True
+            self._write()
+
+folder_cache = None
+
 #-------------------------------------------------------------------
 
+# Only a specific name format
+mp3_filename_re = re.compile(r'^.\d+-(\d\d\d\d)(\d\d)\d\d-\d\d\d\d\d\d.mp3$',
+                             flags=re.IGNORECASE)
+
+# Return a ScannedFile for dir/name, or None if it is not an MP3 file
+# that we care about.
+def scan_mp3_file(dir, name):
+    m = mp3_filename_re.match(name)
+    if m is None:
+        return None
+
+    filename = os.path.join(dir, name)
+    if not os.path.isfile(filename):
+        return None
+
+    # Parse the filename
+    year = m.group(1)
+    month_num = m.group(2)
+    month = "{0}-{1}".format(month_num,
+                             calendar.month_name[int(month_num)])
+
+    s = os.stat(filename)
+
+    return ScannedFile(filename=name,
+                       year=year,
+                       month=month,
+                       size=s.st_size,
+                       mtime=s.st_mtime,
+                       uploaded=False)
+
 def find_mp3_files(dir):
     scan = os.scandir(dir)
     scanned_files = []
@@ -82,28 +253,11 @@ def find_mp3_files(dir):
         if not entry.is_file():
             continue
 
-        # Only a specific name format
-        m = re.match(pattern=r'^.\d+-(\d\d\d\d)(\d\d)\d\d-\d\d\d\d\d\d.mp3$',
-                     flags=re.IGNORECASE,
-                     string=entry.name)
-        if m is None:
+        sfile = scan_mp3_file(dir, entry.name)
+        if sfile is None:
             continue
 
-        # Parse the filename
-        year = m.group(1)
-        month_num = m.group(2)
-        month = "{0}-{1}".format(month_num,
-                                 calendar.month_name[int(month_num)])
-
-        s = entry.stat()
-
         # Save the found file in a list
-        sfile = ScannedFile(filename=entry.name,
-                            year=year,
-                            month=month,
-                            size=s.st_size,
-                            mtime=s.st_mtime,
-                            uploaded=False)
         scanned_files.append(sfile)
 
     return scanned_files
@@ -134,7 +288,13 @@ def google_login():
 
 #===================================================================
 
-def google_upload_file(drive, dest_folder, upload_filename):
+# Upload a file in chunks via a resumable upload.  If a prior run
+# started uploading this file, resume that upload session from the last
+# chunk that Google received.
+#
+# This may be invoked from multiple threads at the same time, so use a
+# thread-private HTTP object.
+def google_upload_file(drive, dest_folder, upload_filename, sessions):
     log.debug(f'Uploading GTD file "{upload_filename}" (parent: {dest_folder["id"]})')
     basename = os.path.basename(upload_filename)
     metadata = {
@@ -143,19 +303,130 @@ def google_upload_file(drive, dest_folder, upload_filename):
         'parents'  : [ {'id': dest_folder['id']} ],
     }
 
-    file = drive.CreateFile(metadata)
-    file.SetContentFile(upload_filename)
-    file.Upload()
+    s     = os.stat(upload_filename)
+    size  = s.st_size
+    mtime = s.st_mtime
+    http  = drive.auth.Get_Http_Object()
+
+    def _make_request():
+        media = MediaFileUpload(upload_filename,
+                                mimetype=Google.mime_types['mp3'],
+                                chunksize=args.upload_chunk_mib * (2 ** 20),
+                                resumable=True)
+        return (drive.auth.service
+                .files()
+                .insert(body=metadata,
+                        media_body=media,
+                        supportsAllDrives=True,
+                        fields='id,alternateLink'))
+
+    request  = _make_request()
+    response = None
+    uri = sessions.get(upload_filename, size, mtime)
+    if uri:
+        log.info(f'Resuming prior upload session of "{basename}"')
+        try:
+            response = google_resume_upload(request, http, uri, size)
+        except HttpError as e:
+            # Upload sessions expire after a week; if the prior session
+            # is gone, start a new one.
+            if e.resp.status not in [404, 410]:
+                raise
+            log.warning(f'Prior upload session of "{basename}" has expired; starting over')
+            sessions.remove(upload_filename)
+            uri     = None
+            request = _make_request()
+
+    while response is None:
+        try:
+            status, response = request.next_chunk(http=http, num_retries=3)
+        except HttpError as e:
+            # Upload sessions expire after a week; if the prior session
+            # is gone, start a new one.
+            if uri and e.resp.status in [404, 410]:
+                log.warning(f'Prior upload session of "{basename}" has expired; starting over')
+                sessions.remove(upload_filename)
+                uri     = None
+                request = _make_request()
+                continue
+            raise
+
+        # Save the session URI as soon as we have it
+        if request.resumable_uri and request.resumable_uri != uri:
+            uri = request.resumable_uri
+            sessions.save(upload_filename, uri, size, mtime)
+
+        if status:
+            log.debug(f'Uploaded {int(status.progress() * 100)}% of "{basename}"')
+
+    sessions.remove(upload_filename)
+    log.debug(f'Successfully uploaded GTD file: "{basename}" (ID: {response["id"]})')
+
+    return response
+
+# Ask Google how much of a file a prior resumable upload session
+# already received, and set up the request to continue from there.  If
+# Google already has the whole file, return the (finished) response;
+# otherwise, return None.
+def google_resume_upload(request, http, uri, size):
+    resp, content = http.request(uri, method='PUT',
+                                 headers={ 'Content-Length' : '0',
+                                           'Content-Range'  : f'bytes */{size}' })
+    if resp.status in [200, 201]:
+        return request.postproc(resp, content)
+    elif resp.status != 308:
+        raise HttpError(resp, content, uri=uri)
+
+    # The Range header (e.g., "bytes=0-1048575") is absent if Google
+    # has nothing yet
+    request.resumable_uri      = uri
+    request.resumable_progress = 0
+    if 'range' in resp:
+        request.resumable_progress = int(resp['range'].split('-')[1]) + 1
+
+    return None
 
-    log.debug(f'Successfully uploaded GTD file: "{basename}" (ID: {file["id"]})')
+#-------------------------------------------------------------------
 
-    return file
+# Check whether a cached folder is gone or in the trash (before its
+# first use in a pass, and after an upload into it fails).  Any other
+# error (e.g., the network is down) says nothing about the folder, so
+# keep trusting the cache.
+def google_folder_is_gone(drive, folder):
+    try:
+        gfile = drive.CreateFile({'id': folder['id']})
+        gfile.FetchMetadata(fields='id,labels')
+    except ApiRequestError as e:
+        if e.error.get('code') == 404:
+            log.debug(f"Cached GTD folder ID {folder['id']} no longer exists")
+            return True
+        return False
+    except Exception:
+        return False
+
+    if gfile['labels'].get('trashed', False):
+        log.debug(f"Cached GTD folder ID {folder['id']} is in the trash")
+        return True
+
+    return False
 
 #-------------------------------------------------------------------
 
 # Find a folder identified by this name/parent.  If it doesn't
 # exist, create it.
 def google_find_or_create_folder(drive, folder_name, parent_id):
+    # Check the cache first
+    folder = folder_cache.get(parent_id, folder_name)
+    if folder is not None:
+        if (folder_cache.is_checked(folder['id']) or
+            not google_folder_is_gone(drive, folder)):
+            log.debug(f'Found cached GTD target folder: "{folder_name}" (ID: {folder["id"]})')
+            folder_cache.mark_checked(folder['id'])
+            return folder
+
+        log.info(f'Cached GTD target folder "{folder_name}" (ID: {folder["id"]}) is gone or in the trash; looking for it again')
+        folder_cache.invalidate(folder['id'])
+
     q = f"'{parent_id}' in parents"
     q += f" and title='{folder_name}'"
     q += f" and mimeType='{Google.mime_types['folder']}'"
@@ -168,7 +439,7 @@ def google_find_or_create_folder(drive, folder_name, parent_id):
     for folder in file_list:
         if folder['title'] == folder_name:
             log.debug(f'Found GTD target folder: "{folder_name}" (ID: {folder["id"]})')
-            return folder
+            return folder_cache.put(parent_id, folder_name, folder)
 
     # If we didn't find it, then go create that folder
     log.debug("GTD target folder not found -- need to create it")
@@ -179,8 +450,8 @@ def google_find_or_create_folder(drive, folder_name, parent_id):
     }
     folder = drive.CreateFile(data)
     folder.Upload()
-    log.debug("Created GTD target folder '{folder_name}' (ID: {folder['id']})")
-    return folder
+    log.debug(f"Created GTD target folder '{folder_name}' (ID: {folder['id']})")
+    return folder_cache.put(parent_id, folder_name, folder)
 
 #-------------------------------------------------------------------
 
@@ -271,37 +542,83 @@ Greg</p>'''
 #-------------------------------------------------------------------
 
 def google_upload_files(drive, shared_drive, scanned_files):
-    gtded_files = []
-    for file in scanned_files:
-        gtdfile = GTDFile(scannedfile=file,
-                          folder_webviewlink=None,
-                          file_webviewlink=None)
+    sessions = UploadSessions(os.path.join(args.data_dir, 'upload-sessions.json'))
 
+    global folder_cache
+    folder_cache = FolderCache(os.path.join(args.data_dir, 'folder-cache.json'))
+
+    def _upload(gtdfile, folder):
+        file = gtdfile.scannedfile
         src_filename = os.path.join(to_gtd_dir, file.filename)
+
         try:
-            folder = google_create_dest_folder(drive, shared_drive,
-                                            file.year, file.month)
-            gtdfile.folder_webviewlink = folder['alternateLink']
+            uploaded_file = google_upload_file(drive, folder, src_filename,
+                                               sessions)
+        except Exception as e:
+            # If the destination folder has disappeared or been
+            # trashed, make sure we don't use it again next time.
+            if ((isinstance(e, HttpError) and e.resp.status == 404) or
+                google_folder_is_gone(drive, folder)):
+                folder_cache.invalidate(folder['id'])
+            raise
+        gtdfile.file_webviewlink = uploaded_file['alternateLink']
 
-            uploaded_file = google_upload_file(drive, folder, src_filename)
-            gtdfile.file_webviewlink = uploaded_file['alternateLink']
+        log.info(f"Uploaded {file.filename} to GTD successfully")
 
-            log.info(f"Uploaded {file.filename} to GTD successfully")
+        # From this file from the "to GTD" dir so that we
+        # don't try to upload it again the next time through
+        os.unlink(src_filename)
 
-            # From this file from the "to GTD" dir so that we
-            # don't try to upload it again the next time through
-            os.unlink(src_filename)
+        # Happiness!
+        file.uploaded = True
 
-            # Happiness!
-            file.uploaded = True
+    # Find / create all the destination folders first (serially), so
+    # that concurrent uploads don't race to create the same folder.
+    gtded_files = []
+    folders = dict()
+    for file in scanned_files:
+        gtdfile = GTDFile(scannedfile=file,
+                          folder_webviewlink=None,
+                          file_webviewlink=None)
+        gtded_files.append(gtdfile)
 
+        key = (file.year, file.month)
+        try:
+            if key not in folders:
+                folders[key] = google_create_dest_folder(drive, shared_drive,
+                                                         file.year, file.month)
+            gtdfile.folder_webviewlink = folders[key]['alternateLink']
         except:
             # Sadness :-(
             file.uploaded = False
             log.error("Unsuccessful GTD upload of {0}!".format(file.filename))
             raise
 
-        gtded_files.append(gtdfile)
+    # Now upload the files, up to args.upload_workers at a time
+    error = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.upload_workers) as executor:
+        futures = dict()
+        for gtdfile in gtded_files:
+            file = gtdfile.scannedfile
+            future = executor.submit(_upload, gtdfile,
+                                     folders[(file.year, file.month)])
+            futures[future] = gtdfile
+
+        for future in concurrent.futures.as_completed(futures):
+            file = futures[future].scannedfile
+            try:
+                future.result()
+            except Exception as e:
+                # Sadness :-(
+                file.uploaded = False
+                log.error("Unsuccessful GTD upload of {0}!".format(file.filename))
+                if error is None:
+                    error = e
+
+    # Let the other uploads finish before aborting (their upload
+    # sessions will be resumed next time)
+    if error is not None:
+        raise error
 
     # Send a single email with the results of all the GTD uploads
     google_email_results(shared_drive, gtded_files)
@@ -355,24 +672,170 @@ def check_for_incoming_ftp():
             log.info("--> File is still changing -- skipping")
             continue
 
-        # If we got here, the file is good! Copy it to the "to FTP"
-        # and "to Google Shared Drive" directories so that they will be
-        # processed.
-        log.info("Found incoming FTP file: {0}".format(file.filename))
-        filename = os.path.join(args.incoming_ftp_dir, file.filename)
-        shutil.copy2(src=filename, dst=to_gtd_dir)
-
-        # Finally, move the file to the archive directory for a
-        # "permanent" record (and so that we won't see it again on
-        # future passes through this directory).
-        global archive_dir
-        archive_filename = os.path.join(archive_dir, file.filename)
-        log.info("Checking to make sure archive file does not already exist: {}".format(archive_filename))
-        if os.path.exists(archive_filename):
-            log.info("Removing already-existing archive file: {}".format(archive_filename))
-            os.remove(archive_filename)
-        shutil.move(src=filename, dst=archive_dir)
-        log.info("Moved file to archive: {}".format(file.filename))
+        process_incoming_ftp_file(file)
+
+#-------------------------------------------------------------------
+
+def process_incoming_ftp_file(file):
+    # If we got here, the file is good! Copy it to the "to FTP"
+    # and "to Google Shared Drive" directories so that they will be
+    # processed.
+    log.info("Found incoming FTP file: {0}".format(file.filename))
+    filename = os.path.join(args.incoming_ftp_dir, file.filename)
+    shutil.copy2(src=filename, dst=to_gtd_dir)
+
+    # Finally, move the file to the archive directory for a
+    # "permanent" record (and so that we won't see it again on
+    # future passes through this directory).
+    global archive_dir
+    archive_filename = os.path.join(archive_dir, file.filename)
+    log.info("Checking to make sure archive file does not already exist: {}".format(archive_filename))
+    if os.path.exists(archive_filename):
+        log.info("Removing already-existing archive file: {}".format(archive_filename))
+        os.remove(archive_filename)
+    shutil.move(src=filename, dst=archive_dir)
+    log.info("Moved file to archive: {}".format(file.filename))
+
+####################################################################
+#
+# Event-driven (--watch) mode
+#
+####################################################################
+
+# Minimal wrapper around the Linux inotify API (via ctypes, so that we
+# don't need any additional Python modules).
+class Inotify:
+    IN_MODIFY      = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO    = 0x00000080
+    IN_NONBLOCK    = 0x00000800
+    IN_CLOEXEC     = 0x00080000
+
+    _event_header = struct.Struct('iIII')
+
+    def __init__(self, dir, mask):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(dir), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f'inotify_add_watch of {dir} failed')
+
+    def close(self):
+        os.close(self.fd)
+
+    # Wait up to timeout seconds for events.  Returns a list of (mask,
+    # name) tuples.
+    def read(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + self._event_header.size <= len(buf):
+            wd, mask, cookie, length = self._event_header.unpack_from(buf, offset)
+            offset += self._event_header.size
+            name = buf[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((mask, os.fsdecode(name)))
+
+        return events
+
+#-------------------------------------------------------------------
+
+# Run one processing / upload pass of the --watch loop.  An error
+# (e.g., an HttpError from Google, or the network being down) is logged
+# and then ignored: anything that didn't make it is still in the
+# incoming or "to GTD" directory, and will be tried again on the next
+# event or rescan.  Returns True if the pass succeeded.
+def watch_pass(description, func, *func_args):
+    try:
+        func(*func_args)
+        return True
+    except Exception as e:
+        log.exception(f"Error while {description} (will try again later): {e}")
+        return False
+
+#-------------------------------------------------------------------
+
+# Run forever, processing incoming FTP files as soon as they have been
+# completely written (i.e., closed or moved into the incoming
+# directory, and then quiet for args.watch_debounce_secs).
+#
+# NOTE: inotify does not see changes made to /mnt/c (etc.) in WSL by
+# Windows processes.  If inotify is not available, we fall back to
+# polling the incoming directory.
+def watch_incoming_ftp():
+    # Process anything that arrived while we weren't watching
+    watch_pass("checking for incoming FTP files", check_for_incoming_ftp)
+    watch_pass("uploading to Google", upload_to_google)
+
+    mask = Inotify.IN_CLOSE_WRITE | Inotify.IN_MOVED_TO | Inotify.IN_MODIFY
+    try:
+        inotify = Inotify(args.incoming_ftp_dir, mask)
+    except Exception as e:
+        inotify = None
+        log.warning(f"Unable to use inotify on {args.incoming_ftp_dir} ({e}); falling back to polling")
+
+    log.info(f"Watching for incoming FTP files in {args.incoming_ftp_dir}")
+
+    # Files that have been closed / moved in, and the last time we
+    # saw an event for them
+    pending = dict()
+    last_rescan = time.time()
+    while True:
+        if inotify is None:
+            time.sleep(int(args.file_stable_secs))
+            watch_pass("checking for incoming FTP files", check_for_incoming_ftp)
+            watch_pass("uploading to Google", upload_to_google)
+            continue
+
+        for event_mask, name in inotify.read(timeout=1):
+            if not mp3_filename_re.match(name):
+                continue
+
+            if event_mask & (Inotify.IN_CLOSE_WRITE | Inotify.IN_MOVED_TO):
+                log.debug(f"Got inotify event for {name}")
+                pending[name] = time.time()
+            elif name in pending:
+                # Still being written (e.g., a resumed FTP transfer);
+                # restart the debounce timer
+                pending[name] = time.time()
+
+        now = time.time()
+        ready = [name for name, stamp in pending.items()
+                 if now - stamp >= args.watch_debounce_secs]
+        for name in ready:
+            del pending[name]
+            file = scan_mp3_file(args.incoming_ftp_dir, name)
+            if file is None or file.size == 0:
+                continue
+            watch_pass(f"processing incoming FTP file {name}",
+                       process_incoming_ftp_file, file)
+
+        if ready:
+            watch_pass("uploading to Google", upload_to_google)
+
+        # Every so often, rescan the whole directory, just in case we
+        # missed an event (or a prior pass failed)
+        if now - last_rescan >= args.watch_rescan_secs:
+            last_rescan = now
+            watch_pass("checking for incoming FTP files", check_for_incoming_ftp)
+            watch_pass("uploading to Google", upload_to_google)
 
 ####################################################################
 #
@@ -403,6 +866,27 @@ def add_cli_args():
                         default=file_stable_secs,
                         help='Number of seconds for an incoming FTP file to not change before considered "complete"')
 
+    parser.add_argument('--upload-workers',
+                        type=int,
+                        default=upload_workers,
+                        help='Number of files to upload to Google at the same time')
+    parser.add_argument('--upload-chunk-mib',
+                        type=int,
+                        default=upload_chunk_mib,
+                        help='Size (in MiB) of each chunk of a resumable upload to Google')
+
+    parser.add_argument('--watch',
+                        action='store_true',
+                        help='Run forever, using Linux inotify to process incoming FTP files as soon as they are complete (instead of checking once and exiting)')
+    parser.add_argument('--watch-debounce-secs',
+                        type=int,
+                        default=watch_debounce_secs,
+                        help='In --watch mode, number of seconds an incoming FTP file must be quiet after it is closed before it is processed')
+    parser.add_argument('--watch-rescan-secs',
+                        type=int,
+                        default=watch_rescan_secs,
+                        help='In --watch mode, how often to re-scan the entire incoming FTP directory, just in case')
+
     parser.add_argument('--incoming-ftp-dir',
                         required=False,
                         default=incoming_ftp_dir,
@@ -456,6 +940,13 @@ def add_cli_args():
     smtp_server = args.smtp[0]
     ECC.setup_email(args.smtp_auth_file, smtp_server=smtp_server, log=log)
 
+    if args.upload_workers < 1:
+        log.error("--upload-workers must be at least 1")
+        exit(1)
+    if args.upload_chunk_mib < 1:
+        log.error("--upload-chunk-mib must be at least 1")
+        exit(1)
+
     if not os.path.isdir(args.data_dir):
         log.error('Data directory "{0}" does not exist or is not accessible'
                   .format(args.data_dir))
@@ -531,6 +1022,14 @@ def main():
     filename = os.path.join(args.data_dir, "lockfile")
     with LockFile(filename) as lockfile:
         setup()
+        if args.watch:
+            # Exit cleanly (and remove the lockfile) if we are killed
+            signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+
+            # This never returns.  Since we hold the lock, cron runs of
+            # this script will exit quietly while we're watching.
+            watch_incoming_ftp()
+
         check_for_incoming_ftp()
         upload_to_google()
 
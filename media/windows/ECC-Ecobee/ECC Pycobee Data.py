@@ -163,6 +163,61 @@
             'alter table thermRuntime add column actual_aq_score INTEGER;'
 
             Modified by DK Fowler ... 01-Jun-2021       --- v03.20
+
+    Modified to write the runtime interval records returned by each runtime report request in
+    a single batch, using INSERT ... ON CONFLICT DO UPDATE, rather than inserting each record
+    individually and handling duplicate-key errors by re-reading and updating the existing record.
+    As before, an existing record for a timeslot is only replaced if the new record contains at
+    least as much data, and blank records are skipped.  The runtime records for each thermostat
+    are committed once, when the thermostat has been processed.
+                                                        --- v03.30
+
+    Modified to keep the last (non-blank) runtime interval written for each thermostat in a small
+    watermark table, runtime_watermark, updated in the same transaction as the runtime records.
+    The last runtime interval is now read from this table at startup, rather than by scanning the
+    runtime table for the latest non-blank record.  An index on (thermostat_name, run_date, run_time)
+    is added to the runtime table (and created automatically in existing databases) for the fallback
+    lookup, used when a thermostat has no watermark yet, as after the upgrade.
+                                                        --- v03.31
+
+    Modified to keep a catalog of the archived databases, in a JSON file alongside the database
+    ({db filename}-archives.json).  When a database is archived, the catalog records the archive's
+    runtime interval range and the last runtime interval written for each thermostat.  When a new
+    database is created, the last runtime interval is now read from the catalog, rather than by
+    opening and searching the latest archive.  Archives from earlier versions are added to the
+    catalog the first time they're needed.  Archived databases are now written to the same folder
+    as the database, rather than the current working directory.
+                                                        --- v03.32
+
+    Modified to look up the thermostat sub-objects for the snapshot records with accessors compiled
+    from operator.attrgetter / itemgetter, vs. building and evaluating Python expressions with eval().
+    The table layout for each snapshot object (CREATE TABLE / INSERT SQL, field ordering, and the
+    accessor for the field values) is built once, the first time the object is written, and reused
+    for the other thermostats and list entries; tables already verified to exist are not checked
+    again.  The records for each snapshot object are written with a single executemany and commit.
+    The snapshot processing was moved from main to write_snapshot_records, and a benchmark added
+    (ECC_Ecobee_Snapshot_Benchmark.py) which writes the snapshot records for a sample thermostat
+    details response (ECCEcobee_Snapshot_Fixture.json).
+                                                        --- v03.33
+
+    Added a backup option (--backup-dir-path), which makes a consistent copy of the database using the
+    SQLite online backup API, then exits without polling the thermostats.  The copy is made a number of
+    pages at a time, so that a polling run writing to the database at the same time isn't blocked; the
+    backup restarts if the database is changed while it's in progress, and is retried later (or fails)
+    if it keeps being changed.  The copy may be compressed (--backup-compress).  The database's change
+    counter is saved with each backup, and the copy is skipped if the database hasn't changed since the
+    last one.
+                                                        --- v03.34
+
+    The historical runtime reports for the thermostats are now requested concurrently, by a bounded pool
+    of fetch threads (--fetch-workers, default 4), rather than one thermostat after another.  Requests are
+    spaced across the threads (runtime_request_min_interval_secs), and an expired access token is refreshed
+    once for all of them.  The records are still written by the main thread, which owns the database
+    connection, one thermostat at a time in the same order, so the records written are unchanged.  The fetch
+    threads return their messages with the reports, for the main thread to log and print under each
+    thermostat's heading; on a fatal error, a fetch thread raises RuntimeFetchError, and the main thread
+    sends the error e-mail and exits.
+                                                        --- v03.35
 """
 
 from datetime import datetime
@@ -172,6 +227,11 @@ import pytz
 import json
 import os
 import fnmatch
+import operator
+import gzip
+import shutil
+import threading
+from concurrent import futures
 import sys
 import argparse
 import smtplib
@@ -190,8 +250,8 @@ from dns.exception import DNSException
 from pythonping import ping
 
 # Define version
-eccpycobee_version = "03.20"
-eccpycobee_date = "01-Jun-2021"
+eccpycobee_version = "03.35"
+eccpycobee_date = "18-Oct-2026"
 
 # Parse the command line arguments for the filename locations, if present
 parser = argparse.ArgumentParser(description='''Epiphany Catholic Church Ecobee Thermostat Polling Application.
@@ -211,6 +271,12 @@ parser.add_argument("-i", "-int", "--interval-file", "--int-file-path", dest="in
                     default="ECCEcobee_therm_interval.json", help="thermostat revision interval filename path")
 parser.add_argument("-m", "--gmail_credentials_file_path", default="ECCEcobee_GMail_Credentials.txt",
                     help="default GMail user/pass credentials filename path")
+parser.add_argument("-b", "-backup", "--backup-dir", "--backup-dir-path", dest="backup_dir_path", default=None,
+                    help="back up the database to this folder, then exit (without polling the thermostats)")
+parser.add_argument("-z", "--backup-compress", dest="backup_compress", action="store_true",
+                    help="compress (gzip) the database backup")
+parser.add_argument("-w", "--fetch-workers", dest="fetch_workers", type=int, default=4,
+                    help="number of thermostats for which runtime reports are requested at once")
 parser.add_argument("-v", "-ver", "--version", action="store_true",
                     help="display application version information")
 
@@ -234,6 +300,38 @@ logger = logging.getLogger('pyecobee')
 # Location of database file...change as appropriate based on implementation location
 ECCEcobeeDatabase = args.database_file_path
 
+# Location of the catalog of archived database files; kept alongside the database
+ECCEcobeeArchiveCatalog = os.path.splitext(ECCEcobeeDatabase)[0] + "-archives.json"
+
+# Folder to which the database is backed up, if a backup is requested
+ECCEcobee_backup_dir = args.backup_dir_path
+# Number of database pages copied by each step of the online backup, and the pause between steps (seconds).
+# If other connections' writes restart the backup more than backup_max_restarts times, it is abandoned and
+# retried after backup_retry_delay_secs (doubling for each retry), up to backup_max_attempts in all.
+backup_pages_per_step = 1024
+backup_step_sleep_secs = 0.05
+backup_max_restarts = 3
+backup_max_attempts = 4
+backup_retry_delay_secs = 10
+
+# Number of threads requesting the thermostat runtime reports concurrently, and the minimum interval (seconds)
+# between the start of runtime report requests across all of the threads
+ECCEcobee_fetch_workers = max(1, args.fetch_workers)
+runtime_request_min_interval_secs = 1.0
+runtime_request_last_time = 0.0
+runtime_request_lock = threading.Lock()
+# Serializes refreshing the access tokens shared by the fetch threads
+ecobee_token_lock = threading.Lock()
+
+
+# Raised by a fetch thread on a fatal error, in place of send_mail_and_exit; the main thread reports the
+# messages collected by the fetch, then sends the error e-mail and exits
+class RuntimeFetchError(Exception):
+    def __init__(self, fetch_messages=None):
+        super().__init__("Fatal error while requesting thermostat runtime reports")
+        self.fetch_messages = fetch_messages if fetch_messages is not None else []
+
+
 # Location of the authorization file w/ tokens
 ECCAuthorize = args.authorize_file_path
 
@@ -497,8 +595,19 @@ SQLite_table_dict = {'settings': 'thermSettings', 'runtime': 'thermRuntime',
                      'security_settings': 'thermSecuritySettings'}
 '''
 
+# Caches used in writing the snapshot records; these are built as each object is first written, and kept
+# for the life of the process.  See get_snapshot_accessor, get_snapshot_layout and create_table_from_string.
+snapshot_accessor_dict = {}  # thermostat object path (e.g., 'devices[0].sensors') --> compiled accessor
+snapshot_layout_dict = {}  # (table, object) --> table layout (SQL, fields, accessor for the field values)
+snapshot_tables_verified = set()  # tables created or found to exist
+
 
 def main():
+    # If a database backup is requested, make it and exit, without polling the thermostats
+    if ECCEcobee_backup_dir:
+        backup_success = backup_db(ECCEcobeeDatabase, ECCEcobee_backup_dir, args.backup_compress)
+        sys.exit(0 if backup_success else 1)
+
     # Global variables used for informational logging
     global dup_update_cnt_total
     global dup_update_cnt_this_thermostat
@@ -545,6 +654,7 @@ def main():
     logger.info(F"Default API key filename:           {args.api_file_path}")
     logger.info(F"Thermo revision interval filename:  {args.int_file_path}")
     logger.info(F"Gmail credentials filename:         {args.gmail_credentials_file_path}")
+    logger.info(F"Runtime report fetch workers:       {ECCEcobee_fetch_workers}")
 
     # Attempt to open the credentials / authorization file and read contents
     try:
@@ -906,208 +1016,37 @@ def main():
     rev_days_cnt_dict = calc_revision_days(thermo_connected, last_rev_dict)
     logger.debug(F"Number of days to retrieve:  {rev_days_cnt_dict}")
 
-    # Next, begin to iterate through the thermostats, beginning at the last-revision date, and request
-    # runtime data from the Ecobee service.  The request must be broken up into no more than 31 days
-    # (30 days used here for safety).
-    eastern = pytz.timezone('US/Eastern')
+    # Next, request the runtime data from the Ecobee service for each thermostat, beginning at the last-revision
+    # date, and write it to the database.  The requests for the thermostats are made concurrently, by a bounded
+    # pool of fetch threads (see fetch_runtime_reports); the records are written here, by the one thread that
+    # owns the database connection, for one thermostat at a time in the same order as before.
     recs_written_total = 0
-    for thermo in read_interval_JSON:
-        logger.info(F"Beginning Ecobee runtime historical data processing for thermostat:  {thermo['thermostatName']}")
-        print(F"\nBeginning Ecobee runtime historical data processing for thermostat:  {thermo['thermostatName']}")
-        # Initialize the informational counters for this thermostat
-        total_rows_returned_this_thermostat = 0
-        recs_written_this_thermostat = 0
-        dup_update_cnt_this_thermostat = 0
-        blank_rec_cnt_this_thermostat = 0
-        # Set the start date for retrieval, either based on the first-connected date (usually for
-        # the initial run, where no previous data exists in the runtime db), or, the last revision
-        # date/time read from the database.
-        rev_date = last_rev_dict.get(thermo['thermostatName'])  # last_rev_dict previously generated from db reads
-        if rev_date == "000000000000":  # default for no records currently exist in db
-            # Use the first-connected date
-            start_datetime = datetime.strptime(thermo_connected.get(thermo['thermostatName']), "%Y-%m-%d %H:%M:%S")
-        else:
-            start_datetime = datetime.strptime(rev_date, "%y%m%d%H%M%S")
-        logger.debug(
-            F"Start date for runtime retrieval for thermostat {thermo['thermostatID']} set to {start_datetime}")
-        start_datetime_utc = start_datetime.astimezone(pytz.utc)
-        start_datetime = eastern.localize(start_datetime, is_dst=True)  # make the time offset aware
-
-        # Set the end date for retrieval, either based on 30 days from the start date (if start+30 days is
-        # less than the latest interval date), or, the latest date/time interval retrieved previously from
-        # the thermostat summary.  Note that the latest interval data is in UTC, so we must convert it to
-        # local time to pass to the API.
-        # now_datetime = datetime.now()
-        logger.debug(F"Runtime start + 30:  {start_datetime + timedelta(days=30)}")
-        interval_datetime_utc = datetime.strptime(
-            latest_runtime_intervals_dict.get(thermo['thermostatName']), "%y%m%d%H%M%S")
-        interval_datetime_local = pytz.utc.localize(interval_datetime_utc, is_dst=True).astimezone(eastern)
-        logger.debug(F"Latest interval date/time:  {interval_datetime_local}")
-        if (start_datetime + timedelta(days=30)) >= interval_datetime_local:
-            end_datetime = interval_datetime_local
-        else:
-            end_datetime = start_datetime + timedelta(days=30)
-        logger.debug(F"Runtime end datetime initialized at: {end_datetime} local time")
-
-        # The Ecobee runtime API actually uses UTC time for the call, but the library module used
-        # here converts local time to UTC for the underlying call; hence, the start/end date/times
-        # used here are all in local time.
-        while end_datetime <= interval_datetime_local:
-            logger.debug(F"Runtime retrieval start/end datetimes:  {start_datetime} :: {end_datetime}")
-
-            # Before calling the runtime report request, check the start date/time (in UTC format) against
-            # the latest interval date/time to ensure we're not needlessly calling the report request.
-            # This is based on recommendations from the Ecobee API documentation, as the runtime report
-            # request is a resource-intensive request, and can return a large amount of data.
-            # See references here for further info:
-            # https://www.ecobee.com/home/developer/api/documentation/v1/operations/get-runtime-report.shtml
-            # https://www.ecobee.com/home/developer/api/documentation/v1/operations/get-thermostat-summary.shtml
-            #
-            #   Note: we need to convert the start date/time to UTC format as (YYMMDDHHMMSS).
-            #   Note: the latest revision interval data was previously requested and stored in
-            #         read_interval_JSON['revisionList']
-            fmt_start_datetime = datetime.strftime(start_datetime_utc, "%y%m%d%H%M%S")
-            logger.debug(F"Converted start date/time for comparison:  {fmt_start_datetime}")
-
-            if fmt_start_datetime < latest_runtime_intervals_dict.get(thermo['thermostatName']):
-                logger.debug(
-                    F"Start date of {fmt_start_datetime} prior to latest revision interval date "
-                    F"{latest_runtime_intervals_dict.get(thermo['thermostatName'])}; requesting runtime data")
-
-                runtime_err_cnt = 0
-                runtime_err_occurred = True  # falsely set for initial loop iteration
-                timeout_err_occurred = False  # flag to indicate a timeout error occurred
-                while runtime_err_occurred and runtime_err_cnt <= 3:
-                    runtime_err_occurred = False  # reset to assume success
-                    no_interval_data_occurred = False
-                    try:
-                        runtime_report_response = ecobee_service.request_runtime_reports(
-                            selection=Selection(
-                                selection_type=SelectionType.THERMOSTATS.value,
-                                selection_match=thermo['thermostatID']),
-                            start_date_time=start_datetime,
-                            end_date_time=end_datetime,
-                            columns='auxHeat1,auxHeat2,auxHeat3,compCool1,compCool2,compHeat1,compHeat2,dehumidifier,'
-                                    'dmOffset,economizer,fan,humidifier,hvacMode,outdoorHumidity,outdoorTemp,sky,'
-                                    'ventilator,wind,zoneAveTemp,zoneCalendarEvent,zoneClimate,zoneCoolTemp,'
-                                    'zoneHeatTemp,zoneHumidity,zoneHumidityHigh,zoneHumidityLow,zoneHvacMode,'
-                                    'zoneOccupancy',
-                            timeout=45)  # timeout for read; longer time required here due to potential large return
-
-                    except EcobeeApiException as e:
-                        if e.status_code == 14:  # Authentication error occurred
-                            logger.error(F"Ecobee access token expired while requesting thermostat runtime report..."
-                                         F"requesting token refresh")
-                            print(F"Ecobee access token expired while requesting thermostat runtime report..."
-                                  F"requesting token refresh")
-                            runtime_err_cnt += 1
-                            runtime_err_occurred = True
-                            logger.error(F"...error on thermostat runtime API request, attempt {runtime_err_cnt}")
-                            print(F"...error on thermostat runtime API request, attempt {runtime_err_cnt}")
-                            try:
-                                refresh_tokens(ecobee_service)
-                                logger.info(F"Ecobee access tokens refreshed...continuing processing")
-                                print(F"Ecobee access tokens refreshed...continuing processing")
-                            except EcobeeException as e:
-                                logger.error(F"...error occurred while requesting token refresh; exiting...")
-                                print(F"...error occurred while requesting token refresh; exiting...")
-                                send_mail_and_exit()
-                        else:
-                            runtime_err_cnt += 1
-                            runtime_err_occurred = True
-                            logger.error(F"Error occurred during Ecobee API request for thermostat runtime report...")
-                            print(F"Error occurred during Ecobee API request for thermostat runtime report...")
-                            logger.error(F"...attempt {runtime_err_cnt}")
-                            print(F"...attempt {runtime_err_cnt}")
-                            logger.error(F"...Ecobee API error code:  {e.status_code}; error:  {e.status_message}")
-                            print(F"...Ecobee API error code:  {e.status_code}; error:  {e.status_message}")
-                    except EcobeeHttpException as e:
-                        logger.error(F"HTTP error occurred during Ecobee runtime report API request:  {e}")
-                        logger.error(F"...{runtime_report_response.status.code}")
-                        print(F"HTTP error occurred during Ecobee runtime report API request:  {e}")
-                        print(F"...{runtime_report_response.status.code}")
-                        logger.error(F"...aborting")
-                        print(F"...aborting")
-                        send_mail_and_exit()
-                    except EcobeeException as e:
-                        logger.error(F"Error occurred during Ecobee runtime report API request:  {e}")
-                        print(F"Error occurred during Ecobee runtime report API request:  {e}")
-                        assert runtime_report_response.status.code == 0, \
-                            'Failure while executing request_runtime_reports:\n{0}'.format(
-                                runtime_report_response.pretty_format())
-                        send_mail_and_exit()
-                    except Exception as e:  # handle HTTP timeout errors, misc other errors
-                        runtime_err_occurred = True
-                        runtime_err_cnt += 1
-                        logger.error(F"Error occurred during Ecobee runtime report API request...{e}")
-                        print(F"Error occurred during Ecobee runtime report API request...{e}")
-                        conn_err_msg = "'ConnectionError' object has no attribute 'message'"
-                        read_timeout_err_msg = "'ReadTimeout' object has no attribute 'message'"
-                        connection_timeout_err_msg = "'ConnectTimeout' object has no attribute 'message'"
-                        timeout_err_msg = "timed out"
-                        empty_return_err_msg = "Expecting value: line 1 column 1 (char 0)"
-                        no_new_interval_data = "end_date_time must be later than start_date_time"
-                        # The following are the most common errors encountered...handle connection/read timeouts
-                        # and "empty" returns
-                        if (conn_err_msg in e.__str__()) or \
-                                (read_timeout_err_msg in e.__str__()) or \
-                                (connection_timeout_err_msg in e.__str__()) or \
-                                (timeout_err_msg in e.__str__()) or \
-                                (empty_return_err_msg in e.__str__()):
-                            timeout_err_occurred = True  # set flag to indicate a timeout error occurred
-                            logger.error(F"...timeout error on request, attempt {runtime_err_cnt}")
-                            print(F"...timeout error on request, attempt {runtime_err_cnt}")
-                        elif no_new_interval_data in e.__str__():
-                            logger.error(F"...no new runtime interval data available for this thermostat and "
-                                         F"specified timerframe")
-                            print(F"...no new runtime interval data available for this thermostat and specified "
-                                  F"timeframe")
-                            logger.error(F"...   start date:  {start_datetime}")
-                            logger.error(F"...   end date:    {end_datetime}")
-                            print(F"...   start date:  {start_datetime}")
-                            print(F"...   end date:    {end_datetime}")
-                            runtime_err_cnt = 4  # force exit attempts for this thermostat
-                            runtime_err_occurred = False
-                            no_interval_data_occurred = True
-                else:
-                    if runtime_err_cnt > 3 and runtime_err_occurred:
-                        logger.error(F"Timeout or authentication error occurred during Ecobee runtime report "
-                                     F"API request...")
-                        logger.error(F"...maximum retry attempts exceeded, aborting (try again later)")
-                        print(F"...maximum retry attempts exceeded, aborting (try again later)")
-                        if timeout_err_occurred:
-                            logger.error(F"...checking Internet connectivity...")
-                            print(F"...checking Internet connectivity...")
-                            google_status = check_internet_connect("google.com")
-                            ecobee_status = check_internet_connect("ecobee.com")
-                            if google_status and ecobee_status:
-                                logger.error(F"...connection to Internet OK...")
-                            else:
-                                logger.error(F"...connection to Internet down...")
-                        send_mail_and_exit()
-
-                # Should never reach here without a valid response for the thermostat runtime report;
-                # or, we aborted due to no new interval data
-                # Check if the response exists, if not, log error and abort.
-                try:
-                    runtime_report_response
-                except NameError as e:
-                    if no_interval_data_occurred:
-                        break
-                    logger.error(F"*** Thermostat runtime report response is not defined...")
-                    logger.error(F"...runtime_err_cnt = {runtime_err_cnt}")
-                    print(F"*** Thermostat runtime report response is not defined...")
-                    print(F"...runtime_err_cnt = {runtime_err_cnt}")
-                    if runtime_err_occurred:
-                        logger.error(F"...runtime_err_occurred = TRUE")
-                        print(F"...runtime_err_occurred = TRUE")
-                    else:
-                        logger.error(F"...runtime_err_occurred = FALSE")
-                        print(F"...runtime_err_occurred = FALSE")
-                    logger.error(F"...aborting...")
-                    print(F"...aborting...")
-                    send_mail_and_exit()
-
+    fetch_executor = futures.ThreadPoolExecutor(max_workers=ECCEcobee_fetch_workers)
+    runtime_fetches = [fetch_executor.submit(fetch_runtime_reports,
+                                             ecobee_service,
+                                             thermo,
+                                             last_rev_dict.get(thermo['thermostatName']),
+                                             thermo_connected.get(thermo['thermostatName']),
+                                             latest_runtime_intervals_dict.get(thermo['thermostatName']))
+                       for thermo in read_interval_JSON]
+    try:
+        for thermo, runtime_fetch in zip(read_interval_JSON, runtime_fetches):
+            logger.info(F"Beginning Ecobee runtime historical data processing for thermostat:  {thermo['thermostatName']}")
+            print(F"\nBeginning Ecobee runtime historical data processing for thermostat:  {thermo['thermostatName']}")
+            # Initialize the informational counters for this thermostat
+            total_rows_returned_this_thermostat = 0
+            recs_written_this_thermostat = 0
+            dup_update_cnt_this_thermostat = 0
+            blank_rec_cnt_this_thermostat = 0
+            # Wait for the runtime reports for this thermostat, and report the fetch's messages under the
+            # heading; if the fetch aborted, report what it collected, then send the error e-mail and exit
+            try:
+                runtime_report_responses, fetch_messages = runtime_fetch.result()
+            except RuntimeFetchError as e:
+                report_fetch_messages(e.fetch_messages)
+                send_mail_and_exit()
+            report_fetch_messages(fetch_messages)
+            for runtime_report_response in runtime_report_responses:
                 cols = runtime_report_response.columns
                 runtime_rows = runtime_report_response.report_list
                 logger.debug(F"Columns returned:  {cols}")
@@ -1117,118 +1056,50 @@ def main():
                              F"thermostat: {runtime_rows[0].thermostat_identifier}")
                 # logger.debug(F"First row response:  {runtime_rows[0].row_list[0]}")
                 for row_response in runtime_rows:
-                    for row_cntr in range(0, rows_returned):
-                        # logger.debug(F"Row response:  {runtime_rows[0].row_list[row_cntr]}")
-                        insert_runtime_rec_status = create_runtime_record(conn,
-                                                                          thermo['thermostatName'],
-                                                                          runtime_rows[0].thermostat_identifier,
-                                                                          runtime_rows[0].row_list[row_cntr])
-                        if insert_runtime_rec_status:
-                            recs_written_this_thermostat += 1
-                            recs_written_total += 1
-                            if recs_written_this_thermostat % 100 == 0:
-                                print(F"Runtime records written for thermostat {thermo['thermostatName']}:  "
-                                      F"{recs_written_this_thermostat}")
-
-                # logger.debug(runtime_report_response.pretty_format())
-
-            else:
-                logger.info(
-                    F"Polling start date {fmt_start_datetime} from database later than or equal to last revision "
-                    F"interval date {latest_runtime_intervals_dict.get(thermo['thermostatName'])} returned from Ecobee service")
-                print(F"Polling start date {fmt_start_datetime} from database later than or equal to last revision "
-                      F"interval date {latest_runtime_intervals_dict.get(thermo['thermostatName'])} returned from Ecobee service")
-
-                # Move reporting window to the next 30 days if necessary
-            start_datetime = end_datetime
-            start_datetime_utc = start_datetime.astimezone(pytz.utc)  # for next check against last rev interval
+                    # Write all of the interval records returned in one batch
+                    recs_written = create_runtime_records(conn,
+                                                          thermo['thermostatName'],
+                                                          row_response.thermostat_identifier,
+                                                          row_response.row_list[:rows_returned])
+                    recs_written_this_thermostat += recs_written
+                    recs_written_total += recs_written
+                    print(F"Runtime records written for thermostat {thermo['thermostatName']}:  "
+                          F"{recs_written_this_thermostat}")
+
+            # Commit the runtime records written for this thermostat
+            conn.commit()
 
-            if start_datetime == interval_datetime_local:
-                break
-            elif end_datetime + timedelta(days=30) > interval_datetime_local:
-                end_datetime = interval_datetime_local
-            else:
-                end_datetime += timedelta(days=30)
-            # logger.debug(F"New end date/time:  {end_datetime}")
-
-        logger.info(F"Historical runtime database records written for thermostat {thermo['thermostatName']}:  "
-                    F"{recs_written_this_thermostat}")
-        print(F"Historical runtime database records written for thermostat {thermo['thermostatName']}:  "
-              F"{recs_written_this_thermostat}")
-        logger.info(F"Duplicate runtime database records re-written for thermostat {thermo['thermostatName']}:  "
-                    F"{dup_update_cnt_this_thermostat}")
-        print(F"Duplicate runtime database records re-written for thermostat {thermo['thermostatName']}:  "
-              F"{dup_update_cnt_this_thermostat}")
-        logger.info(F"Blank runtime records skipped for thermostat {thermo['thermostatName']}:  "
-                    F"{blank_rec_cnt_this_thermostat}")
-        print(
-            F"Blank runtime records skipped for thermostat {thermo['thermostatName']}:  "
-            F"{blank_rec_cnt_this_thermostat}")
-        logger.info(
-            F"Total historical runtime rows returned from API call for thermostat {thermo['thermostatName']}: "
-            F"{total_rows_returned_this_thermostat}")
-        print(
-            F"Total historical runtime rows returned from API call for thermostat {thermo['thermostatName']}: "
-            F"{total_rows_returned_this_thermostat}")
+            logger.info(F"Historical runtime database records written for thermostat {thermo['thermostatName']}:  "
+                        F"{recs_written_this_thermostat}")
+            print(F"Historical runtime database records written for thermostat {thermo['thermostatName']}:  "
+                  F"{recs_written_this_thermostat}")
+            logger.info(F"Duplicate runtime database records re-written for thermostat {thermo['thermostatName']}:  "
+                        F"{dup_update_cnt_this_thermostat}")
+            print(F"Duplicate runtime database records re-written for thermostat {thermo['thermostatName']}:  "
+                  F"{dup_update_cnt_this_thermostat}")
+            logger.info(F"Blank runtime records skipped for thermostat {thermo['thermostatName']}:  "
+                        F"{blank_rec_cnt_this_thermostat}")
+            print(
+                F"Blank runtime records skipped for thermostat {thermo['thermostatName']}:  "
+                F"{blank_rec_cnt_this_thermostat}")
+            logger.info(
+                F"Total historical runtime rows returned from API call for thermostat {thermo['thermostatName']}: "
+                F"{total_rows_returned_this_thermostat}")
+            print(
+                F"Total historical runtime rows returned from API call for thermostat {thermo['thermostatName']}: "
+                F"{total_rows_returned_this_thermostat}")
+    finally:
+        # If a fetch aborted, don't start the requests still waiting
+        for runtime_fetch in runtime_fetches:
+            runtime_fetch.cancel()
+        fetch_executor.shutdown()
     print(F"")
 
     # Next, store records for the "snapshot" data retrieved previously from the thermostat details.
     # (This includes such data as the thermostat settings, weather, etc., for which historical data is
     # not maintained by the Ecobee service.
 
-    for thermostat_idx, thermo_val in enumerate(thermostat_response.thermostat_list):
-        for thermo_object, db_table in SQLite_table_dict.items():
-            thermostat_name = thermostat_response.thermostat_list[thermostat_idx].name
-            logger.debug(F"\nBeginning processing for snapshot records, table:  {db_table}, "
-                         F"thermostat:  {thermostat_name}")
-            print(F"Beginning processing for snapshot records, table:  {db_table}, "
-                  F"thermostat:  {thermostat_name}")
-            # db_table_recs_written[db_table] = 0
-            lists_dict = get_snapshot(conn,
-                                      db_table,
-                                      thermo_object,
-                                      thermostat_response.thermostat_list[thermostat_idx])
-
-            # Process embedded lists...
-            # Exclude processing of any lists within the root-level Thermostat object, as these are individually
-            # selected and processed through the API get_thermostat_details API call.  Also, check for the lists
-            # dictionary not defined to prevent an error if no data is available for the thermostat object.
-            if ('NoneType' not in str(type(lists_dict))) and \
-                    (thermo_object != 'thermostat'):
-                if len(lists_dict) != 0:
-                    # If more data in list, loop to handle...
-                    for list_object, list_table_brkt in lists_dict.items():
-                        # list_table_brkt is in form 'List[Ecobee object]'; strip everything but the object name
-                        therm_list_object = list_table_brkt[5:len(list_table_brkt) - 1]
-                        # Check if the list name is an API-defined list object or a non-defined list
-                        if list_object in thermostat_list_dict.keys():  # non-defined list in the API
-                            list_table = 'therm' + thermostat_list_dict[list_object]
-                        else:
-                            list_table = 'therm' + thermostat_list_object_dict[list_object]  # defined object
-                        logger.debug(F"...object:  {list_object}, ...list table:  {list_table}")
-
-                        print(F"...Beginning processing of list data, table:  {list_table}, "
-                              F"thermostat:  {thermostat_name}")
-
-                        # As the list object is being processed, examine the parent of the list; if it is also a
-                        # list (list embedded within a list), then we must index through each of the parent list
-                        # elements also.
-                        if thermo_object in thermostat_list_object_dict:
-                            # parent is a list itself, so we must iterate through it...
-                            enum_str = 'thermostat_response.thermostat_list[thermostat_idx].' + str(thermo_object)
-                            for parent_iter_idx, parent_iter_val in enumerate(eval(enum_str)):
-                                list_object_class = thermo_object + '[' + str(parent_iter_idx) + '].' + list_object
-                                lists_dict = get_snapshot(conn,
-                                                          list_table,
-                                                          list_object_class,
-                                                          thermostat_response.thermostat_list[thermostat_idx])
-                        # Otherwise, process the list object at the root level of the parent.
-                        else:
-                            list_object_class = thermo_object + '.' + list_object
-                            lists_dict = get_snapshot(conn,
-                                                      list_table,
-                                                      list_object_class,
-                                                      thermostat_response.thermostat_list[thermostat_idx])
+    write_snapshot_records(conn, thermostat_response)
 
     conn.close()  # Close the db connection
 
@@ -1281,6 +1152,301 @@ def main():
     logger.info(F"*** Execution completed at:  {date_now_str} ***")
 
 
+def fetch_runtime_reports(ecobee_service, thermo, rev_date, first_connected, latest_interval):
+    """
+        This routine will request the historical runtime reports for the passed thermostat from the Ecobee
+        service, beginning at the last revision date/time written to the database (or the first-connected
+        date/time, if none), through the latest revision interval from the thermostat summary.  The request
+        must be broken up into no more than 31 days (30 days used here for safety).
+        This is run for each thermostat on a bounded pool of fetch threads (ECCEcobee_fetch_workers), so
+        that the thermostats are requested concurrently; the responses are returned to the main thread,
+        which owns the database connection, for writing.  Runtime report requests are spaced across the
+        threads by pace_runtime_report_request.      --- v03.35
+        The informational and error messages are returned along with the responses, so that the main thread
+        logs and prints them under the thermostat's heading.  On a fatal error, RuntimeFetchError is raised
+        with the messages, rather than calling send_mail_and_exit from the fetch thread; the main thread
+        sends the mail and exits.
+    :param ecobee_service:      Ecobee service object (shared by the fetch threads)
+    :param thermo:              thermostat entry from the revision interval file (thermostatName, thermostatID)
+    :param rev_date:            last revision date/time written to the database, YYMMDDHHMMSS (or "000000000000")
+    :param first_connected:     date/time the thermostat was first connected, YYYY-MM-DD HH:MM:SS
+    :param latest_interval:     latest revision interval from the thermostat summary, YYMMDDHHMMSS (UTC)
+    :return:                    list of runtime report responses, in date/time order, and list of messages
+                                (logging level, message, True to also print), in the order they occurred
+    """
+
+    eastern = pytz.timezone('US/Eastern')
+    runtime_report_responses = []
+    fetch_messages = []
+
+    def fetch_message(level, message, echo=True):
+        fetch_messages.append((level, message, echo))
+
+    # Set the start date for retrieval, either based on the first-connected date (usually for
+    # the initial run, where no previous data exists in the runtime db), or, the last revision
+    # date/time read from the database.
+    if rev_date == "000000000000":  # default for no records currently exist in db
+        # Use the first-connected date
+        start_datetime = datetime.strptime(first_connected, "%Y-%m-%d %H:%M:%S")
+    else:
+        start_datetime = datetime.strptime(rev_date, "%y%m%d%H%M%S")
+    logger.debug(
+        F"Start date for runtime retrieval for thermostat {thermo['thermostatID']} set to {start_datetime}")
+    start_datetime_utc = start_datetime.astimezone(pytz.utc)
+    start_datetime = eastern.localize(start_datetime, is_dst=True)  # make the time offset aware
+
+    # Set the end date for retrieval, either based on 30 days from the start date (if start+30 days is
+    # less than the latest interval date), or, the latest date/time interval retrieved previously from
+    # the thermostat summary.  Note that the latest interval data is in UTC, so we must convert it to
+    # local time to pass to the API.
+    # now_datetime = datetime.now()
+    logger.debug(F"Runtime start + 30:  {start_datetime + timedelta(days=30)}")
+    interval_datetime_utc = datetime.strptime(latest_interval, "%y%m%d%H%M%S")
+    interval_datetime_local = pytz.utc.localize(interval_datetime_utc, is_dst=True).astimezone(eastern)
+    logger.debug(F"Latest interval date/time:  {interval_datetime_local}")
+    if (start_datetime + timedelta(days=30)) >= interval_datetime_local:
+        end_datetime = interval_datetime_local
+    else:
+        end_datetime = start_datetime + timedelta(days=30)
+    logger.debug(F"Runtime end datetime initialized at: {end_datetime} local time")
+
+    # The Ecobee runtime API actually uses UTC time for the call, but the library module used
+    # here converts local time to UTC for the underlying call; hence, the start/end date/times
+    # used here are all in local time.
+    while end_datetime <= interval_datetime_local:
+        logger.debug(F"Runtime retrieval start/end datetimes:  {start_datetime} :: {end_datetime}")
+
+        # Before calling the runtime report request, check the start date/time (in UTC format) against
+        # the latest interval date/time to ensure we're not needlessly calling the report request.
+        # This is based on recommendations from the Ecobee API documentation, as the runtime report
+        # request is a resource-intensive request, and can return a large amount of data.
+        # See references here for further info:
+        # https://www.ecobee.com/home/developer/api/documentation/v1/operations/get-runtime-report.shtml
+        # https://www.ecobee.com/home/developer/api/documentation/v1/operations/get-thermostat-summary.shtml
+        #
+        #   Note: we need to convert the start date/time to UTC format as (YYMMDDHHMMSS).
+        #   Note: the latest revision interval data was previously requested and stored in
+        #         read_interval_JSON['revisionList']
+        fmt_start_datetime = datetime.strftime(start_datetime_utc, "%y%m%d%H%M%S")
+        logger.debug(F"Converted start date/time for comparison:  {fmt_start_datetime}")
+
+        if fmt_start_datetime < latest_interval:
+            logger.debug(
+                F"Start date of {fmt_start_datetime} prior to latest revision interval date "
+                F"{latest_interval}; requesting runtime data")
+
+            runtime_err_cnt = 0
+            runtime_err_occurred = True  # falsely set for initial loop iteration
+            timeout_err_occurred = False  # flag to indicate a timeout error occurred
+            while runtime_err_occurred and runtime_err_cnt <= 3:
+                runtime_err_occurred = False  # reset to assume success
+                no_interval_data_occurred = False
+                # Space the requests across the fetch threads, and note the access token used, in case
+                # it has expired and needs to be refreshed
+                pace_runtime_report_request()
+                request_access_token = ecobee_service.access_token
+                try:
+                    runtime_report_response = ecobee_service.request_runtime_reports(
+                        selection=Selection(
+                            selection_type=SelectionType.THERMOSTATS.value,
+                            selection_match=thermo['thermostatID']),
+                        start_date_time=start_datetime,
+                        end_date_time=end_datetime,
+                        columns='auxHeat1,auxHeat2,auxHeat3,compCool1,compCool2,compHeat1,compHeat2,dehumidifier,'
+                                'dmOffset,economizer,fan,humidifier,hvacMode,outdoorHumidity,outdoorTemp,sky,'
+                                'ventilator,wind,zoneAveTemp,zoneCalendarEvent,zoneClimate,zoneCoolTemp,'
+                                'zoneHeatTemp,zoneHumidity,zoneHumidityHigh,zoneHumidityLow,zoneHvacMode,'
+                                'zoneOccupancy',
+                        timeout=45)  # timeout for read; longer time required here due to potential large return
+
+                except EcobeeApiException as e:
+                    if e.status_code == 14:  # Authentication error occurred
+                        fetch_message(logging.ERROR, F"Ecobee access token expired while requesting thermostat "
+                                                     F"runtime report...requesting token refresh")
+                        runtime_err_cnt += 1
+                        runtime_err_occurred = True
+                        fetch_message(logging.ERROR, F"...error on thermostat runtime API request, "
+                                                     F"attempt {runtime_err_cnt}")
+                        try:
+                            refresh_expired_tokens(ecobee_service, request_access_token, fetch_message)
+                            fetch_message(logging.INFO, F"Ecobee access tokens refreshed...continuing processing")
+                        except RuntimeFetchError:
+                            # The refresh failed fatally; keep this fetch's messages, including the refresh's
+                            raise RuntimeFetchError(fetch_messages)
+                        except EcobeeException as e:
+                            fetch_message(logging.ERROR, F"...error occurred while requesting token refresh; "
+                                                         F"exiting...")
+                            raise RuntimeFetchError(fetch_messages)
+                    else:
+                        runtime_err_cnt += 1
+                        runtime_err_occurred = True
+                        fetch_message(logging.ERROR, F"Error occurred during Ecobee API request for thermostat "
+                                                     F"runtime report...")
+                        fetch_message(logging.ERROR, F"...attempt {runtime_err_cnt}")
+                        fetch_message(logging.ERROR, F"...Ecobee API error code:  {e.status_code}; "
+                                                     F"error:  {e.status_message}")
+                except EcobeeHttpException as e:
+                    fetch_message(logging.ERROR, F"HTTP error occurred during Ecobee runtime report API "
+                                                 F"request:  {e}")
+                    fetch_message(logging.ERROR, F"...{runtime_report_response.status.code}")
+                    fetch_message(logging.ERROR, F"...aborting")
+                    raise RuntimeFetchError(fetch_messages)
+                except EcobeeException as e:
+                    fetch_message(logging.ERROR, F"Error occurred during Ecobee runtime report API request:  {e}")
+                    assert runtime_report_response.status.code == 0, \
+                        'Failure while executing request_runtime_reports:\n{0}'.format(
+                            runtime_report_response.pretty_format())
+                    raise RuntimeFetchError(fetch_messages)
+                except Exception as e:  # handle HTTP timeout errors, misc other errors
+                    runtime_err_occurred = True
+                    runtime_err_cnt += 1
+                    fetch_message(logging.ERROR, F"Error occurred during Ecobee runtime report API request...{e}")
+                    conn_err_msg = "'ConnectionError' object has no attribute 'message'"
+                    read_timeout_err_msg = "'ReadTimeout' object has no attribute 'message'"
+                    connection_timeout_err_msg = "'ConnectTimeout' object has no attribute 'message'"
+                    timeout_err_msg = "timed out"
+                    empty_return_err_msg = "Expecting value: line 1 column 1 (char 0)"
+                    no_new_interval_data = "end_date_time must be later than start_date_time"
+                    # The following are the most common errors encountered...handle connection/read timeouts
+                    # and "empty" returns
+                    if (conn_err_msg in e.__str__()) or \
+                            (read_timeout_err_msg in e.__str__()) or \
+                            (connection_timeout_err_msg in e.__str__()) or \
+                            (timeout_err_msg in e.__str__()) or \
+                            (empty_return_err_msg in e.__str__()):
+                        timeout_err_occurred = True  # set flag to indicate a timeout error occurred
+                        fetch_message(logging.ERROR, F"...timeout error on request, attempt {runtime_err_cnt}")
+                    elif no_new_interval_data in e.__str__():
+                        fetch_message(logging.ERROR, F"...no new runtime interval data available for this "
+                                                     F"thermostat and specified timeframe")
+                        fetch_message(logging.ERROR, F"...   start date:  {start_datetime}")
+                        fetch_message(logging.ERROR, F"...   end date:    {end_datetime}")
+                        runtime_err_cnt = 4  # force exit attempts for this thermostat
+                        runtime_err_occurred = False
+                        no_interval_data_occurred = True
+            else:
+                if runtime_err_cnt > 3 and runtime_err_occurred:
+                    fetch_message(logging.ERROR, F"Timeout or authentication error occurred during Ecobee "
+                                                 F"runtime report API request...", echo=False)
+                    fetch_message(logging.ERROR, F"...maximum retry attempts exceeded, aborting (try again later)")
+                    if timeout_err_occurred:
+                        fetch_message(logging.ERROR, F"...checking Internet connectivity...")
+                        google_status = check_internet_connect("google.com")
+                        ecobee_status = check_internet_connect("ecobee.com")
+                        if google_status and ecobee_status:
+                            fetch_message(logging.ERROR, F"...connection to Internet OK...", echo=False)
+                        else:
+                            fetch_message(logging.ERROR, F"...connection to Internet down...", echo=False)
+                    raise RuntimeFetchError(fetch_messages)
+
+            # Should never reach here without a valid response for the thermostat runtime report;
+            # or, we aborted due to no new interval data
+            # Check if the response exists, if not, log error and abort.
+            try:
+                runtime_report_response
+            except NameError as e:
+                if no_interval_data_occurred:
+                    break
+                fetch_message(logging.ERROR, F"*** Thermostat runtime report response is not defined...")
+                fetch_message(logging.ERROR, F"...runtime_err_cnt = {runtime_err_cnt}")
+                if runtime_err_occurred:
+                    fetch_message(logging.ERROR, F"...runtime_err_occurred = TRUE")
+                else:
+                    fetch_message(logging.ERROR, F"...runtime_err_occurred = FALSE")
+                fetch_message(logging.ERROR, F"...aborting...")
+                raise RuntimeFetchError(fetch_messages)
+
+            # Keep the response for the main thread to write to the database
+            runtime_report_responses.append(runtime_report_response)
+
+            # logger.debug(runtime_report_response.pretty_format())
+
+        else:
+            fetch_message(logging.INFO, F"Polling start date {fmt_start_datetime} from database later than or "
+                                        F"equal to last revision interval date {latest_interval} returned from "
+                                        F"Ecobee service")
+
+            # Move reporting window to the next 30 days if necessary
+        start_datetime = end_datetime
+        start_datetime_utc = start_datetime.astimezone(pytz.utc)  # for next check against last rev interval
+
+        if start_datetime == interval_datetime_local:
+            break
+        elif end_datetime + timedelta(days=30) > interval_datetime_local:
+            end_datetime = interval_datetime_local
+        else:
+            end_datetime += timedelta(days=30)
+        # logger.debug(F"New end date/time:  {end_datetime}")
+
+    return runtime_report_responses, fetch_messages
+
+
+def report_fetch_messages(fetch_messages):
+    """
+        This routine will log (and print, where flagged) the messages returned by fetch_runtime_reports for
+        a thermostat, in the order they occurred.  It is called from the main thread, after the thermostat's
+        heading, so that the messages from the concurrent fetch threads aren't interleaved.      --- v03.35
+    :param fetch_messages:  list of (logging level, message, True to also print)
+    :return:                None
+    """
+
+    for level, message, echo in fetch_messages:
+        report_message(level, message, echo)
+
+
+def report_message(level, message, echo=True):
+    """
+        This routine will log the passed message at the passed logging level, and print it if flagged.
+                                                        --- v03.35
+    :param level:       logging level (e.g., logging.ERROR)
+    :param message:     message text
+    :param echo:        True to also print the message
+    :return:            None
+    """
+
+    logger.log(level, message)
+    if echo:
+        print(message)
+
+
+def pace_runtime_report_request():
+    """
+        This routine will wait, if needed, so that runtime report requests from the fetch threads begin
+        no less than runtime_request_min_interval_secs apart, keeping the concurrent requests within the
+        Ecobee API's rate limits.      --- v03.35
+    :return:    None
+    """
+
+    global runtime_request_last_time
+
+    with runtime_request_lock:
+        wait_secs = runtime_request_last_time + runtime_request_min_interval_secs - time.monotonic()
+        if wait_secs > 0:
+            time.sleep(wait_secs)
+        runtime_request_last_time = time.monotonic()
+
+
+def refresh_expired_tokens(ecobee_service, expired_access_token, report=None):
+    """
+        This routine will refresh the Ecobee access tokens for a fetch thread whose request failed with an
+        expired access token.  The fetch threads share the service object, so only one refresh is made at
+        a time; if another thread has already refreshed the expired token, the refresh is skipped (the
+        refresh token is replaced by each refresh, so a second refresh would fail).      --- v03.35
+    :param ecobee_service:          Ecobee service object
+    :param expired_access_token:    access token used for the failed request
+    :param report:                  routine called with the refresh's messages (see refresh_tokens), or None
+    :return:                        None
+    """
+
+    if report is None:
+        report = report_message
+    with ecobee_token_lock:
+        if ecobee_service.access_token == expired_access_token:
+            refresh_tokens(ecobee_service, report)
+        else:
+            report(logging.INFO, F"Ecobee access tokens already refreshed by another request", echo=False)
+
+
 def persist_to_json(auth_json_file_name, ecobee_service):
     # json_auth_dict = {}
     try:
@@ -1304,15 +1470,26 @@ def persist_to_json(auth_json_file_name, ecobee_service):
         send_mail_and_exit()
 
 
-def refresh_tokens(ecobee_service):
+def refresh_tokens(ecobee_service, report=None):
+    """
+        This routine will refresh the Ecobee access tokens, retrying up to max_refresh_tkn_attempts times, and
+        persist the new tokens to the authorization file.
+        A fetch thread passes report, to collect the messages for the main thread to log and print under the
+        thermostat's heading; otherwise, they're logged and printed here.      --- v03.35
+    :param ecobee_service:  Ecobee service object
+    :param report:          routine called with (logging level, message, True to also print), or None
+    :return:                None
+    """
+
+    if report is None:
+        report = report_message
     max_refresh_tkn_attempts = 3
     # Attempt refreshing the access tokens, up to the maximum retries..
     refresh_attempt = 0
     refresh_err_occurred = True  # assume failure to initiate loop
     timeout_err_occurred = False  # flag used to indicate a timeout error has occurred
     while refresh_err_occurred and (refresh_attempt <= max_refresh_tkn_attempts):
-        logger.debug(F"Attempt {refresh_attempt + 1} to refresh Ecobee access tokens...")
-        print(F"Attempt {refresh_attempt + 1} to refresh Ecobee access tokens...")
+        report(logging.DEBUG, F"Attempt {refresh_attempt + 1} to refresh Ecobee access tokens...")
         refresh_err_occurred = False  # Reset error flag for this pass to assume success
         try:
             token_response = ecobee_service.refresh_tokens()
@@ -1323,34 +1500,27 @@ def refresh_tokens(ecobee_service):
         except EcobeeAuthorizationException as e:
             refresh_err_occurred = True
             refresh_attempt += 1
-            logger.error(F"Error during request to refresh Ecobee access tokens:  {e}")
-            print(F"Error during request to refresh Ecobee access tokens:  {e}")
+            report(logging.ERROR, F"Error during request to refresh Ecobee access tokens:  {e}")
             if 'The authorization grant, token or credentials are invalid, expired, revoked' in e.error_description:
-                logger.error(F"...authorization credentials have expired or invalid")
-                logger.error(F"...resetting stored authorization credentials")
-                logger.error(F"...you will need to re-authorize the application in the Ecobee portal")
-                print(F"...authorization credentials have expired or invalid")
-                print(F"...resetting stored authorization credentials")
-                print(F"...you will need to re-authorize the application in the Ecobee portal")
+                report(logging.ERROR, F"...authorization credentials have expired or invalid")
+                report(logging.ERROR, F"...resetting stored authorization credentials")
+                report(logging.ERROR, F"...you will need to re-authorize the application in the Ecobee portal")
                 # Remove the old authorization token JSON file in preparation for reauthorization
                 try:
                     os.remove(ECCAuthorize)
-                    logger.info(F"Ecobee authorization credentials files removed successfully")
+                    report(logging.INFO, F"Ecobee authorization credentials files removed successfully", echo=False)
                 except Exception as e:
-                    logger.error(F"Error occurred deleting authorization credentials file:  {e}")
-                    print(F"Error occurred deleting authorization credentials file:  {e}")
+                    report(logging.ERROR, F"Error occurred deleting authorization credentials file:  {e}")
                     send_mail_and_exit()
                 authorize(ecobee_service)
         except EcobeeException as e:
             refresh_err_occurred = True
             refresh_attempt += 1
-            logger.error(F"Error during request to refresh Ecobee access tokens:  {e}")
-            print(F"Error during request to refresh Ecobee access tokens:  {e}")
+            report(logging.ERROR, F"Error during request to refresh Ecobee access tokens:  {e}")
         except Exception as e:
             refresh_err_occurred = True
             refresh_attempt += 1
-            logger.error(F"Error occurred during request to refresh Ecobee access tokens:  {e}")
-            print(F"Error occurred during request to refresh Ecobee access tokens:  {e}")
+            report(logging.ERROR, F"Error occurred during request to refresh Ecobee access tokens:  {e}")
             conn_err_msg = "'ConnectionError' object has no attribute 'message'"
             read_timeout_err_msg = "'ReadTimeout' object has no attribute 'message'"
             connection_timeout_err_msg = "'ConnectTimeout' object has no attribute 'message'"
@@ -1360,19 +1530,16 @@ def refresh_tokens(ecobee_service):
                 timeout_err_occurred = True
     else:
         if refresh_err_occurred and (refresh_attempt > max_refresh_tkn_attempts):
-            logger.error(F"Maximum retry attempts exceeded while attempting to refresh Ecobee access tokens")
-            logger.error(F"...aborting...")
-            print(F"Maximum retry attempts exceeded while attempting to refresh Ecobee access tokens")
-            print(F"...aborting...")
+            report(logging.ERROR, F"Maximum retry attempts exceeded while attempting to refresh Ecobee access tokens")
+            report(logging.ERROR, F"...aborting...")
             if timeout_err_occurred:
-                logger.error(F"...checking Internet connectivity...")
-                print(F"...checking Internet connectivity...")
+                report(logging.ERROR, F"...checking Internet connectivity...")
                 google_status = check_internet_connect("google.com")
                 ecobee_status = check_internet_connect("ecobee.com")
                 if google_status and ecobee_status:
-                    logger.error(F"...connection to Internet OK...")
+                    report(logging.ERROR, F"...connection to Internet OK...", echo=False)
                 else:
-                    logger.error(F"...connection to Internet down...")
+                    report(logging.ERROR, F"...connection to Internet down...", echo=False)
             send_mail_and_exit()
 
 
@@ -1676,6 +1843,17 @@ def connectdb_create_runtime_table():
                                             ON runtime(thermostat_name);"""
     sql_create_ecobee_runtime_index2 = """CREATE INDEX thermostat_id_idx
                                             ON runtime(thermostat_id);"""
+    # Index used to find the last runtime interval for a thermostat, when it isn't in the watermark table
+    sql_create_ecobee_runtime_index3 = """CREATE INDEX IF NOT EXISTS thermostat_name_run_idx
+                                            ON runtime(thermostat_name, run_date, run_time);"""
+    # Last non-blank runtime interval written for each thermostat; see select_db_last_runtime_interval
+    sql_create_ecobee_watermark_table = """CREATE TABLE IF NOT EXISTS runtime_watermark (
+                                            thermostat_name TEXT NOT NULL PRIMARY KEY,
+                                            thermostat_id TEXT NOT NULL,
+                                            run_date TEXT NOT NULL,
+                                            run_time TEXT NOT NULL,
+                                            record_written_UTC TEXT NOT NULL
+                                       ); """
 
     # create a database connection
     conn = create_connection(ECCEcobeeDatabase)
@@ -1703,6 +1881,14 @@ def connectdb_create_runtime_table():
         else:
             created_new_db = False
             logger.debug(F"Database table {db_table} exists...opening connection")
+        # Create the watermark table and its fallback index; these are also added to databases created
+        # by earlier versions.  (Creating the index on a large existing database takes a while, once.)
+        try:
+            conn.execute(sql_create_ecobee_runtime_index3)
+            conn.execute(sql_create_ecobee_watermark_table)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(F"Error creating runtime watermark table / index for table {db_table}, {e}")
     else:
         logger.error("Error...cannot create the Ecobee database connection.")
         print("Error...cannot create the Ecobee database connection.")
@@ -1746,8 +1932,7 @@ def check_if_table_exists(conn, ecobeeTable, ECCEcobeeDatabase):
     else:
         logger.info(f"Table '{ecobeeTable}' not found...")
 
-    # commit the changes (none here)
-    conn.commit()
+    # (No changes to commit here; committing would also commit any records the caller has yet to commit.)
     # close the connection
     # conn.close()
 
@@ -1769,6 +1954,10 @@ def create_table_from_string(conn, db_table, create_table_sql_str):
     table_success = False  # Assume failure
     indicies_success = False
 
+    # Table was already created or found to exist by an earlier call    --- v03.33
+    if db_table in snapshot_tables_verified:
+        return True
+
     # Check to make sure we have a database connection
     if conn is not None:
         # SQL strings to create secondary indicies.  (All tables use the same secondary keys.)
@@ -1809,24 +1998,30 @@ def create_table_from_string(conn, db_table, create_table_sql_str):
         send_mail_and_exit()
 
     if table_success and indicies_success:
+        snapshot_tables_verified.add(db_table)
         return True
     else:
         return False
 
 
-def create_database_record(conn, db_table, thermo_name, thermo_id, db_fields, db_values):
+def create_database_records(conn, db_table, thermo_name, thermo_id, snapshot_layout, data_objects):
     """
-        This routine will attempt to write a record to the passed table with the passed
-        thermostat name, ID, and list of record names / values.  If successful, the routine
-        will return True, else False.
+        This routine will attempt to write records to the passed table with the passed thermostat name,
+        ID, and data objects, using the table layout from get_snapshot_layout.  The records are written
+        with a single executemany.  If successful, the routine will return the number of records
+        written, else 0.
             Written by DK Fowler ... 24-Oct-2019
+
+        Modified to write a batch of records, vs. one at a time, using the cached table layout for the
+        INSERT SQL and field values.  (Replaces create_database_record and create_values_dict.)  The
+        records are no longer committed here; see write_snapshot_records.    --- v03.33
     :param conn:            database connection (may exist already, or be set to None)
     :param db_table:        table name to which a record write is attempted
     :param thermo_name      name of thermostat
     :param thermo_id        id of thermostat
-    :param db_fields        dictionary of field names for the record
-    :param db_values        list of values for the record
-    :return:                True if table created successfully; otherwise, False
+    :param snapshot_layout  table layout, from get_snapshot_layout
+    :param data_objects     list of data objects (API-defined objects, or lists of raw values) for the records
+    :return:                Number of records written
     """
 
     # Global dictionary used to hold the date/time UTC when a parent record is written
@@ -1834,137 +2029,84 @@ def create_database_record(conn, db_table, thermo_name, thermo_id, db_fields, db
     global list_parent_written_UTC_dict
     global list_parent_to_child_dict  # dictionary w/ mapping of child (list) table to parent table
 
-    # First create a SQL string for INSERTing the record into the passed table
-    sql_insert = construct_insert_table_sql(db_table, db_fields)
-
-    # Create a dictionary of the field values
-    values_dict = create_values_dict(db_fields, db_values)
+    if conn is None:
+        logger.error(F"No database connection detected while attempting to write new record, table {db_table}")
+        print(F"No database connection detected while attempting to write new record, table {db_table}")
+        send_mail_and_exit()
 
     # Get the current date/time in UTC for the record INSERT
     # If we're processing a list record, use the previously-stored value for the parent record instead,
     # as this is used to help link the records between the tables
     logger.debug(F"......db table root:  {db_table[5:]}; thermostat name:  {thermo_name}")
-    if db_table[5:] not in thermostat_list_object_dict.values() and \
-            db_table[5:] not in thermostat_list_dict.values():
+    list_parent_written_UTC_dict_key = thermo_id + db_table
+    if snapshot_layout['parent_table']:
         logger.debug(F"......parent record detected")
         record_written_UTC = datetime.utcnow()
-        # Save the current UTC for when we're writing a parent record for use in linking child
-        # (list) records later (if it doesn't already exist)
-        list_parent_written_UTC_dict_key = thermo_id + db_table
-        if list_parent_written_UTC_dict_key not in list_parent_written_UTC_dict:
-            list_parent_written_UTC_dict[list_parent_written_UTC_dict_key] = record_written_UTC
-            logger.debug(F"Added entry to list_parent_written_UTC dictionary:  "
-                         F"{list_parent_written_UTC_dict[list_parent_written_UTC_dict_key]}")
     else:
         # Processing a list or child record, so use the parent's record written date/time
         parent_table = list_parent_to_child_dict[db_table]
-        list_parent_written_UTC_dict_key = thermo_id + parent_table
-        record_written_UTC = list_parent_written_UTC_dict[list_parent_written_UTC_dict_key]
+        record_written_UTC = list_parent_written_UTC_dict[thermo_id + parent_table]
         logger.debug(F"......child record detected")
 
+    sql_insert = snapshot_layout['insert_sql']
+    values_getter = snapshot_layout['values_getter']
+    val_rows = []
+    for data_object in data_objects:
+        if snapshot_layout['parent_table']:
+            # Parent records are keyed by the date/time written, so each must have its own; (e.g., for the
+            # devices, one record is written for each device).  Ensure these don't repeat within the batch.
+            if val_rows:
+                record_written_UTC = max(datetime.utcnow(), record_written_UTC + timedelta(microseconds=1))
+            # Save the current UTC for when we're writing a parent record for use in linking child
+            # (list) records later (if it doesn't already exist)
+            if list_parent_written_UTC_dict_key not in list_parent_written_UTC_dict:
+                list_parent_written_UTC_dict[list_parent_written_UTC_dict_key] = record_written_UTC
+                logger.debug(F"Added entry to list_parent_written_UTC dictionary:  "
+                             F"{list_parent_written_UTC_dict[list_parent_written_UTC_dict_key]}")
+
+        # insert common key values in the beginning of the value list
+        val_row = [datetime.strftime(record_written_UTC, "%Y-%m-%d %H:%M:%S.%f"), thermo_name, thermo_id]
+        if snapshot_layout['raw_values']:
+            # non-API-defined list; the values correspond by index to the field names
+            val_row += data_object[:len(snapshot_layout['value_fields'])]
+        elif values_getter is not None:
+            val_row += values_getter(data_object)
+        val_rows.append(val_row)
+
     logger.debug(F"......date written set to: {datetime.strftime(record_written_UTC, '%Y-%m-%d %H:%M:%S.%f')}")
+    logger.debug(F"Attempting record insert...table:  {db_table}, records:  {len(val_rows)}")
+    # Write the batch within a savepoint, so that if an error occurs, none of the batch is written; the
+    # records written for the thermostat are committed by the caller.
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute("SAVEPOINT snapshot_records")
     cur = conn.cursor()  # Get a cursor for the db connection
-    # Make sure we have a database connection
-    if conn is not None:
-        logger.debug(F"Attempting record insert...table:  {db_table}")
-        try:
-            val_list = [val for key, val in values_dict.items()]
-            date_written_str = datetime.strftime(record_written_UTC, "%Y-%m-%d %H:%M:%S.%f")
-            val_list.insert(0, date_written_str)  # insert common key values in the beginning of the value list
-            val_list.insert(1, thermo_name)
-            val_list.insert(2, thermo_id)
-            # print(F"Values used in INSERT:  {val_list}")
-            logger.debug(F"...field values {db_values}")
-            cur.execute(sql_insert, val_list)
-            logger.debug(F"Record written for thermostat {thermo_name}, date: {record_written_UTC}, "
-                         F"table: {db_table}")
-        except sqlite3.Error as e:
-            cur.close()
-            logger.error(F"Error writing to database table {db_table}, {e}")
-            err_string = e.__str__()  # returns string with error message
-            # define text for duplicate primary key error; (would be more effective to check extended error code,
-            # but Python doesn't seem to support this yet??
-            unique_err_str = "UNIQUE constraint failed: runtime.thermostat_id, runtime.run_date, runtime.run_time"
-            # logger.debug(F"Error:  {e.__str__()}")
-            # logger.debug(F"Exception class is: {e.__class__}")
-            # logger.debug(F"Exception is  {e.args}")
-            # if e.__class__ == sqlite3.IntegrityError:
-            #    logger.debug(F"Integrity error; duplicate key detected...record already exists in db")
-
-            # The following error should NEVER occur, as the date written is part of the key and is
-            # created in this routine.
-            if unique_err_str in err_string:
-                logger.error(F"Duplicate key detected...record already exists in database...")
-            else:  # only display error msg to console if error other than dup-key occurs
-                print(F"Error writing to database table {db_table}, {e}")
-            return False
-        except ValueError as e:  # Catches malformed INSERT in some instances...
-            logger.error(F"Value error occurred during attempt to INSERT record in table {db_table}, error:  {e}")
-            logger.error(F"...SQL INSERT statement:  {sql_insert}")
-            logger.error(F"...Values used in INSERT:  {val_list}")
-            print(F"Value error occurred during attempt to INSERT record in table {db_table}, error:  {e}")
-            print(F"...SQL INSERT statement:  {sql_insert}")
-            print(F"...Values used in INSERT:  {val_list}")
-            cur.close()
-            return False
-        except Exception as e:
-            logger.error(F"Exception occurred during INSERT:  {e}")
-            logger.error(F"...SQL INSERT statement:  {sql_insert}")
-            logger.error(F"...Values used in INSERT:  {val_list}")
-            print(F"Exception occurred during INSERT:  {e}")
-            print(F"...SQL INSERT statement:  {sql_insert}")
-            print(F"...Values used in INSERT:  {val_list}")
-            cur.close()
-            return False
-    else:
-        logger.error(F"No database connection detected while attempting to write new record, table {db_table}")
-        print(F"No database connection detected while attempting to write new record, table {db_table}")
-        send_mail_and_exit()
-
-    conn.commit()
-    cur.close()
-    return True
-
-
-def create_values_dict(db_fields, db_values):
-    """
-        This routine will construct a dictionary with the key being the field name and the value being
-        the field value.  The field names are translated to "snake_case" from "camelCase" using underlines
-        in the names.
-            Written by DK Fowler ... 24-Oct-2019
-    :param db_fields:    list of fields for this table
-    :param db_values     list of field values for this table
-    :return:             dictionary containing [key: value] as [field name: field value]
-    """
-
-    field_vals_dict = {}
-    # Filter out list fields and defined thermostat objects for special processing
-    non_list_fields = [non_list_field for non_list_field in db_fields if 'List' not in db_fields[non_list_field] and
-                       non_list_field not in thermostat_object_dict and
-                       non_list_field not in thermostat_list_object_dict]
-
-    # There are two formats passed to this routine...for list elements that do not have API-defined objects,
-    # db_fields contains a dictionary of field-name: datatype; db_values contains a raw list of values that
-    # correspond by index to these field names.  For API-defined objects, db_fields contains a dictionary of
-    # field-name: datatype (as with the first format), whereas db_values contains a dictionary of field-name: value.
-    # So, distinguish between these for constructing the dictionary returned.
-
-    for idx, field_name in enumerate(non_list_fields):
-        # Try to find a match in the list of field names for each record defined in the non-object lists
-        match_fields_dict = {rec_name: rec_vals for (rec_name, rec_vals) in
-                             list_attribute_type_map_dict.items() if field_name in rec_vals}
-        if match_fields_dict and \
-                ('pyecobee.objects' not in str(type(db_values))):  # format 1, raw values in db_values
-            field_vals_dict[field_name] = db_values[idx]
-        else:  # format 2, field: value
-            val_str = 'db_values.' + field_name  # construct string reference for the value
-            e_val = eval(repr(val_str))
-            field_vals_dict[field_name] = eval(e_val)  # yeah, it's like magic I think; not sure why the double 'eval'?
-            # print(F"Value is:  {eval(e_val)}")
-
-    logger.debug(F"Values dictionary:  {field_vals_dict}")
+    try:
+        logger.debug(F"...field values {val_rows}")
+        cur.executemany(sql_insert, val_rows)
+        conn.execute("RELEASE snapshot_records")
+        logger.debug(F"Records written for thermostat {thermo_name}, date: {record_written_UTC}, "
+                     F"table: {db_table}")
+    except sqlite3.Error as e:
+        conn.execute("ROLLBACK TO snapshot_records")
+        conn.execute("RELEASE snapshot_records")
+        logger.error(F"Error writing to database table {db_table}, {e}")
+        print(F"Error writing to database table {db_table}, {e}")
+        return 0
+    except ValueError as e:  # Catches malformed INSERT in some instances...
+        conn.execute("ROLLBACK TO snapshot_records")
+        conn.execute("RELEASE snapshot_records")
+        logger.error(F"Value error occurred during attempt to INSERT record in table {db_table}, error:  {e}")
+        logger.error(F"...SQL INSERT statement:  {sql_insert}")
+        logger.error(F"...Values used in INSERT:  {val_rows}")
+        print(F"Value error occurred during attempt to INSERT record in table {db_table}, error:  {e}")
+        print(F"...SQL INSERT statement:  {sql_insert}")
+        print(F"...Values used in INSERT:  {val_rows}")
+        return 0
+    finally:
+        cur.close()
 
-    return field_vals_dict
+    return len(val_rows)
 
 
 def construct_insert_table_sql(db_table, db_fields):
@@ -2031,46 +2173,45 @@ def select_db_last_runtime_interval(conn, thermostatName):
     written may not be in the current (new) database, and we need to search for it elsewhere.
             Modified by DK Fowler ... 24-Feb-2020
 
+    Modified to read the last runtime interval from the runtime_watermark table, maintained as the
+    runtime records are written.  If the thermostat has no watermark (as for a database written by an
+    earlier version), the runtime table is searched using the thermostat name / run date / run time
+    index, and the watermark is recorded for next time.      --- v03.31
+
     :param conn: the Connection object
     :param thermostatName: the name of the thermostat
-    :return: the last runtime interval recorded, or '00000000' if none
+    :return: the last runtime interval recorded, or '000000000000' if none
     """
 
     global created_new_db
 
     cur = conn.cursor()
-    # Build SQL query string, including exclusion of "blank" records...
-    rev_str = "SELECT * FROM runtime WHERE thermostat_name=? AND NOT ("
-    for field_idx in range(5, len(runtime_fields)):
-        rev_str += runtime_fields[field_idx] + "= ''"
-        if field_idx != len(runtime_fields) - 1:
-            rev_str += " AND "
-        else:
-            rev_str += ") ORDER BY run_date DESC, run_time DESC LIMIT 1"
-    logger.debug(F"SQL for last revision interval:  ")
-    logger.debug(F"{rev_str}")
-    cur.execute(rev_str, (thermostatName,))
-
-    rows = cur.fetchall()
+    cur.execute("SELECT thermostat_id, run_date, run_time FROM runtime_watermark WHERE thermostat_name=?",
+                (thermostatName,))
+    row = cur.fetchone()
+
+    if row is None:
+        logger.debug(F"No runtime watermark found for thermostat {thermostatName}...searching runtime table")
+        row = select_db_last_runtime_row(conn, thermostatName)
+        if row is not None:
+            update_runtime_watermark(conn, thermostatName, row[0], row[1], row[2])
+            conn.commit()
 
-    row_cnt = 0
-    for row in rows:
-        row_cnt = row_cnt + 1
-        logger.debug(F"Last runtime interval record for thermostat: {thermostatName}")
-        logger.debug(row)
     """
         If no rows are returned for this thermostat, then there were previously no entries written in
         the thermostat summary table.  This would typically happen during first run of the routine, or
         when a new thermostat is added.  In this case, return a default value for the last runtime
         interval written; otherwise, return the last runtime interval logged.
     """
-    if row_cnt == 0:
+    if row is None:
         last_runtime_interval = "000000000000"
         logger.debug(F"No records found for thermostat {thermostatName} while retrieving last revision written")
     else:
-        # Calculate the last run date/time from the record retrieved; the 3rd and 4th fields contain this
+        logger.debug(F"Last runtime interval record for thermostat: {thermostatName}")
+        logger.debug(row)
+        # Calculate the last run date/time from the record retrieved; the 2nd and 3rd fields contain this
         # data (indexed from 0)
-        str_last_run = rows[0][3] + " " + rows[0][4]
+        str_last_run = row[1] + " " + row[2]
         logger.debug(F"Revision interval date/time string retrieved from db:  {str_last_run}")
         # Convert the text string to a datetime datatype
         last_run = datetime.strptime(str_last_run, "%Y-%m-%d %H:%M:%S")
@@ -2080,94 +2221,173 @@ def select_db_last_runtime_interval(conn, thermostatName):
     # Check to see if we returned 0 records currently in the database; this could happen if the last database
     # was archived, or at the initial execution of this routine.  If a new database was created, check to see
     # if we have any archived databases.
-    if row_cnt == 0 and created_new_db:
+    if row is None and created_new_db:
         last_runtime_interval = check_for_archival_database_revision_records(thermostatName)
 
     cur.close()
     return last_runtime_interval
 
 
-def create_runtime_record(conn, thermostat_name, thermostat_id, runtime_row):
+def select_db_last_runtime_row(conn, thermostatName):
+    """
+        This routine will search the runtime table for the last non-blank runtime interval written for the
+        thermostat.  (Split out of select_db_last_runtime_interval, as it's also used to catalog archived
+        databases.)     --- v03.32
+    :param conn:            Connection object for database
+    :param thermostatName:  the name of the thermostat
+    :return:                (thermostat id, run date, run time) of the last interval, or None if none
+    """
+
+    cur = conn.cursor()
+    # Build SQL query string, including exclusion of "blank" records...  Using thermostat_name_run_idx,
+    # this reads back from the latest interval and stops at the first non-blank record.
+    rev_str = "SELECT thermostat_id, run_date, run_time FROM runtime " \
+              "WHERE thermostat_name=? AND NOT (" + \
+              " AND ".join(field + " = ''" for field in runtime_fields[5:]) + \
+              ") ORDER BY run_date DESC, run_time DESC LIMIT 1"
+    logger.debug(F"SQL for last revision interval:  ")
+    logger.debug(F"{rev_str}")
+    cur.execute(rev_str, (thermostatName,))
+    row = cur.fetchone()
+    cur.close()
+
+    return row
+
+
+def update_runtime_watermark(conn, thermostat_name, thermostat_id, run_date, run_time):
     """
-        This routine will attempt to add a new record to the SQLite runtime table.
+        This routine will record the passed runtime interval as the last one written for the thermostat,
+        in the runtime_watermark table, unless a later interval is already recorded.  The update is not
+        committed here, so that it is committed along with the runtime records.    --- v03.31
+    :param conn:            Connection object for database
+    :param thermostat_name  Thermostat name
+    :param thermostat_id    Thermostat ID
+    :param run_date:        Runtime interval date (YYYY-MM-DD)
+    :param run_time:        Runtime interval time (HH:MM:SS)
+    :return:
+    """
+
+    conn.execute("INSERT INTO runtime_watermark "
+                 "(thermostat_name, thermostat_id, run_date, run_time, record_written_UTC) "
+                 "VALUES(?, ?, ?, ?, ?) "
+                 "ON CONFLICT(thermostat_name) DO UPDATE SET "
+                 "thermostat_id = excluded.thermostat_id, run_date = excluded.run_date, "
+                 "run_time = excluded.run_time, record_written_UTC = excluded.record_written_UTC "
+                 "WHERE excluded.run_date || ' ' || excluded.run_time > "
+                 "runtime_watermark.run_date || ' ' || runtime_watermark.run_time",
+                 (thermostat_name, thermostat_id, run_date, run_time,
+                  datetime.strftime(datetime.utcnow(), "%Y-%m-%d %H:%M:%S")))
+
+
+def create_runtime_records(conn, thermostat_name, thermostat_id, runtime_rows):
+    """
+        This routine will attempt to add the passed runtime interval records to the SQLite runtime table,
+        in a single batch.  Blank records are skipped.  If a record already exists for the timeslot (as
+        the runtime report requests overlap, and the latest timeslots are frequently reported incomplete),
+        the existing record is replaced only if the new record contains at least as much data; this
+        is done by the database with INSERT ... ON CONFLICT DO UPDATE.  (See check_and_rewrite_duplicate_record
+        in earlier versions.)  The records are not committed here; the caller commits once all the
+        records for the thermostat have been written.
             Written by DK Fowler ... 16-Oct-2019
+
+        Modified to write the records in a batch, vs. one at a time.    --- v03.30
     :param conn:            Connection object for database
     :param thermostat_name  Thermostat name
     :param thermostat_id    Thermostat ID
-    :param runtime_row:     CSV list of field data
-    :return:                True, if successful write, else False
+    :param runtime_rows:    list of CSV strings of field data
+    :return:                Number of new records written
     """
 
+    global dup_update_cnt_total
+    global dup_update_cnt_this_thermostat
+
     # Add additional identifying fields to the runtime row data passed to the routine:
     # (record written datetime, thermostat name and id)
-    record_written_UTC = datetime.utcnow()
-    # runtime_row = "'" + datetime.strftime(record_written_UTC, "%Y-%m-%d %H:%M:%S") + "','" + \
-    #    thermostat_name + "','" + thermostat_id + "','" + runtime_row
-    runtime_row = datetime.strftime(record_written_UTC, "%Y-%m-%d %H:%M:%S") + "," + \
-                  thermostat_name + "," + thermostat_id + "," + runtime_row
-    # Data includes a trailing comma, remove it
-    runtime_row = runtime_row[:-1]
-    # Split the row data by the comma delimiter
-    runtime_row_split = runtime_row.split(",")
-    # logger.debug(F"Runtime row data:  {runtime_row_split}")
-
-    # Build sql insert statement with list of fields
-    sql_insert = ''' INSERT INTO runtime ('''
-    for field in range(0, len(runtime_fields)):
-        sql_insert += runtime_fields[field]
-        if field != len(runtime_fields) - 1:
-            sql_insert += ', '
-    sql_insert += ''') VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)'''
+    record_written_UTC = datetime.strftime(datetime.utcnow(), "%Y-%m-%d %H:%M:%S")
+
+    insert_rows = []
+    for runtime_row in runtime_rows:
+        runtime_row = record_written_UTC + "," + thermostat_name + "," + thermostat_id + "," + runtime_row
+        # Data includes a trailing comma, remove it
+        runtime_row = runtime_row[:-1]
+        # Split the row data by the comma delimiter
+        runtime_row_split = runtime_row.split(",")
+
+        # Ensure the record we're getting ready to write isn't blank; if so, skip it.
+        if check_for_empty_runtime_record(runtime_row_split):
+            logger.info(F"Empty record detected for thermostat: {thermostat_name}, "
+                        F"date: {runtime_row_split[3]}, time: {runtime_row_split[4]}")
+            logger.info(F"...skipped writing record to database")
+            logger.info(F"{runtime_row_split}")
+        elif len(runtime_row_split) != len(runtime_fields):
+            # yes, welcome to the wonderful world of Ecobee...sometimes we randomly
+            # receive different records for the interval data, plus or minus some
+            # expected fields
+            logger.error(F"...unexpected number of fields returned from Ecobee service request,")
+            logger.error(F"...thermostat: {thermostat_name}, date: {runtime_row_split[3]}, "
+                         F"time: {runtime_row_split[4]}")
+            logger.error(F"...returned row:  '{runtime_row}'")
+        else:
+            insert_rows.append(runtime_row_split)
+
+    if not insert_rows:
+        return 0
+
+    # Build sql insert statement with list of fields.  On a duplicate key, replace the existing record's
+    # data only if the new record has at least as many non-blank fields.
+    data_fields = runtime_fields[5:]
+    sql_insert = "INSERT INTO runtime (" + ", ".join(runtime_fields) + ") " + \
+                 "VALUES(" + ",".join("?" * len(runtime_fields)) + ") " + \
+                 "ON CONFLICT(thermostat_id, run_date, run_time) DO UPDATE SET " + \
+                 ", ".join(field + " = excluded." + field for field in [runtime_fields[0]] + data_fields) + \
+                 " WHERE " + " + ".join("(excluded." + field + " IS NOT '')" for field in data_fields) + \
+                 " >= " + " + ".join("(runtime." + field + " IS NOT '')" for field in data_fields)
     # logger.debug(F"SQL insert statement:  '{sql_insert}'")
+
     cur = conn.cursor()
-    # Ensure the record we're getting ready to write isn't blank; if so, skip it.
-    if not check_for_empty_runtime_record(runtime_row_split):
-        try:
-            cur.execute(sql_insert, runtime_row_split)
-            logger.debug(F"Record written for thermostat {thermostat_name}, date: {runtime_row_split[3]}, "
-                         F"time: {runtime_row_split[4]}")
-        except sqlite3.Error as e:
-            cur.close()
-            logger.error(F"Error writing to database, {e}")
-            err_string = e.__str__()  # returns string with error message
-            # define text for duplicate primary key error; (would be more effective to check extended error code,
-            # but Python doesn't seem to support this yet??
-            unique_err_str = "UNIQUE constraint failed: runtime.thermostat_id, runtime.run_date, runtime.run_time"
-            bindings_err_str = "Incorrect number of bindings supplied"
-            # logger.debug(F"Error:  {e.__str__()}")
-            # logger.debug(F"Exception class is: {e.__class__}")
-            # logger.debug(F"Exception is  {e.args}")
-            # if e.__class__ == sqlite3.IntegrityError:
-            #    logger.debug(F"Integrity error; duplicate key detected...record already exists in db")
-            if unique_err_str in err_string:
-                logger.error(F"Duplicate key detected...record already exists in database...")
-                logger.error(F"...thermostat: {thermostat_name}, date: {runtime_row_split[3]}, "
-                             F"time: {runtime_row_split[4]}")
-                # Attempt to update the duplicate record in the database
-                rewrite_status = check_and_rewrite_duplicate_record(conn, runtime_row_split)
-                if not rewrite_status:
-                    logger.debug(F"Database record NOT updated")
-            elif bindings_err_str in err_string:
-                # yes, welcome to the wonderful world of Ecobee...sometimes we randomly
-                # receive different records for the interval data, plus or minus some
-                # expected fields
-                logger.error(F"...unexpected number of fields returned from Ecobee service request,")
-                logger.error(F"...thermostat: {thermostat_name}, date: {runtime_row_split[3]}, "
+    try:
+        # Find the timeslots in this batch already in the database, so that we can tell how many
+        # of the records written are new, vs. updates of duplicates
+        run_dates = [runtime_row_split[3] for runtime_row_split in insert_rows]
+        cur.execute("SELECT run_date, run_time FROM runtime "
+                    "WHERE thermostat_id=? AND run_date BETWEEN ? AND ?",
+                    (thermostat_id, min(run_dates), max(run_dates)))
+        existing_keys = set(cur.fetchall())
+
+        new_rec_cnt = 0
+        for runtime_row_split in insert_rows:
+            run_key = (runtime_row_split[3], runtime_row_split[4])
+            if run_key in existing_keys:
+                logger.debug(F"Duplicate key...thermostat: {thermostat_name}, date: {runtime_row_split[3]}, "
                              F"time: {runtime_row_split[4]}")
-                logger.error(F"...returned row:  '{runtime_row}'")
-                logger.error(F"...SQL insert statement:  '{sql_insert}'")
-            else:  # only display error to console if other than dup-key occurs
-                print(F"Error writing to database, {e}")
-            return False
-        finally:
-            conn.commit()
-            cur.close()
-            return True
-    else:
-        logger.info(F"Empty record detected for thermostat: {thermostat_name}, "
-                    F"date: {runtime_row_split[3]}, time: {runtime_row_split[4]}")
-        logger.info(F"...skipped writing record to database")
-        logger.info(F"{runtime_row_split}")
+            else:
+                new_rec_cnt += 1
+                existing_keys.add(run_key)
+
+        changes_before = conn.total_changes
+        cur.executemany(sql_insert, insert_rows)
+        dup_update_cnt = conn.total_changes - changes_before - new_rec_cnt
+
+        # Blank records were skipped above, so the latest record in the batch is the new watermark
+        last_row = max(insert_rows, key=lambda runtime_row_split: (runtime_row_split[3], runtime_row_split[4]))
+        update_runtime_watermark(conn, thermostat_name, thermostat_id, last_row[3], last_row[4])
+    except sqlite3.Error as e:
+        cur.close()
+        logger.error(F"Error writing runtime records to database, {e}")
+        logger.error(F"...thermostat: {thermostat_name}, records: {len(insert_rows)}, "
+                     F"first: {insert_rows[0][3]} {insert_rows[0][4]}, last: {insert_rows[-1][3]} {insert_rows[-1][4]}")
+        print(F"Error writing runtime records to database, {e}")
+        return 0
+
+    cur.close()
+
+    dup_update_cnt_total += dup_update_cnt  # global variable used for informational summary
+    dup_update_cnt_this_thermostat += dup_update_cnt  # global variable used for informational summary
+    logger.debug(F"Runtime records written for thermostat {thermostat_name}:  {new_rec_cnt} new, "
+                 F"{dup_update_cnt} duplicates updated, {len(insert_rows) - new_rec_cnt - dup_update_cnt} "
+                 F"duplicates not updated")
+
+    return new_rec_cnt
 
 
 def check_for_empty_runtime_record(db_record):
@@ -2204,123 +2424,6 @@ def check_for_empty_runtime_record(db_record):
     return empty
 
 
-def check_and_rewrite_duplicate_record(conn, db_record):
-    """
-        This routine will locate a duplicate record in the Ecobee runtime database, based on the primary
-        key information from the passed db_record list.  It will then compare the database record
-        against the passed record information to determine which has the most detailed information, and
-        store it back to the database for this timeslot.
-
-        This process is a workaround for the quirky way in which the Ecobee thermostats report their
-        runtime data to the Ecobee service.  For the most recent timeslots, data is frequently reported
-        incomplete.  Though this app will filter out completely blank records and not store them, if
-        a partial data return is made, the record will be recorded potentially during an earlier run
-        of the app.  This routine will attempt to resolve this by recording any new information for the
-        given timeslot, rather than just fail on a store attempt for a duplicate record.
-                Written by DK Fowler ... 18-Oct-2019
-    :param conn:            Runtime database connection object
-    :param db_record:       List containing current record data to be stored for a given timeslot
-    :return:                True, if record contents are updated with the passed new record data, else False
-    """
-
-    global dup_update_cnt_total
-    global dup_update_cnt_this_thermostat
-
-    # Build a SQL query string to find the original record for this timeslot in the database
-
-    cur = conn.cursor()
-    # Build SQL query string, including exclusion of "blank" records...
-    db_str = "SELECT * FROM runtime WHERE thermostat_id=? AND run_date =? AND run_time=? "
-    db_str += "ORDER BY run_date DESC, run_time DESC LIMIT 1"
-    logger.debug(F"SQL for duplicate record query:  ")
-    logger.debug(F"...{db_str}")
-
-    try:
-        cur.execute(db_str, (db_record[2], db_record[3], db_record[4],))
-    except sqlite3.Error as e:
-        logger.error(F"Error occurred while attempting to find original duplicate record for this timeslot "
-                     F"in runtime database:  {e}")
-        logger.error(F"...record search key:  thermostat: {db_record[2]}  "
-                     F"run_date: {db_record[3]}  run_time: {db_record[4]}")
-        print(F"Error occurred while attempting to find original duplicate record for this timeslot "
-              F"in runtime database:  {e}")
-        print(F"...record search key:  thermostat: {db_record[2]}  "
-              F"run_date: {db_record[3]}  run_time: {db_record[4]}")
-        cur.close()
-        return False
-
-    rows = cur.fetchall()
-
-    # We have the original record; now compare its data against the passed new record data to see
-    # which (if either) contains the most non-blank data
-    db_record_data_cnt = 0
-    org_record_data_cnt = 0
-    for row in rows:
-        for field_idx in range(5, len(db_record)):  # loop through the fields to compare; skip the index info
-            if db_record[field_idx] != '':
-                db_record_data_cnt += 1
-            if row[field_idx] != '':
-                org_record_data_cnt += 1
-
-    logger.debug(F"Duplicate record data comparision:  original record from db count: {org_record_data_cnt}, "
-                 F"new record data count: {db_record_data_cnt}")
-    logger.debug(F"Database record: {rows[0]}")
-    logger.debug(F"New record:      {db_record}")
-
-    # If the database record contains the most data values, return without updating it.  Otherwise, update
-    # the record with the new data.
-    if org_record_data_cnt > db_record_data_cnt:  # Original database record most up-to-date
-        cur.close()
-        return False
-    else:  # New record is more up-to-date
-        record_written_UTC = datetime.utcnow()  # Get current UTC time for updating record
-        record_written_UTC_str = datetime.strftime(record_written_UTC, "%Y-%m-%d %H:%M:%S")
-
-        # Construct SQL update string
-        db_update_str = "UPDATE runtime SET "
-        # First field to update is the record-written date/time in UTC
-        db_update_str += runtime_fields[0] + " = '" + record_written_UTC_str + "', "
-        # Loop through data fields
-        for field_idx in range(5, len(db_record)):
-            db_update_str += runtime_fields[field_idx] + " = '"
-            db_update_str += db_record[field_idx]
-            if field_idx != len(db_record) - 1:
-                db_update_str += "', "
-            else:
-                db_update_str += "'"
-        db_update_str += " WHERE " + runtime_fields[2] + " = '" + db_record[2] + "'"
-        db_update_str += " AND " + runtime_fields[3] + " = '" + db_record[3] + "'"
-        db_update_str += " AND " + runtime_fields[4] + " = '" + db_record[4] + "'"
-
-        logger.debug(F"...SQL update string for duplicate key: {db_update_str}")
-
-        # Now try to execute the SQL update with the new data
-        try:
-            cur.execute(db_update_str)
-            dup_update_cnt_total += 1  # global variable used for informational summary
-            dup_update_cnt_this_thermostat += 1  # global variable used for informational summary
-            logger.info(F"Record updated for key:  thermostat: {db_record[2]}  "
-                        F"run_date: {db_record[3]}  run_time: {db_record[4]}")
-        except sqlite3.Error as e:
-            logger.error(F"Error occurred while attempting to update existing duplicate record in runtime database:  "
-                         F"{e}")
-            logger.error(F"...record search key:  thermostat: {db_record[2]}  "
-                         F"run_date: {db_record[3]}  run_time: {db_record[4]}")
-            logger.error(F"...new record:  {db_record}")
-            logger.error(F"...orig record:  {rows[0]}")
-            print(F"Error occurred while attempting to update existing duplicate record in runtime database:  "
-                  F"{e}")
-            print(F"...record search key:  thermostat: {db_record[2]}  "
-                  F"run_date: {db_record[3]}  run_time: {db_record[4]}")
-            print(F"...new record:  {db_record}")
-            print(F"...orig record:  {rows[0]}")
-            cur.close()
-            return False
-
-        cur.commit()
-        return True
-
-
 def construct_create_table_sql(table_name, attribute_name_map, attribute_type_map):
     """
         This routine will construct a SQLite CREATE TABLE SQL statement from the passed parameters.
@@ -2484,6 +2587,76 @@ def create_sqlite_datatype_dict(db_fields, db_datatypes_dict):
     return datatype_dict
 
 
+def write_snapshot_records(conn, thermostat_response):
+    """
+        This routine will write the "snapshot" records for each thermostat in the passed thermostat details
+        response, for each of the objects in SQLite_table_dict, along with the records for the lists embedded
+        in these objects.  (Moved here from main, so that it can also be run by the snapshot benchmark.)
+                                                                --- v03.33
+    :param conn:                    The SQLite database connection
+    :param thermostat_response:     Thermostat response object from API call with thermostat details
+    :return:
+    """
+
+    for thermostat_idx, thermo_val in enumerate(thermostat_response.thermostat_list):
+        for thermo_object, db_table in SQLite_table_dict.items():
+            thermostat_name = thermostat_response.thermostat_list[thermostat_idx].name
+            logger.debug(F"\nBeginning processing for snapshot records, table:  {db_table}, "
+                         F"thermostat:  {thermostat_name}")
+            print(F"Beginning processing for snapshot records, table:  {db_table}, "
+                  F"thermostat:  {thermostat_name}")
+            # db_table_recs_written[db_table] = 0
+            lists_dict = get_snapshot(conn,
+                                      db_table,
+                                      thermo_object,
+                                      thermostat_response.thermostat_list[thermostat_idx])
+
+            # Process embedded lists...
+            # Exclude processing of any lists within the root-level Thermostat object, as these are individually
+            # selected and processed through the API get_thermostat_details API call.  Also, check for the lists
+            # dictionary not defined to prevent an error if no data is available for the thermostat object.
+            if ('NoneType' not in str(type(lists_dict))) and \
+                    (thermo_object != 'thermostat'):
+                if len(lists_dict) != 0:
+                    # If more data in list, loop to handle...
+                    for list_object, list_table_brkt in lists_dict.items():
+                        # list_table_brkt is in form 'List[Ecobee object]'; strip everything but the object name
+                        therm_list_object = list_table_brkt[5:len(list_table_brkt) - 1]
+                        # Check if the list name is an API-defined list object or a non-defined list
+                        if list_object in thermostat_list_dict.keys():  # non-defined list in the API
+                            list_table = 'therm' + thermostat_list_dict[list_object]
+                        else:
+                            list_table = 'therm' + thermostat_list_object_dict[list_object]  # defined object
+                        logger.debug(F"...object:  {list_object}, ...list table:  {list_table}")
+
+                        print(F"...Beginning processing of list data, table:  {list_table}, "
+                              F"thermostat:  {thermostat_name}")
+
+                        # As the list object is being processed, examine the parent of the list; if it is also a
+                        # list (list embedded within a list), then we must index through each of the parent list
+                        # elements also.
+                        if thermo_object in thermostat_list_object_dict:
+                            # parent is a list itself, so we must iterate through it...
+                            parent_list = get_snapshot_accessor(thermo_object)(
+                                thermostat_response.thermostat_list[thermostat_idx])
+                            for parent_iter_idx, parent_iter_val in enumerate(parent_list):
+                                list_object_class = thermo_object + '[' + str(parent_iter_idx) + '].' + list_object
+                                lists_dict = get_snapshot(conn,
+                                                          list_table,
+                                                          list_object_class,
+                                                          thermostat_response.thermostat_list[thermostat_idx])
+                        # Otherwise, process the list object at the root level of the parent.
+                        else:
+                            list_object_class = thermo_object + '.' + list_object
+                            lists_dict = get_snapshot(conn,
+                                                      list_table,
+                                                      list_object_class,
+                                                      thermostat_response.thermostat_list[thermostat_idx])
+
+        # Commit the snapshot records written for this thermostat
+        conn.commit()
+
+
 def get_snapshot(conn,
                  db_table,
                  thermo_object,
@@ -2493,6 +2666,9 @@ def get_snapshot(conn,
         store these in a SQLite database.  The data being retrieved is specified by the calling
         routine and passed through the parameters.
                 Written by DK Fowler ... 25-Oct-2019
+
+        Modified to use the compiled accessor for the thermostat object (vs. eval), and the cached table
+        layout; the records for the object are written in a single batch.    --- v03.33
     :param conn                         The SQLite database connection
     :param db_table:                    The SQLite database table to which records are to be written
     :param thermo_object:               The thermostat response sub-class from which the values are obtained
@@ -2508,7 +2684,7 @@ def get_snapshot(conn,
             thermo_subclass_top = thermostat_response_object
         elif thermo_object != "":
             # For most defined sub-objects and embedded lists...
-            thermo_subclass_top = eval("thermostat_response_object" + "." + thermo_object)
+            thermo_subclass_top = get_snapshot_accessor(thermo_object)(thermostat_response_object)
         else:
             # Undefined object
             logger.error(F"Error processing thermostat object...undefined object:  {thermo_object}")
@@ -2519,100 +2695,60 @@ def get_snapshot(conn,
         print(F"Incorrect attribute specified for Thermostat object:  {thermo_object}...{e}")
         send_mail_and_exit()
 
-    logger.debug(F"Thermostat list values evaluation:  {thermo_subclass_top}")
-    # print(F"Attrib name map:  {thermostat_response_object[0].device.attribute_name_map}")
+    if '.' in thermo_object:
+        # List sub-objects include the parent object in the form 'parent.child'; strip the parent
+        # in order to evaluate the list root object
+        period_loc = thermo_object.index('.') + 1
+    else:
+        period_loc = 0
 
-    # Create a SQL statement to create the table; also return a dictionary with field names, datatypes,
-    # and a dictionary with list data requiring further processing
-    try:
-        if '.' in thermo_object:
-            # List sub-objects include the parent object in the form 'parent.child'; strip the parent
-            # in order to evaluate the list root object
-            period_loc = thermo_object.index('.') + 1
-        else:
-            period_loc = 0
-        # Object is a non-API-defined list
-        if thermo_object[period_loc:] in thermostat_list_dict:
-            logger.debug(F"Non-API-defined list object found: {thermo_object}")
-            lists_fields = {list_item: list_type for (list_item, list_type) in
-                            list_attribute_type_map_dict[thermo_object[period_loc:]].items()}
-            logger.debug(F"List fields, datatypes identified:  {lists_fields}")
-            create_table_sql_str, table_fields_dict, lists_dict = \
-                construct_create_table_sql(db_table,
-                                           lists_fields,
-                                           lists_fields)
-        # Object is an API-defined list object or embedded list object
-        elif ('.' in thermo_object) or \
-                (thermo_object in thermostat_list_object_dict):
-            # Check for empty list returned...
-            if not thermo_subclass_top:
-                logger.debug(F"...empty list object specified:  {thermo_object}")
-                return
-            else:
-                create_table_sql_str, table_fields_dict, lists_dict = \
-                    construct_create_table_sql(db_table,
-                                               thermo_subclass_top[0].attribute_name_map,
-                                               thermo_subclass_top[0].attribute_type_map)
-        # Object is a root-level API-defined object
-        else:
-            create_table_sql_str, table_fields_dict, lists_dict = \
-                construct_create_table_sql(db_table,
-                                           thermo_subclass_top.attribute_name_map,
-                                           thermo_subclass_top.attribute_type_map)
-        # print(F"Lists dictionary returned to get_snapshot:  {lists_dict}")
-    except AttributeError as e:  # catch no data available for this attribute
-        logger.debug(F"No data available for table:  {db_table}, object:  {thermo_object}...{e}")
-        print(F"No data available for table:  {db_table}, object:  {thermo_object}...{e}")
+    # Check for empty list returned for an API-defined list object or embedded list object...
+    if (('.' in thermo_object) or (thermo_object in thermostat_list_object_dict)) and \
+            (thermo_object[period_loc:] not in thermostat_list_dict) and not thermo_subclass_top:
+        logger.debug(F"...empty list object specified:  {thermo_object}")
+        return
+
+    # Get the table layout:  the SQL statements to create the table and insert records, a dictionary with
+    # field names and datatypes, and a dictionary with list data requiring further processing
+    snapshot_layout = get_snapshot_layout(db_table, thermo_object[period_loc:], thermo_subclass_top)
+    if snapshot_layout is None:
+        logger.debug(F"No data available for table:  {db_table}, object:  {thermo_object}")
         return
 
-    # Now attempt to create a record in the identified table for the passed thermostat object
+    # Now attempt to create records in the identified table for the passed thermostat object
     if conn is not None:
         # First, check if the table exists:
-        # Create SQL string for creating the table
-        create_table_success = create_table_from_string(conn, db_table, create_table_sql_str)
+        create_table_success = create_table_from_string(conn, db_table, snapshot_layout['create_sql'])
         if create_table_success:
             # Table successfully created or already exists.  Now write records.
-            create_record_status = False  # assume failure
-            logger.debug(F"Type of passed object:  {type(thermo_subclass_top)}")
-
             # Set the number of record iterations that we need to process...
             # If the thermostat object being processed is NOT a list object, then we can safely process it at
             # the root level; otherwise, we need to index it as a list item.  This is also true for simple lists
             # (those not defined as list objects by the API).  For non-API-defined list definitions, exclude
             # those that are embedded lists themselves (e.g., Schedule).  We check for this by examining the
             # first element of the list to see if its type is 'list'.
-            if ('list' not in str(type(thermo_subclass_top))) or \
-                    ((thermo_object[period_loc:] in thermostat_list_dict) and
-                     ('list' not in str(type(thermo_subclass_top[0])))):  # exclude non-API-defined list lists
-                rec_iterations = 1
+            # If we're processing a non-API defined list, and the contents DO NOT include embedded lists,
+            # pass just the root object itself to create the database record; otherwise, if we're processing
+            # an API-defined list object, or an embedded list, we need to index through it.
+            if not isinstance(thermo_subclass_top, list):
+                data_objects = [thermo_subclass_top]
+            elif (thermo_object[period_loc:] in thermostat_list_dict) and \
+                    not isinstance(thermo_subclass_top[0], list):  # non-API-defined list
+                data_objects = [thermo_subclass_top]
             else:
-                rec_iterations = len(thermo_subclass_top)
-
-            rec_iter_range = range(0, rec_iterations)
-            for rec_iteration in rec_iter_range:
-                # If we're processing a non-API defined list, and the contents DO NOT include embedded lists,
-                # pass just the root object itself to create the database record; otherwise, if we're processing
-                # an API-defined list object, or an embedded list, we need to index through it.
-                if (thermo_object[period_loc:] in thermostat_object_dict) or \
-                        ((thermo_object[period_loc:] in thermostat_list_dict) and
-                         ('list' not in str(type(thermo_subclass_top[0])))):  # non-API-defined list
-                    data_object = thermo_subclass_top
-                else:
-                    data_object = thermo_subclass_top[rec_iteration]  # API-defined list object / embedded list
-                logger.debug(F"List object for creating record, thermostat:  {thermostat_response_object.name}, "
-                             F"table:  {db_table} -->  {data_object}")
-                create_record_status = create_database_record(conn,
-                                                              db_table,
-                                                              thermostat_response_object.name,
-                                                              thermostat_response_object.identifier,
-                                                              table_fields_dict,
-                                                              data_object)
-                if create_record_status:
-                    logger.debug(F"...{db_table} record written successfully for {thermostat_response_object.name}")
-                    if db_table not in db_table_recs_written:  # if the counter entry doesn't exist yet,
-                        db_table_recs_written[db_table] = 1  # ...set it to indicate first write
-                    else:
-                        db_table_recs_written[db_table] += 1  # ...else, increment it
+                data_objects = thermo_subclass_top  # API-defined list object / embedded list
+            logger.debug(F"Objects for creating records, thermostat:  {thermostat_response_object.name}, "
+                         F"table:  {db_table}, records:  {len(data_objects)}")
+            recs_written = create_database_records(conn,
+                                                   db_table,
+                                                   thermostat_response_object.name,
+                                                   thermostat_response_object.identifier,
+                                                   snapshot_layout,
+                                                   data_objects)
+            if recs_written:
+                logger.debug(F"...{db_table} records written successfully for {thermostat_response_object.name}")
+                # if the counter entry doesn't exist yet, set it; else, increment it
+                db_table_recs_written[db_table] = db_table_recs_written.get(db_table, 0) + recs_written
         else:
             # Error creating table...
             logger.error(F"Error occurred creating table {db_table}...aborting")
@@ -2620,7 +2756,123 @@ def get_snapshot(conn,
             conn.close()  # close the db connection
             send_mail_and_exit()
 
-    return lists_dict  # Dictionary with more data to process in lists
+    return snapshot_layout['lists_dict']  # Dictionary with more data to process in lists
+
+
+def get_snapshot_accessor(thermo_object):
+    """
+        This routine will return a function which retrieves the thermostat sub-object given by the passed
+        object path (e.g., 'settings', 'program.climates', or 'devices[0].sensors') from a thermostat
+        response object, built from operator.attrgetter / itemgetter.  The accessors are cached, so each
+        is only built once.     --- v03.33
+    :param thermo_object:   The thermostat sub-object path, relative to the thermostat response object
+    :return:                Accessor function, taking the thermostat response object
+    """
+
+    accessor = snapshot_accessor_dict.get(thermo_object)
+    if accessor is None:
+        # Split the path into getters; consecutive attributes can be retrieved by one attrgetter
+        getters = []
+        attribute_path = []
+        for attribute in thermo_object.split('.'):
+            if '[' in attribute:
+                attribute_name, list_idx = attribute[:-1].split('[')
+                attribute_path.append(attribute_name)
+                getters.append(operator.attrgetter('.'.join(attribute_path)))
+                getters.append(operator.itemgetter(int(list_idx)))
+                attribute_path = []
+            else:
+                attribute_path.append(attribute)
+        if attribute_path:
+            getters.append(operator.attrgetter('.'.join(attribute_path)))
+
+        if len(getters) == 1:
+            accessor = getters[0]
+        else:
+            def accessor(thermostat_object, getters=tuple(getters)):
+                for getter in getters:
+                    thermostat_object = getter(thermostat_object)
+                return thermostat_object
+        snapshot_accessor_dict[thermo_object] = accessor
+
+    return accessor
+
+
+def get_snapshot_layout(db_table, list_root, thermo_subclass_top):
+    """
+        This routine will return the table layout used to write the snapshot records for the passed table
+        and thermostat object:  the SQL statements to create the table and insert a record, the field names
+        and datatypes, the lists requiring further processing, and an accessor for the field values.  The
+        layout only depends on the object type, so it is built the first time the object is written and
+        cached for the other thermostats and list entries.     --- v03.33
+    :param db_table:                The SQLite database table to which records are to be written
+    :param list_root:               The thermostat object name, without any parent (e.g., 'sensors')
+    :param thermo_subclass_top:     The thermostat sub-object from the thermostat response
+    :return:                        Dictionary with the table layout, or None if no data is available
+    """
+
+    snapshot_layout = snapshot_layout_dict.get((db_table, list_root))
+    if snapshot_layout is not None:
+        return snapshot_layout
+
+    try:
+        # Object is a non-API-defined list
+        if list_root in thermostat_list_dict:
+            logger.debug(F"Non-API-defined list object found: {list_root}")
+            lists_fields = {list_item: list_type for (list_item, list_type) in
+                            list_attribute_type_map_dict[list_root].items()}
+            logger.debug(F"List fields, datatypes identified:  {lists_fields}")
+            create_table_sql_str, table_fields_dict, lists_dict = \
+                construct_create_table_sql(db_table,
+                                           lists_fields,
+                                           lists_fields)
+        # Object is an API-defined list object or embedded list object
+        # (Empty lists are skipped by the caller.)
+        elif isinstance(thermo_subclass_top, list):
+            create_table_sql_str, table_fields_dict, lists_dict = \
+                construct_create_table_sql(db_table,
+                                           thermo_subclass_top[0].attribute_name_map,
+                                           thermo_subclass_top[0].attribute_type_map)
+        # Object is a root-level API-defined object
+        else:
+            create_table_sql_str, table_fields_dict, lists_dict = \
+                construct_create_table_sql(db_table,
+                                           thermo_subclass_top.attribute_name_map,
+                                           thermo_subclass_top.attribute_type_map)
+    except AttributeError as e:  # catch no data available for this attribute
+        logger.debug(F"No data available for table:  {db_table}, object:  {list_root}...{e}")
+        print(F"No data available for table:  {db_table}, object:  {list_root}...{e}")
+        return None
+
+    # Filter out list fields and defined thermostat objects; these are written to separate tables.  The
+    # remaining fields are written in this order, following the common fields (date written, name, id).
+    value_fields = [field for field in table_fields_dict if 'List' not in table_fields_dict[field] and
+                    field not in thermostat_object_dict and
+                    field not in thermostat_list_object_dict]
+    if len(value_fields) == 0:
+        values_getter = None
+    elif len(value_fields) == 1:
+        value_getter = operator.attrgetter(value_fields[0])
+
+        def values_getter(data_object):
+            return [value_getter(data_object)]
+    else:
+        values_getter = operator.attrgetter(*value_fields)
+
+    snapshot_layout = {'create_sql': create_table_sql_str,
+                       'insert_sql': construct_insert_table_sql(db_table, table_fields_dict),
+                       'fields_dict': table_fields_dict,
+                       'lists_dict': lists_dict,
+                       'value_fields': value_fields,
+                       # non-API-defined lists contain the values themselves, in field order
+                       'raw_values': list_root in thermostat_list_dict,
+                       'values_getter': values_getter,
+                       # parent records are keyed by date written; list (child) records link to the parent's
+                       'parent_table': db_table[5:] not in thermostat_list_object_dict.values() and
+                       db_table[5:] not in thermostat_list_dict.values()}
+    snapshot_layout_dict[(db_table, list_root)] = snapshot_layout
+
+    return snapshot_layout
 
 
 def check_internet_connect(chk_host_name):
@@ -2806,6 +3058,9 @@ def archive_db():
         create-date/time is the database creation date/time in the form "YYYYMMDDHHMM", and
         mod-date/time is the database last-modified date/time in the form "YYYYMMDDHHMM".
                 Written by DK Fowler ... 24-Feb-2020
+
+        Modified to write the archive in the database's folder, and add it to the archive catalog.
+                                                                --- v03.32
     """
 
     logger.info(F"Beginning database archival...")
@@ -2823,8 +3078,9 @@ def archive_db():
     fn = os.path.splitext(db_basename)
     db_filename = fn[0]
     db_ext = fn[1]
-    # Construct the new archival filename
-    archival_db_name = db_filename + "-" + db_create_string + "-" + db_modified_string + db_ext
+    # Construct the new archival filename, in the same folder as the database
+    archival_db_name = os.path.join(os.path.dirname(ECCEcobeeDatabase),
+                                    db_filename + "-" + db_create_string + "-" + db_modified_string + db_ext)
     print(F"Archival database name:  {archival_db_name}.")
 
     # Attempt to rename the existing database
@@ -2832,13 +3088,20 @@ def archive_db():
         os.rename(ECCEcobeeDatabase, archival_db_name)
         logger.info(F"Renamed database to: {archival_db_name}.")
         print(F"Renamed database to:  {archival_db_name}.")
-    except Error as e:
+    except OSError as e:
         logger.error(F"Error attempting to archive (rename) database file: {e}...")
         logger.error(F"...original database name:  {ECCEcobeeDatabase}")
         logger.error(F"...archival database name:  {archival_db_name}")
         print(F"Error attempting to archive (rename) database file: {e}...")
         print(F"...original database name:  {ECCEcobeeDatabase}")
         print(F"...archival database name:  {archival_db_name}")
+        return
+
+    # Record the archive in the catalog, so the next execution (with a new, empty database) can find the
+    # last runtime intervals written without opening the archive
+    archive_catalog = archive_catalog_from_file(ECCEcobeeArchiveCatalog)
+    if add_archive_catalog_entry(archive_catalog, archival_db_name):
+        archive_catalog_from_file(ECCEcobeeArchiveCatalog, archive_catalog)
 
 
 def check_for_archival_database_revision_records(thermostatName):
@@ -2847,39 +3110,296 @@ def check_for_archival_database_revision_records(thermostatName):
         retrieve the latest revision interval for the passed thermostat.  This would occur at first
         script execution following a database archival, where the new database is empty.
                 Written by DK Fowler ... 24-Feb-2020
+
+        Modified to read the last revision interval from the archive catalog, vs. opening the latest
+        archival file.  Archival files from earlier versions (matching {db filename}-*{db extension}, in
+        the database folder or the current directory) not yet in the catalog are added to it first.
+        The latest revision interval for the thermostat across all the archives is returned.
+                                                                --- v03.32
         :param thermostatName         The thermostat name for which the latest revision interval is begin retrieved
         :returns last_db_revision     The last revision interval in the database, if it exists; otherwise
                                       "000000000000" is returned
     """
 
-    # Get a list of databases that match in the current directory
-    #   First, assume the root of the filename is the same as it is currently.  So, get the current filename
-    #   without extension.
-    db_basename = os.path.basename(ECCEcobeeDatabase)
-    # Split the filename into name/extension components
-    fn = os.path.splitext(db_basename)
-    db_filename = fn[0]
-    db_ext = fn[1]
-    #   Get a list of the current directory's files
-    file_list = os.listdir('.')  # note this assumes the current working directory
-    #   Narrow this down to the ECC Ecobee database files
-    db_files_str = db_filename + '*.db'
-    db_files = fnmatch.filter(file_list, db_files_str)
-    # If we don't find any matching files, assume this is the first iteration of the program and the database
-    # has just been initialized.
-    if len(db_files) == 0:
-        last_db_revision = "000000000000"
+    archive_catalog = archive_catalog_from_file(ECCEcobeeArchiveCatalog)
+
+    # Look for archival files not yet in the catalog.  First, assume the root of the filename is the same
+    # as it is currently.  So, get the current filename without extension.
+    db_dir = os.path.dirname(ECCEcobeeDatabase)
+    db_filename, db_ext = os.path.splitext(os.path.basename(ECCEcobeeDatabase))
+    db_files_str = db_filename + '-*' + db_ext
+    cataloged_files = [os.path.abspath(archive['archive_file']) for archive in archive_catalog]
+    new_archive_cnt = 0
+    # Earlier versions wrote the archival files to the current working directory
+    for archive_dir in sorted({os.path.abspath(db_dir or '.'), os.path.abspath('.')}):
+        for db_file in sorted(fnmatch.filter(os.listdir(archive_dir), db_files_str)):
+            archival_db_name = os.path.join(archive_dir, db_file)
+            if os.path.abspath(archival_db_name) not in cataloged_files:
+                if add_archive_catalog_entry(archive_catalog, archival_db_name):
+                    new_archive_cnt += 1
+    if new_archive_cnt > 0:
+        archive_catalog_from_file(ECCEcobeeArchiveCatalog, archive_catalog)
+
+    # If the thermostat isn't in any archive, assume this is the first iteration of the program and the
+    # database has just been initialized (or the thermostat is new).
+    last_db_revision = "000000000000"
+    for archive in archive_catalog:
+        thermostat_entry = archive['thermostats'].get(thermostatName)
+        if thermostat_entry and thermostat_entry['last_revision'] > last_db_revision:
+            last_db_revision = thermostat_entry['last_revision']
+            logger.debug(F"Last revision interval for thermostat {thermostatName} found in archive "
+                         F"{archive['archive_file']}:  {last_db_revision}")
+
+    return last_db_revision
+
+
+def add_archive_catalog_entry(archive_catalog, archival_db_name):
+    """
+        This routine will add an entry to the passed archive catalog list for the passed archival database,
+        recording the range of runtime intervals in the archive and, for each thermostat, the first and
+        last (non-blank) runtime intervals written.  The catalog is not written here.    --- v03.32
+    :param archive_catalog:     list of archive catalog entries, as read by archive_catalog_from_file
+    :param archival_db_name:    archival database filename path
+    :return:                    True if the entry was added, otherwise, False
+    """
+
+    logger.info(F"Adding archival database {archival_db_name} to the archive catalog...")
+    print(F"Adding archival database {archival_db_name} to the archive catalog...")
+
+    thermostats = {}
+    try:
+        conn = sqlite3.connect(archival_db_name)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT DISTINCT thermostat_name FROM runtime")
+            for (thermostat_name,) in cur.fetchall():
+                cur.execute("SELECT run_date, run_time FROM runtime WHERE thermostat_name=? "
+                            "ORDER BY run_date, run_time LIMIT 1", (thermostat_name,))
+                first_run = cur.fetchone()
+                last_row = select_db_last_runtime_row(conn, thermostat_name)
+                if last_row is None:
+                    continue
+                last_run = datetime.strptime(last_row[1] + " " + last_row[2], "%Y-%m-%d %H:%M:%S")
+                thermostats[thermostat_name] = {'thermostat_id': last_row[0],
+                                                'first_run': first_run[0] + " " + first_run[1],
+                                                'last_run': last_row[1] + " " + last_row[2],
+                                                'last_revision': last_run.strftime("%y%m%d%H%M%S")}
+            cur.close()
+        finally:
+            conn.close()
+    except (sqlite3.Error, ValueError) as e:
+        logger.error(F"Error reading archival database {archival_db_name} for the archive catalog, {e}")
+        print(F"Error reading archival database {archival_db_name} for the archive catalog, {e}")
+        return False
+
+    archive_catalog.append({'archive_file': archival_db_name,
+                            'cataloged_UTC': datetime.strftime(datetime.utcnow(), "%Y-%m-%d %H:%M:%S"),
+                            'first_run': min((thermo['first_run'] for thermo in thermostats.values()), default=None),
+                            'last_run': max((thermo['last_run'] for thermo in thermostats.values()), default=None),
+                            'thermostats': thermostats})
+    logger.debug(F"Archive catalog entry:  {json.dumps(archive_catalog[-1], indent=4)}")
+
+    return True
+
+
+def archive_catalog_from_file(filename, archive_catalog=None):
+    """
+        This routine will read the archive catalog JSON file and return the list of archive entries, if the
+        passed parameter "archive_catalog" is set to None.  Otherwise, it will write the passed list to the
+        archive catalog JSON file.  (Same approach as interval_config_from_file.)     --- v03.32
+    :param filename:            archive catalog JSON filename path
+    :param archive_catalog:     list of archive catalog entries to write, or None to read
+    :return:                    the list of archive entries when reading (empty if none); when writing,
+                                True if successful, otherwise, False
+    """
+
+    if archive_catalog is not None:
+        # Write to a temporary file first, so a failure can't leave a partial catalog
+        try:
+            with open(filename + ".tmp", 'w') as catalog_file:
+                catalog_file.write(json.dumps(archive_catalog, indent=4))
+            os.replace(filename + ".tmp", filename)
+            logger.debug(F"Saved {len(archive_catalog)} entries to archive catalog file {filename}.")
+        except OSError as error:
+            logger.exception(F"Error while attempting to write archive catalog file: {error}")
+            return False
+        return True
     else:
-        # Sort the list of files returned
-        sorted(db_files, reverse=True)  # reverse sort, newest filename on top
-        # Get the latest filename (archival filenames contain date/time)
-        last_archival_db_file = db_files[0]
+        if os.path.isfile(filename):
+            try:
+                with open(filename, 'r') as catalog_file:
+                    return json.loads(catalog_file.read())
+            except (OSError, ValueError) as error:
+                logger.exception(F"Error while attempting to read archive catalog file:  {error}")
+        return []
 
-        # Connect to this database and get a connection object
-        conn = create_connection(last_archival_db_file)
-        last_db_revision = select_db_last_runtime_interval(conn, thermostatName)
 
-    return last_db_revision
+def get_db_change_signature(db_file):
+    """
+        This routine will return values identifying the current state of the passed database file, for
+        determining if it has changed since the last backup:  the file change counter and database size
+        (in pages) from the SQLite database header, which are updated with each transaction written, and
+        the file size / modification time (along with those of any write-ahead log).   --- v03.34
+
+        Kept identical to get_db_change_signature in ECC_MQTT_IoT_SQLite.py (ECC-MQTT-IoT); each
+        application is installed as a single script, so change both copies together.
+    :param db_file:     database filename path
+    :return:            dictionary of the values identifying the database state
+    """
+
+    with open(db_file, 'rb') as db:
+        db_header = db.read(100)
+    db_signature = {'change_counter': int.from_bytes(db_header[24:28], 'big'),
+                    'page_count': int.from_bytes(db_header[28:32], 'big'),
+                    'file_size': os.path.getsize(db_file),
+                    'file_mtime_ns': os.stat(db_file).st_mtime_ns}
+    if os.path.isfile(db_file + "-wal"):
+        db_signature['wal_size'] = os.path.getsize(db_file + "-wal")
+        db_signature['wal_mtime_ns'] = os.stat(db_file + "-wal").st_mtime_ns
+
+    return db_signature
+
+
+def backup_db(db_file, backup_dir, compress=False):
+    """
+        This routine will back up the passed database to the passed folder, using the SQLite online backup
+        API.  The backup copies backup_pages_per_step pages at a time, releasing the database between steps,
+        so that other connections writing to the database aren't blocked; if the database is written by
+        another connection during the backup, SQLite restarts it, so the copy is always consistent.  If the
+        backup is restarted more than backup_max_restarts times, it is abandoned and tried again after a
+        delay, up to backup_max_attempts times; the writers are never held off for a single-step copy, so a
+        database that is written continuously isn't backed up, and False is returned.  The copy is written
+        to a temporary file, then (optionally) compressed, and then replaces the previous backup,
+        {backup folder}/{db filename}{db extension}[.gz].
+        The state of the database when backed up is saved alongside the backup, in
+        {db filename}{db extension}.backup.json; if the database hasn't changed since the last backup, the
+        backup is skipped.      --- v03.34
+
+        Kept identical to backup_db in ECC_MQTT_IoT_SQLite.py (ECC-MQTT-IoT); each application is
+        installed as a single script, so change both copies together.
+    :param db_file:     database filename path
+    :param backup_dir:  folder to which the backup is written
+    :param compress:    True to compress the backup (gzip)
+    :return:            True if the backup was made or skipped as unchanged, otherwise, False
+    """
+
+    logger.info(F"Beginning backup of database {db_file} to {backup_dir}...")
+    print(F"Beginning backup of database {db_file} to {backup_dir}...")
+
+    if not os.path.isfile(db_file):
+        logger.error(F"Database {db_file} not found...backup not made")
+        print(F"Database {db_file} not found...backup not made")
+        return False
+
+    db_basename = os.path.basename(db_file)
+    backup_file = os.path.join(backup_dir, db_basename + (".gz" if compress else ""))
+    backup_state_file = os.path.join(backup_dir, db_basename + ".backup.json")
+
+    try:
+        os.makedirs(backup_dir, exist_ok=True)
+        # Get the state of the database before starting; if it changes during the backup, the next
+        # backup will see the change
+        db_signature = get_db_change_signature(db_file)
+        last_backup_state = {}
+        if os.path.isfile(backup_state_file):
+            with open(backup_state_file, 'r') as state_file:
+                last_backup_state = json.load(state_file)
+    except (OSError, ValueError) as e:
+        logger.error(F"Error checking database {db_file} for backup: {e}")
+        print(F"Error checking database {db_file} for backup: {e}")
+        return False
+
+    if last_backup_state.get('db_signature') == db_signature and \
+            last_backup_state.get('backup_file') == backup_file and os.path.isfile(backup_file):
+        logger.info(F"Database {db_file} unchanged since the last backup, {last_backup_state.get('backup_UTC')} UTC "
+                    F"(change counter {db_signature['change_counter']})...backup skipped")
+        print(F"Database {db_file} unchanged since the last backup, {last_backup_state.get('backup_UTC')} UTC "
+              F"(change counter {db_signature['change_counter']})...backup skipped")
+        return True
+
+    backup_start = time.time()
+    backup_tmp_file = os.path.join(backup_dir, db_basename + ".backup-tmp")
+    backup_copied_pages = 0
+    backup_restarts = 0
+
+    class BackupRestartLimit(Exception):
+        pass
+
+    def backup_progress(status, remaining, total):
+        nonlocal backup_copied_pages, backup_restarts
+        # A write to the database by another connection restarts the backup from the first page
+        if total - remaining <= backup_copied_pages:
+            backup_restarts += 1
+            logger.debug(F"...backup of {db_file} restarted by a database write ({backup_restarts})")
+            if backup_restarts > backup_max_restarts:
+                raise BackupRestartLimit
+        backup_copied_pages = total - remaining
+
+    try:
+        backup_pages = None
+        for backup_attempt in range(1, backup_max_attempts + 1):
+            if backup_attempt > 1:
+                retry_delay = backup_retry_delay_secs * 2 ** (backup_attempt - 2)
+                logger.info(F"...retrying backup of {db_file} in {retry_delay} seconds "
+                            F"(attempt {backup_attempt} of {backup_max_attempts})")
+                print(F"...retrying backup of {db_file} in {retry_delay} seconds "
+                      F"(attempt {backup_attempt} of {backup_max_attempts})")
+                time.sleep(retry_delay)
+            backup_copied_pages = 0
+            backup_restarts = 0
+
+            src_conn = sqlite3.connect(db_file)
+            dst_conn = sqlite3.connect(backup_tmp_file)
+            try:
+                src_conn.backup(dst_conn, pages=backup_pages_per_step, progress=backup_progress,
+                                sleep=backup_step_sleep_secs)
+                backup_pages = dst_conn.execute("PRAGMA page_count").fetchone()[0]
+                break
+            except BackupRestartLimit:
+                logger.warning(F"Backup of {db_file} restarted {backup_restarts} times by database writes")
+                print(F"Backup of {db_file} restarted {backup_restarts} times by database writes")
+            finally:
+                dst_conn.close()
+                src_conn.close()
+
+        # Don't hold off the writers with a single-step copy; give up until the next scheduled backup
+        if backup_pages is None:
+            raise BackupRestartLimit(F"database was being written during each of {backup_max_attempts} attempts")
+
+        if compress:
+            with open(backup_tmp_file, 'rb') as f_in, gzip.open(backup_tmp_file + ".gz", 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(backup_tmp_file)
+            backup_tmp_file += ".gz"
+        os.replace(backup_tmp_file, backup_file)
+    except (BackupRestartLimit, sqlite3.Error, OSError) as e:
+        logger.error(F"Error backing up database {db_file} to {backup_file}: {e}")
+        print(F"Error backing up database {db_file} to {backup_file}: {e}")
+        for tmp_file in (backup_tmp_file, backup_tmp_file + ".gz"):
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+        return False
+
+    backup_state = {'database': os.path.abspath(db_file),
+                    'backup_file': backup_file,
+                    'compressed': compress,
+                    'backup_UTC': datetime.strftime(datetime.utcnow(), "%Y-%m-%d %H:%M:%S"),
+                    'pages': backup_pages,
+                    'backup_bytes': os.path.getsize(backup_file),
+                    'db_signature': db_signature}
+    try:
+        with open(backup_state_file, 'w') as state_file:
+            json.dump(backup_state, state_file, indent=4)
+    except OSError as e:
+        # The backup is good; the next one just won't be skipped
+        logger.error(F"Error saving database backup state to {backup_state_file}: {e}")
+
+    logger.info(F"Database {db_file} backed up to {backup_file}:  {backup_pages} pages, "
+                F"{backup_state['backup_bytes']} bytes, {time.time() - backup_start:.1f} seconds")
+    print(F"Database {db_file} backed up to {backup_file}:  {backup_pages} pages, "
+          F"{backup_state['backup_bytes']} bytes, {time.time() - backup_start:.1f} seconds")
+
+    return True
 
 
 def get_email_credentials():
@@ -3009,6 +3529,11 @@ def send_mail_and_exit():
     :return:    None
     """
 
+    # A fetch thread (e.g., refreshing the access tokens) leaves the e-mail and exit to the main
+    # thread      --- v03.35
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeFetchError()
+
     # Get the email credentials
     mail_origin, mail_pass, mail_local_host, mail_to = get_email_credentials()
 
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+"""
+    This routine will benchmark the writing of the Ecobee thermostat "snapshot" records (settings,
+    weather, devices, program, etc., and the lists embedded in these), using a saved thermostat
+    details response in place of a call to the Ecobee service.  (The sample response provided,
+    ECCEcobee_Snapshot_Fixture.json, covers two thermostats and the objects the application
+    selects.)  The response is deserialized with the Pyecobee library in the same way as a live
+    response, then passed to the application's write_snapshot_records routine, writing to a
+    scratch database.  The time measured includes the attribute traversal, building the SQL, the
+    SQLite inserts and the application's logging.
+
+    Each iteration is one poll (all thermostats, all snapshot tables).  As the application is normally
+    run once per poll by a scheduled task, by default the application's snapshot caches are cleared
+    before each iteration, as for a new process; use --warm to keep them between iterations.  The
+    first iteration also creates the snapshot tables, and is reported separately.
+
+    The ECC version of the Pyecobee library (pyecobee.zip, in this folder) must be installed or
+    on the Python path; see the readme.
+
+    Usage (from this folder):
+        set PYTHONPATH=pyecobee.zip
+        python ECC_Ecobee_Snapshot_Benchmark.py --iterations 50
+        python ECC_Ecobee_Snapshot_Benchmark.py --fixture my_response.json --warm
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import contextlib
+import importlib.util
+
+from datetime import datetime
+
+# Parse the command line arguments
+parser = argparse.ArgumentParser(description='''Epiphany Catholic Church Ecobee snapshot benchmark.
+                                            This routine will write the snapshot records for a saved
+                                            thermostat details response and report the time per poll.''')
+parser.add_argument("-n", "--iterations", type=int, default=20,
+                    help="number of polls to write")
+parser.add_argument("-f", "--fixture", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "ECCEcobee_Snapshot_Fixture.json"),
+                    help="saved thermostat details response (JSON) filename path")
+parser.add_argument("-d", "--db_dir", default=None,
+                    help="folder for the scratch database (default: a new temporary folder)")
+parser.add_argument("--warm", action="store_true",
+                    help="keep the application's snapshot caches between polls")
+parser.add_argument("--json", default=None,
+                    help="also write the results to this JSON filename path, for later comparison")
+
+args = parser.parse_args()
+
+db_dir = args.db_dir if args.db_dir else tempfile.mkdtemp(prefix="ECCEcobee-bench-")
+os.makedirs(db_dir, exist_ok=True)
+db_file = os.path.join(db_dir, "ECCEcobee.db")
+log_file = os.path.join(db_dir, "ECCEcobee.log")
+
+# The application parses its own command line at import, so give it the scratch locations
+sys.argv = [sys.argv[0], "--log-file-path", log_file, "--database-file-path", db_file]
+app_spec = importlib.util.spec_from_file_location(
+    "ecc_pycobee_data", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ECC Pycobee Data.py"))
+app = importlib.util.module_from_spec(app_spec)
+app_spec.loader.exec_module(app)
+
+from pyecobee.utilities import Utilities
+from pyecobee.responses import EcobeeThermostatResponse
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = max(0, int(round(pct / 100 * len(values))) - 1)
+    return values[index]
+
+
+def load_fixture(filename):
+    """
+    Return the thermostat details response object for the saved response, deserialized as the
+    Pyecobee library does for a live response.
+    """
+
+    with open(filename, "r") as fixture_file:
+        response_json = json.load(fixture_file)
+
+    return Utilities.dictionary_to_object({'EcobeeThermostatResponse': response_json},
+                                          {'EcobeeThermostatResponse': EcobeeThermostatResponse},
+                                          {'EcobeeThermostatResponse': None},
+                                          is_top_level=True)
+
+
+def reset_run_state(clear_caches):
+    """
+    Reset the application's per-run globals (as set up by its main()), and optionally the snapshot
+    caches, which otherwise last for the life of the process.
+    """
+
+    app.db_table_recs_written = {}
+    app.list_parent_written_UTC_dict = {}
+    if clear_caches:
+        # The parent / child table links are recorded as the table layouts are built
+        app.list_parent_to_child_dict = {}
+        app.snapshot_layout_dict.clear()
+        app.snapshot_accessor_dict.clear()
+        app.snapshot_tables_verified.clear()
+
+
+def main():
+    thermostat_response = load_fixture(args.fixture)
+
+    print(F"Benchmarking ECC Ecobee snapshot records, version {app.eccpycobee_version}, {app.eccpycobee_date}")
+    print(F"Database:  {db_file}")
+    print(F"Fixture:  {args.fixture}, thermostats: {len(thermostat_response.thermostat_list)}")
+    print(F"Polls:  {args.iterations}, caches: {'kept between polls' if args.warm else 'cleared each poll'}")
+
+    conn = app.connectdb_create_runtime_table()
+
+    poll_times = []
+    records = 0
+    # The application prints its progress to the console; discard that while running
+    with open(os.devnull, "w") as devnull:
+        for iteration in range(args.iterations + 1):
+            reset_run_state(not args.warm or iteration == 0)
+            poll_start = time.perf_counter()
+            with contextlib.redirect_stdout(devnull):
+                app.write_snapshot_records(conn, thermostat_response)
+            poll_time = time.perf_counter() - poll_start
+            if iteration == 0:
+                # First poll also creates the tables
+                first_poll_time = poll_time
+                first_poll_records = sum(app.db_table_recs_written.values())
+            else:
+                poll_times.append(poll_time)
+                records += sum(app.db_table_recs_written.values())
+
+    conn.close()
+
+    summary = {"polls": len(poll_times),
+               "records_per_poll": first_poll_records,
+               "first_poll_ms": round(first_poll_time * 1000, 3),
+               "mean_ms": round(sum(poll_times) / len(poll_times) * 1000, 3),
+               "p50_ms": round(percentile(poll_times, 50) * 1000, 3),
+               "p90_ms": round(percentile(poll_times, 90) * 1000, 3),
+               "max_ms": round(max(poll_times) * 1000, 3),
+               "records_per_sec": round(records / sum(poll_times), 1),
+               "db_bytes": os.path.getsize(db_file)}
+
+    print(F"Records per poll:  {summary['records_per_poll']}")
+    print(F"First poll (creates tables):  {summary['first_poll_ms']:9.3f} ms")
+    print(F"Per poll:  mean {summary['mean_ms']:9.3f}  p50 {summary['p50_ms']:9.3f}  "
+          F"p90 {summary['p90_ms']:9.3f}  max {summary['max_ms']:9.3f} ms")
+    print(F"Records per second:  {summary['records_per_sec']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"version": app.eccpycobee_version,
+                       "run_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                       "options": vars(args),
+                       "summary": summary}, f, indent=2)
+        print(F"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
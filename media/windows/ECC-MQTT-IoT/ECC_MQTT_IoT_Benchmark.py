@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+"""
+    This routine will benchmark the ECC MQTT IoT listener's message handling, by feeding
+    synthetic sensor messages through the listener's real on_message callback (as paho would
+    call it from its network loop), without connecting to a broker.  The listener writes to a
+    scratch database in its normal way, so the time measured includes payload parsing, the
+    sensor ID checks, the SQLite inserts and the listener's logging.
+
+    The benchmark reports, for each window of messages and overall:  the sustained throughput
+    (messages per second), the per-message latency percentiles, and the growth of the database
+    files.  Since paho calls on_message on its single network-loop thread, the throughput is the
+    rate at which messages can arrive before the loop backs up.
+
+    Usage (from this folder):
+        python ECC_MQTT_IoT_Benchmark.py --messages 20000 --sensors 25
+        python ECC_MQTT_IoT_Benchmark.py --rate 200      # pace messages; report backlog
+"""
+
+import os
+import sys
+import time
+import glob
+import json
+import random
+import argparse
+import tempfile
+import contextlib
+
+from datetime import datetime
+
+# Parse the command line arguments
+parser = argparse.ArgumentParser(description='''Epiphany Catholic Church MQTT IoT Listener benchmark.
+                                            This routine will feed synthetic temp/humidity sensor messages
+                                            through the listener and report throughput, latency and
+                                            database growth.''')
+parser.add_argument("-n", "--messages", type=int, default=10000,
+                    help="number of messages to send")
+parser.add_argument("-s", "--sensors", type=int, default=10,
+                    help="number of simulated sensors")
+parser.add_argument("-r", "--rate", type=float, default=0,
+                    help="target message rate, in messages/second (default: as fast as possible)")
+parser.add_argument("-w", "--window", type=int, default=1000,
+                    help="number of messages per reporting window")
+parser.add_argument("-d", "--db_dir", default=None,
+                    help="folder for the scratch database (default: a new temporary folder)")
+parser.add_argument("--no_sensor_id", action="store_true",
+                    help="send the older 7-field payload, without sensor ID / location data")
+parser.add_argument("--log_file_path", default=None,
+                    help="listener log filename path (default: in the database folder)")
+parser.add_argument("--json", default=None,
+                    help="also write the results to this JSON filename path, for later comparison")
+parser.add_argument("--seed", type=int, default=1,
+                    help="random seed for the synthetic readings")
+
+args = parser.parse_args()
+
+db_dir = args.db_dir if args.db_dir else tempfile.mkdtemp(prefix="ECCMQTTIoT-bench-")
+os.makedirs(db_dir, exist_ok=True)
+db_file = os.path.join(db_dir, "ECCTempHum.sqlite3")
+log_file = args.log_file_path if args.log_file_path else os.path.join(db_dir, "ECCMQTTIoT.log")
+
+# The listener parses its own command line at import, so give it the scratch locations
+sys.argv = [sys.argv[0], "--log_file_path", log_file, "--database_file_path", db_file]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import paho.mqtt.client as mqtt
+import ECC_MQTT_IoT_SQLite as listener
+
+# The listener routes stderr to its log; keep the console for our own output
+sys.stderr = sys.__stderr__
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = max(0, int(round(pct / 100 * len(values))) - 1)
+    return values[index]
+
+
+def db_size_bytes():
+    """
+    Return the total size of the scratch database files (catalog and partitions, plus any
+    journal files).
+    """
+
+    db_filename = os.path.splitext(db_file)[0]
+    return sum(os.path.getsize(f) for f in glob.glob(db_filename + "*"))
+
+
+def make_message(sensor_idx, rnd):
+    """
+    Return a paho MQTTMessage with a synthetic payload in the form published by the sensors, e.g.:
+        field1=47.10&field2=73.45&field3=39.17&field4=3.41&field5=93.53&field6=-67
+        &field7=ECCTH01&field8=Office&field9=98:F4:AB:DA:6E:E2&field10=v03.10
+    """
+
+    fields = [F"{rnd.uniform(30, 60):.2f}",        # dew point
+              F"{rnd.uniform(60, 80):.2f}",        # temperature
+              F"{rnd.uniform(20, 60):.2f}",        # relative humidity
+              F"{rnd.uniform(3.2, 4.2):.2f}",      # battery voltage
+              F"{rnd.uniform(0, 100):.2f}",        # battery percent
+              F"{rnd.randint(-90, -40)}",          # access point RSSI
+              F"ECCTH{sensor_idx + 1:02d}"]        # sensor name
+    if not args.no_sensor_id:
+        fields += [F"Room {sensor_idx + 1}",
+                   F"98:F4:AB:DA:{sensor_idx // 256:02X}:{sensor_idx % 256:02X}",
+                   "v03.10"]
+
+    msg = mqtt.MQTTMessage(topic=b"ECCTempHum")
+    msg.payload = "&".join(F"field{idx + 1}={value}" for idx, value in enumerate(fields)).encode("utf-8")
+    msg.qos = 0
+
+    return msg
+
+
+def summarize(latencies, elapsed, size_start, size_end):
+    return {"messages": len(latencies),
+            "elapsed_secs": round(elapsed, 3),
+            "msgs_per_sec": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "max_ms": round(max(latencies) * 1000, 3),
+            "db_bytes": size_end,
+            "db_bytes_per_msg": round((size_end - size_start) / len(latencies), 1)}
+
+
+def print_summary(label, summary):
+    print(F"{label:>14}  {summary['msgs_per_sec']:9.1f} msg/s  "
+          F"p50 {summary['p50_ms']:7.3f}  p90 {summary['p90_ms']:7.3f}  "
+          F"p99 {summary['p99_ms']:7.3f}  max {summary['max_ms']:8.3f} ms  "
+          F"db {summary['db_bytes'] / 1048576:8.2f} MB  "
+          F"{summary['db_bytes_per_msg']:6.1f} B/msg")
+
+
+def main():
+    rnd = random.Random(args.seed)
+
+    # Same setup as the listener's main(), less connecting to the broker
+    listener.recvd_message_cnt = 0
+    listener.database_records_written = 0
+    listener.received_msg = False
+    listener.sensor_recvd_message_cnt = {}
+    listener.open_partition_catalog()
+    listener.load_sensor_id_cache()
+
+    print(F"Benchmarking ECC MQTT IoT listener version {listener.eccmqtt_iot_version}, "
+          F"{listener.eccmqtt_iot_date}")
+    print(F"Database:  {db_file}")
+    print(F"Messages:  {args.messages}, sensors: {args.sensors}, "
+          F"rate: {args.rate if args.rate else 'unlimited'}, "
+          F"payload: {'7 fields' if args.no_sensor_id else '10 fields'}")
+
+    # Build the messages up front, so that doesn't count against the listener
+    messages = [make_message(idx % args.sensors, rnd) for idx in range(args.messages)]
+
+    windows = []
+    latencies = []
+    window_latencies = []
+    max_backlog = 0.0
+    size_start = window_size_start = db_size_bytes()
+
+    # The listener prints every message to the console; discard that while running
+    with open(os.devnull, "w") as devnull:
+        run_start = window_start = time.perf_counter()
+        for idx, msg in enumerate(messages):
+            if args.rate:
+                # Messages arrive on schedule; if we're behind, that's the backlog paho would have
+                scheduled = run_start + idx / args.rate
+                now = time.perf_counter()
+                if now < scheduled:
+                    time.sleep(scheduled - now)
+                else:
+                    max_backlog = max(max_backlog, now - scheduled)
+
+            msg_start = time.perf_counter()
+            with contextlib.redirect_stdout(devnull):
+                listener.on_message(None, None, msg)
+            window_latencies.append(time.perf_counter() - msg_start)
+
+            if len(window_latencies) == args.window or idx == len(messages) - 1:
+                now = time.perf_counter()
+                window_size_end = db_size_bytes()
+                summary = summarize(window_latencies, now - window_start, window_size_start, window_size_end)
+                summary["through_msg"] = idx + 1
+                windows.append(summary)
+                print_summary(F"{idx + 1} msgs", summary)
+
+                latencies += window_latencies
+                window_latencies = []
+                window_start = now
+                window_size_start = window_size_end
+
+        elapsed = time.perf_counter() - run_start
+
+    overall = summarize(latencies, elapsed, size_start, db_size_bytes())
+    overall["records_written"] = listener.database_records_written
+    if args.rate:
+        overall["max_backlog_secs"] = round(max_backlog, 3)
+
+    print_summary("overall", overall)
+    print(F"Records written:  {listener.database_records_written}")
+    if args.rate:
+        print(F"Maximum backlog behind the target rate:  {max_backlog:.3f} seconds")
+    else:
+        # The sensors publish about every 10 minutes
+        print(F"Sustained rate supports about {int(overall['msgs_per_sec'] * 600)} sensors "
+              F"at one message per 10 minutes")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"version": listener.eccmqtt_iot_version,
+                       "run_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                       "options": vars(args),
+                       "overall": overall,
+                       "windows": windows}, f, indent=2)
+        print(F"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -73,6 +73,38 @@
     added to a new table in the database, but only if the data changes from the
     last-recorded information.
             Modified by DK Fowler ... 18-Dec-2020           --- v02.30
+
+    Keep the last-written sensor ID data for each sensor in memory (loaded from the
+    database at startup), so that checking for sensor ID changes does not need to
+    query the database for every message.  The database query that is used as a
+    fallback is now parameterized.
+                                                            --- v02.40
+
+    Replaced the size-based rename rotation of the database with partition databases,
+    one per month (or year) of records, and a catalog table of the partitions and
+    their time ranges kept in the main database file.  Added a query routine that
+    ATTACHes only the partitions overlapping a requested time range.  Existing
+    databases and renamed archives are added to the catalog at startup (archives are
+    first moved from the current folder, where the old rotation left them, to the
+    database folder); since their time ranges may overlap, query results are merged
+    in time order across partitions.
+                                                            --- v02.50
+
+    Added a schema registry, keyed on the topic and the set of fields in the message
+    payload, which caches the table layouts and INSERT statements so that they aren't
+    rebuilt (and the tables checked) for every message.  Tables are checked once per
+    partition database; if a sensor starts reporting a new field, it is added to the
+    table with ALTER TABLE ADD COLUMN.
+                                                            --- v02.60
+
+    Added a backup option (--backup_dir), which copies the catalog database and each
+    partition database in the catalog to the backup folder using the SQLite online backup
+    API, then exits; it may be run while the listener is writing (a copy that keeps being
+    restarted by the listener's writes is retried later, or fails).  The copies may be
+    compressed (--backup_compress).  Each database's change counter is saved with its
+    backup, so partitions that haven't changed since the last backup (all but the current
+    one, normally) aren't copied again.
+                                                            --- v02.70
 """
 
 import paho.mqtt.client as mqtt
@@ -88,17 +120,21 @@ import atexit
 import sys
 import argparse
 
+import glob
+import heapq
 from concurrent import futures
 
 import gzip
+import shutil
+import json
 import logging.handlers
 
 import sqlite3
 from sqlite3 import Error
 
 # Define version
-eccmqtt_iot_version = "02.30"
-eccmqtt_iot_date = "18-Dec-2020"
+eccmqtt_iot_version = "02.70"
+eccmqtt_iot_date = "18-Oct-2026"
 
 gzip_in_progress = False
 done_flag = False  # flag to indicate when GZIP in progress completes
@@ -129,6 +165,12 @@ parser.add_argument("-a", "--max_log_archives", default=9,
                     help="default maximum number of log archive files to keep")
 parser.add_argument("-z", "--archive_log_size", default=1073741824,
                     help="default maximum log size, in bytes, prior to archival")
+parser.add_argument("-p", "--partition_period", default="month", choices=["month", "year"],
+                    help="period of records held in each partition database")
+parser.add_argument("--backup_dir", default=None,
+                    help="back up the catalog and partition databases to this folder, then exit")
+parser.add_argument("--backup_compress", action="store_true",
+                    help="compress (gzip) the database backups")
 parser.add_argument("-v", "-ver", "--version", action="store_true",
                     help="display application version information")
 
@@ -282,8 +324,16 @@ logger.setLevel(logging.DEBUG)
 sys.stderr = StreamToLogger(logger, logging.ERROR)
 
 # Location of database file...change as appropriate based on implementation location
+#   Note:   This database holds the catalog of partition databases; the records themselves are
+#           written to a partition database alongside it, one per partition period.
 ECCMQTTIoT_database = args.database_file_path
 
+# Period of records held in each partition database
+ECCMQTTIoT_partition_period = args.partition_period
+
+# Folder to which the databases are backed up, if a backup is requested
+ECCMQTTIoT_backup_dir = args.backup_dir
+
 # Location of the default MQTT credentials if not otherwise provided
 ECCMQTTIoT_mqtt_credentials = args.credentials_file_path
 
@@ -318,10 +368,43 @@ field_names = [['recordWrittenUTC',  # field names for sensor readings
                 'MACaddress',
                 'softwareVersion']]
 
+# Last sensor ID data written to the ECCTempHumSensor table, keyed by sensor name.
+# The values are tuples in the same order as the table fields (less recordWrittenUTC).
+sensor_id_cache = {}
+
+# Schema registry:  cached table layouts and INSERT statements for each message signature,
+# keyed by (topic, tuple of payload field names)
+schema_registry = {}
+
+# Columns of the tables already checked / created in each partition database, keyed by
+# (partition database filename, table name)
+verified_tables = {}
+
+# Number of payload fields sent by the earlier sensor code, before the sensor ID data was added,
+# and by the current sensor code; any fields following these are added as new table columns
+payload_sensor_fields = 7
+payload_sensor_id_fields = 10
+
+# Name of the partition catalog table, and the partition database records are currently written to
+partition_catalog_table = 'ECCTempHumPartitions'
+current_partition = None
+
+# Number of database pages copied by each step of the online backup, and the pause between steps (seconds).
+# If other connections' writes restart the backup more than backup_max_restarts times, it is abandoned and
+# retried after backup_retry_delay_secs (doubling for each retry), up to backup_max_attempts in all.
+backup_pages_per_step = 1024
+backup_step_sleep_secs = 0.05
+backup_max_restarts = 3
+backup_max_attempts = 4
+backup_retry_delay_secs = 10
+
 
 def main():
-    # Global to define the database archival threshold
-    global max_db_file_size_bytes
+    # If a database backup is requested, make it and exit, without connecting to the broker
+    if ECCMQTTIoT_backup_dir:
+        backup_success = backup_databases(ECCMQTTIoT_backup_dir, args.backup_compress)
+        sys.exit(0 if backup_success else 1)
+
     # Counter for received messages
     global recvd_message_cnt
     # Counter for database records written
@@ -331,7 +414,6 @@ def main():
     received_msg = False
     global sensor_recvd_message_cnt
 
-    max_db_file_size_bytes = 1073741824  # Maximum database file size in bytes before archival; 1GB at 4K cluster size
     recvd_message_cnt = 0
     database_records_written = 0
 
@@ -346,15 +428,20 @@ def main():
 
     logger.info(F"Log filename:               {args.log_file_path}")
     logger.info(F"Database filename:          {args.database_file_path}")
+    logger.info(F"Partition period:           {args.partition_period}")
     logger.info(F"MQTT credentials filename:  {args.credentials_file_path}")
     logger.info(F"MQTT broker address:        {args.mqtt_broker}")
     logger.info(F"Connectivity timer:         {args.timer_check}")
     logger.info(F"GMail credentials filename: {args.gmail_credentials_file_path}")
     logger.info(F"Notice silence time:        {args.last_notice_silence_time}")
 
-    # Before connecting to the MQTT broker, check the existing database size (if it exists).  If
-    # the size exceeds the designated threshold, archive it so a new database will be created.
-    check_database_size()
+    # Before connecting to the MQTT broker, make sure the partition catalog exists, and add any
+    # databases from before partitioning (the main database, and renamed archives) to it.
+    open_partition_catalog()
+
+    # Load the last-written sensor ID data for each sensor, so that we don't need to query
+    # the database for each message to see if it has changed.
+    load_sensor_id_cache()
 
     # Get the MQTT credentials from the specified location...
     mqtt_user, mqtt_pass = get_credentials()
@@ -451,11 +538,6 @@ def on_message(mqttc, obj, msg):
     logger.debug(F"Topic: {msg.topic}  QoS: {str(msg.qos)},  {str(msg.payload)}")
     print(F"Topic: {msg.topic}  QoS: {str(msg.qos)},  {str(msg.payload)}")
 
-    # After every 1000 records, check the database size and if it exceeds the designated
-    # threshold, archive it.
-    if (recvd_message_cnt % 1000) == 0:
-        check_database_size()
-
     recvd_message_cnt += 1
 
     # Received message on subscribed channel...add it to the database.
@@ -583,8 +665,9 @@ def add_db_record(topic, mqtt_msg, msg_time):
     insert_record_status = False  # assume failure
     check_sensor_id_freq = 144
 
-    # Attempt to get a connection to the db.  If it doesn't exist, we create it.
-    conn = create_connection(ECCMQTTIoT_database)
+    # Attempt to get a connection to the partition db for the message time.  If it doesn't
+    # exist, we create it.
+    conn = open_partition(msg_time)
 
     # Check to ensure we have a valid db connection...if not, abort
     if conn is None:
@@ -602,53 +685,41 @@ def add_db_record(topic, mqtt_msg, msg_time):
     msg_fields = (mqtt_msg.decode("utf-8")).split('&')
 
     # We should have a list of all the fields in format of 'field=value'; break this to
-    # get the values in a separate list
+    # get the names and values in separate lists
+    field_keys = []
     field_values = []
     for msg in msg_fields:
         msg_value = msg.split('=')
+        field_keys.append(msg_value[0])
         field_values.append(msg_value[1])  # field value should be in second element in list
 
-    # Check to see if the message actually contains the sensor ID data;
-    # if not, only process the sensor temp/humidity table data.  This is
-    # necessary because earlier sensor code versions did not transmit this data.
-    if len(msg_fields) <= 7:
-        db_table = ['ECCTempHum']
-    else:
-        db_table = ['ECCTempHum',
-                    'ECCTempHumSensor']
-
-    create_table_sql_str = []
-    table_fields_dict = []
-    for table_idx, data_table in enumerate(db_table):
-        # Construct the SQL create-table statement...
-        sql_str, fields_dict = \
-            construct_create_table_sql(data_table,
-                                       field_names[table_idx])
-        create_table_sql_str.insert(table_idx, sql_str)
-        table_fields_dict.append(fields_dict)
-
-        # Have a valid db connection; see if the table exists
-        if check_if_table_exists(conn, data_table, ECCMQTTIoT_database):
-            logger.debug(F"Table {data_table} already exists...continuing processing...")
-        else:
-            print(F"Table {data_table} does not exist...creating...")
-            logger.info(F"Table {data_table} does not exist...creating...")
-            create_tbl_status = create_table_from_string(conn,
-                                                         data_table,
-                                                         create_table_sql_str[table_idx])
-            if not create_tbl_status:
-                logger.error(F"Error creating table {data_table}...aborting...")
-                print(F"Error creating table {data_table}...aborting...")
-                sys.exit(1)
+    # Look up the tables, columns and INSERT statements for this message layout.  (Whether the
+    # message contains the sensor ID data depends on the sensor code version.)
+    payload_schema = get_payload_schema(topic, field_keys)
+    if payload_schema is None:
+        conn.close()
+        return False
+
+    partition_file = partition_db_file(current_partition)
+    for table_idx, table_schema in enumerate(payload_schema):
+        data_table = table_schema['table']
+
+        # Have a valid db connection; make sure the table exists with the needed columns
+        if not ensure_table_schema(conn, partition_file, table_schema):
+            logger.error(F"Error creating table {data_table}...aborting...")
+            print(F"Error creating table {data_table}...aborting...")
+            sys.exit(1)
+
+        insert_data = [field_values[field_idx] for field_idx in table_schema['field_idx']]
 
         if table_idx == 0:
-            insert_data = field_values[:7]
-            # First 7 fields are sensor data
+            # First 7 fields are sensor data (plus any new fields)
             insert_record_status = create_database_record(conn,
                                                           data_table,
-                                                          table_fields_dict[table_idx],
+                                                          table_schema['columns'],
                                                           insert_data,
-                                                          msg_time)
+                                                          msg_time,
+                                                          table_schema['insert_sql'])
         else:
             # Since the sensor ID data shouldn't change very frequently,
             # check it only once per day or so.  We do this by checking the
@@ -657,9 +728,8 @@ def add_db_record(topic, mqtt_msg, msg_time):
             # messages per day.  (The data list 'insert_data[0]' should contain
             # the sensor name.)
 
-            # Last 4 fields of the message are sensor ID, MAC, location, software
+            # Fields 7-10 of the message are sensor ID, MAC, location, software
             # version
-            insert_data = field_values[6:]
 
             # Maintain a list of counters by sensor name; if we haven't created
             # the counter yet, then do so and initialize to 0; else, increment it
@@ -688,9 +758,12 @@ def add_db_record(topic, mqtt_msg, msg_time):
             if sensor_change:
                 insert_record_status = create_database_record(conn,
                                                               data_table,
-                                                              table_fields_dict[table_idx],
+                                                              table_schema['columns'],
                                                               insert_data,
-                                                              msg_time)
+                                                              msg_time,
+                                                              table_schema['insert_sql'])
+                if insert_record_status:
+                    sensor_id_cache[insert_data[0]] = tuple(insert_data)
                 logger.info(f"Record written to table {data_table}...")
             else:
                 logger.info(f"Sensor ID data hasn't changed, so not saved "
@@ -813,7 +886,7 @@ def create_table_from_string(conn, db_table, create_table_sql_str):
         sql_create_mqttiot_sec_index1 = "CREATE INDEX " + \
                                         db_table + "_sensor_idx ON " + \
                                         db_table + "(sensorName);"
-        table_exists = check_if_table_exists(conn, db_table, ECCMQTTIoT_database)
+        table_exists = check_if_table_exists(conn, db_table, partition_db_file(current_partition))
         if not table_exists:
             table_success = create_table(conn, create_table_sql_str)
             if not table_success:
@@ -925,7 +998,7 @@ def construct_insert_table_sql(db_table, db_fields):
     # logger.debug(F"Length of passed field list:  {len(db_fields)}")
     for field in db_fields:
         field_cnt += 1
-        db_insert_sql_str += field
+        db_insert_sql_str += F'"{field}"'  # quoted, in case a new payload field is an SQL keyword
         # logger.debug(F"...field count:  {field_cnt}, field:  {field}")
         if field_cnt != len(db_fields):  # don't add the comma for the last field
             db_insert_sql_str += ', '
@@ -945,7 +1018,155 @@ def construct_insert_table_sql(db_table, db_fields):
     return db_insert_sql_str
 
 
-def create_database_record(conn, db_table, values_dict, field_values, msg_time):
+def get_payload_schema(topic, field_keys):
+    """
+    Return the table schemas used to record a message with the passed topic and payload
+    field names, from the schema registry.  The first time a message layout is seen, the
+    schemas are built and validated, then cached; each is a dictionary containing:
+        table:          table name
+        columns:        dictionary of column name: datatype, in INSERT order
+        field_idx:      list of the payload field indices for the columns (less recordWrittenUTC)
+        create_sql:     SQL statement to create the table
+        insert_sql:     SQL statement to INSERT a record
+        new_fields:     dictionary of column name: payload field index, for columns added for
+                        payload fields beyond the ones we know about
+
+    :param topic:           MQTT topic to which the message was published
+    :param field_keys:      list of field names in the message payload, e.g. ['field1', ...]
+    :return:                list of table schemas, or None if the payload is not valid
+    """
+
+    signature = (topic, tuple(field_keys))
+    if signature in schema_registry:
+        return schema_registry[signature]
+
+    logger.info(F"New message layout for topic {topic}:  {len(field_keys)} fields, {field_keys}")
+
+    payload_schema = None
+    if len(field_keys) < payload_sensor_fields:
+        logger.error(F"Message for topic {topic} contains only {len(field_keys)} fields; "
+                     F"at least {payload_sensor_fields} are expected...not recorded")
+        print(F"Message for topic {topic} contains only {len(field_keys)} fields; "
+              F"at least {payload_sensor_fields} are expected...not recorded")
+    elif len(set(field_keys)) != len(field_keys):
+        logger.error(F"Message for topic {topic} contains duplicate field names...not recorded")
+        print(F"Message for topic {topic} contains duplicate field names...not recorded")
+    else:
+        # Sensor readings; the sensor name (field 7) is in both tables
+        db_tables = [('ECCTempHum', field_names[0], list(range(payload_sensor_fields)))]
+
+        # Check to see if the message actually contains the sensor ID data;
+        # if not, only process the sensor temp/humidity table data.  This is
+        # necessary because earlier sensor code versions did not transmit this data.
+        if len(field_keys) >= payload_sensor_id_fields:
+            db_tables.append(('ECCTempHumSensor', field_names[1],
+                              list(range(payload_sensor_fields - 1, payload_sensor_id_fields))))
+            new_field_start = payload_sensor_id_fields
+        else:
+            new_field_start = payload_sensor_fields
+
+        payload_schema = []
+        for data_table, table_field_names, field_idx in db_tables:
+            create_sql, columns = construct_create_table_sql(data_table, table_field_names)
+            payload_schema.append({'table': data_table,
+                                   'columns': columns,
+                                   'field_idx': field_idx,
+                                   'create_sql': create_sql,
+                                   'new_fields': {}})
+
+        # Any fields following the ones we know about are recorded with the sensor readings,
+        # in columns named for the payload field.  SQLite column names are case-insensitive,
+        # so a field that differs from an existing column (or a known payload field) only in
+        # case can't be used.
+        column_names = set(column.lower() for column in payload_schema[0]['columns'])
+        column_names.update(key.lower() for key in field_keys[:new_field_start])
+        for field_idx in range(new_field_start, len(field_keys)):
+            column = field_keys[field_idx]
+            if not column.isidentifier() or column.lower() in column_names:
+                logger.warning(F"Payload field '{column}' can't be used as a column name...ignored")
+                continue
+            column_names.add(column.lower())
+            payload_schema[0]['columns'][column] = 'TEXT'
+            payload_schema[0]['field_idx'].append(field_idx)
+            payload_schema[0]['new_fields'][column] = field_idx
+
+        for table_schema in payload_schema:
+            table_schema['insert_sql'] = construct_insert_table_sql(table_schema['table'],
+                                                                    table_schema['columns'].keys())
+
+    schema_registry[signature] = payload_schema
+
+    return payload_schema
+
+
+def ensure_table_schema(conn, db_file, table_schema):
+    """
+    Make sure the table for the passed schema exists in the database, with all of its columns.
+    The table is created if it doesn't exist; any columns missing from an existing table (e.g.,
+    a new field reported by a sensor) are added with ALTER TABLE ADD COLUMN.  Each table is
+    only checked once per database file; after that, only the cached columns are compared.
+    Column names are compared case-insensitively, as SQLite does.  If a column for a new
+    payload field can't be added, that field is dropped from the schema (i.e., it is no
+    longer recorded) rather than failing the message.
+
+    :param conn:            the database connection object
+    :param db_file:         filename of the database (partition) connected to
+    :param table_schema:    table schema, from get_payload_schema
+    :return:                True if successful, else False
+    """
+
+    data_table = table_schema['table']
+    table_key = (db_file, data_table)
+
+    table_columns = verified_tables.get(table_key)
+    if table_columns is not None and \
+            table_columns.issuperset(column.lower() for column in table_schema['columns']):
+        return True
+
+    if table_columns is None:
+        table_columns = set(row[1].lower()
+                            for row in conn.execute(F"PRAGMA table_info({data_table})"))
+
+        if not table_columns:
+            print(F"Table {data_table} does not exist...creating...")
+            logger.info(F"Table {data_table} does not exist...creating...")
+            if not create_table_from_string(conn, data_table, table_schema['create_sql']):
+                return False
+            table_columns = set(row[1].lower()
+                                for row in conn.execute(F"PRAGMA table_info({data_table})"))
+
+    for column, datatype in list(table_schema['columns'].items()):
+        if column.lower() in table_columns:
+            continue
+        logger.info(F"Adding new column {column} to table {data_table}...")
+        print(F"Adding new column {column} to table {data_table}...")
+        try:
+            conn.execute(F'ALTER TABLE {data_table} ADD COLUMN "{column}" {datatype}')
+            conn.commit()
+        except sqlite3.Error as e:
+            if column not in table_schema['new_fields']:
+                logger.error(F"Error adding column {column} to table {data_table}, {e}")
+                print(F"Error adding column {column} to table {data_table}, {e}")
+                return False
+
+            # Stop recording the new payload field, but keep recording the rest of the message
+            logger.warning(F"Error adding column {column} to table {data_table}, {e}; "
+                           F"payload field '{column}' will be ignored")
+            print(F"Error adding column {column} to table {data_table}, {e}; "
+                  F"payload field '{column}' will be ignored")
+            del table_schema['columns'][column]
+            table_schema['field_idx'].remove(table_schema['new_fields'].pop(column))
+            table_schema['insert_sql'] = construct_insert_table_sql(data_table,
+                                                                    table_schema['columns'].keys())
+            continue
+        table_columns.add(column.lower())
+
+    verified_tables[table_key] = table_columns
+
+    return True
+
+
+def create_database_record(conn, db_table, values_dict, field_values, msg_time, sql_insert=None):
     """
         This routine will attempt to write a record to the passed table with the passed
         list of record names / values.  If successful, the routine will return True, else False.
@@ -955,13 +1176,15 @@ def create_database_record(conn, db_table, values_dict, field_values, msg_time):
     :param values_dict:     dictionary of field names: datatypes for the record
     :param field_values:    list of field values for the record
     :param msg_time:        datetime when MQTT message received, in UTC
+    :param sql_insert:      INSERT statement for the record, if already constructed
     :return:                True if table created successfully; otherwise, False
     """
 
     global database_records_written
 
     # First create a SQL string for INSERTing the record into the passed table
-    sql_insert = construct_insert_table_sql(db_table, values_dict.keys())
+    if sql_insert is None:
+        sql_insert = construct_insert_table_sql(db_table, values_dict.keys())
 
     # Get the current date/time in UTC for the record INSERT
     recordWrittenUTC = msg_time
@@ -1029,6 +1252,38 @@ def create_database_record(conn, db_table, values_dict, field_values, msg_time):
     return True
 
 
+def load_sensor_id_cache():
+    """
+    Load the most-recently-written sensor ID data for every sensor into the in-memory
+    cache, using a single query.  (The primary key on sensorName, recordWrittenUTC
+    makes this an index lookup per sensor rather than a scan of the table.)
+
+    :return:                none
+    """
+
+    sensor_id_cache.clear()
+
+    conn = open_partition(datetime.utcnow())
+    if conn is None:
+        return
+
+    last_written_sql = "SELECT s.sensorName, s.location, s.MACaddress, s.softwareVersion " \
+                       "FROM ECCTempHumSensor s " \
+                       "JOIN (SELECT sensorName, MAX(recordWrittenUTC) AS lastWritten " \
+                       "      FROM ECCTempHumSensor GROUP BY sensorName) m " \
+                       "ON s.sensorName = m.sensorName AND s.recordWrittenUTC = m.lastWritten"
+    try:
+        for row in conn.execute(last_written_sql):
+            sensor_id_cache[row[0]] = tuple(row)
+    except sqlite3.Error as e:
+        # This will happen if the table doesn't exist yet (i.e., a new database)
+        logger.info(F"Unable to load last sensor ID data from database: {e}")
+
+    conn.close()
+
+    logger.info(F"Loaded last sensor ID data for {len(sensor_id_cache)} sensors")
+
+
 def check_for_sensor_changes(conn, db_table, compare_values):
     """
     Query the last sensor data written for this sensor and compare the
@@ -1036,27 +1291,33 @@ def check_for_sensor_changes(conn, db_table, compare_values):
     else, return false.
             Written by DK Fowler ... 19-Dec-2020
 
+    Modified to compare against the in-memory cache of last-written sensor ID
+    data; the database is only queried for sensors that aren't in the cache.
+
     :param conn:            the database connection object
     :param db_table:        the SQLite3 database table to be queried
     :param compare_values:  list of values to compare against last record in db
     :return:                True, if change detected; else, False
     """
 
-    cur = conn.cursor()
-
     # Order of values for the sensor data passed to the routine should be:
     #   ID, MAC, location, software version
+    if compare_values[0] in sensor_id_cache:
+        return tuple(compare_values) != sensor_id_cache[compare_values[0]]
+
+    cur = conn.cursor()
+
     # Build SQL query string
     #   Note:   The Python SQLite API does not support parameterizing the table name, so we need to build
     #           the SQL SELECT statement with the passed table name.
     last_written_sql = "SELECT * FROM " + \
                        db_table + \
-                       f" WHERE sensorName = '{compare_values[0]}' " \
-                       f"ORDER BY recordWrittenUTC DESC LIMIT 1"
+                       " WHERE sensorName = ? " \
+                       "ORDER BY recordWrittenUTC DESC LIMIT 1"
     logger.debug(F"SQL for last record written to database table {db_table}:  ")
     logger.debug(F"{last_written_sql}")
     try:
-        cur.execute(last_written_sql)
+        cur.execute(last_written_sql, (compare_values[0],))
     except sqlite3.Error as e:
         logger.debug(F"Error occurred while attempting to retrieve last sensor ID data from table {db_table}...")
         logger.debug(F"...error occurred was: {e}")
@@ -1075,14 +1336,8 @@ def check_for_sensor_changes(conn, db_table, compare_values):
             cur.close()
             sys.exit(1)
 
-    rows = cur.fetchall()
-
-    row_cnt = 0
-    for row in rows:
-        row_cnt = row_cnt + 1
-        logger.debug(F"Last sensor data for table {db_table}: {row[0]}")
-        logger.debug(row)
-        compare_fields = row  # save the data for further comparison
+    row = cur.fetchone()
+    cur.close()
 
     """
         If no rows are returned for this sensor, then there were previously no entries written in
@@ -1090,21 +1345,18 @@ def check_for_sensor_changes(conn, db_table, compare_values):
         ID data for this sensor.  Return True to indicate that "changes" were found, meaning this
         is a new record that needs to be recorded.
     """
-    if row_cnt == 0:
+    if row is None:
         logger.debug(F"No records found for table {db_table} while retrieving last sensor ID data")
-        cur.close()
         return True
 
-    # Found a record with same sensor name; now compare the key values
-    change_detected = False
-    for field_idx, field in enumerate(compare_values):
-        # skip the first column in the db record (dateWrittenUTC)
-        if field != compare_fields[field_idx + 1]:
-            change_detected = True
-            break
+    logger.debug(F"Last sensor data for table {db_table}: {row[0]}")
+    logger.debug(row)
 
-    cur.close()
-    return change_detected
+    # Found a record with same sensor name; remember it (skipping the first column in the
+    # db record, recordWrittenUTC), then compare the key values
+    sensor_id_cache[compare_values[0]] = tuple(row[1:])
+
+    return tuple(compare_values) != sensor_id_cache[compare_values[0]]
 
 
 def get_credentials():
@@ -1179,73 +1431,543 @@ def get_email_credentials():
         sys.exit(1)
 
 
-def check_database_size():
+def partition_bounds(msg_time):
+    """
+    Return the partition name and period (start, end) for the passed UTC date/time,
+    based on the partition period specified.  The end of the period is the start of
+    the next one.
+
+    :param msg_time:        datetime of the record, in UTC
+    :return:                tuple of partition name, period start datetime, period end datetime
+    """
+
+    if ECCMQTTIoT_partition_period == 'year':
+        period_start = datetime(msg_time.year, 1, 1)
+        period_end = datetime(msg_time.year + 1, 1, 1)
+        partition_name = period_start.strftime('%Y')
+    else:
+        period_start = datetime(msg_time.year, msg_time.month, 1)
+        if msg_time.month == 12:
+            period_end = datetime(msg_time.year + 1, 1, 1)
+        else:
+            period_end = datetime(msg_time.year, msg_time.month + 1, 1)
+        partition_name = period_start.strftime('%Y%m')
+
+    return partition_name, period_start, period_end
+
+
+def partition_db_file(partition_name):
+    """
+    Return the filename path of the partition database with the passed name.  Partition
+    databases are kept alongside the main (catalog) database, in the form
+    {db filename}-{partition name}.{db extension}.
+
+    :param partition_name:  name of the partition, e.g., "202012"
+    :return:                filename path of the partition database
+    """
+
+    db_filename, db_ext = os.path.splitext(ECCMQTTIoT_database)
+
+    return db_filename + "-" + partition_name + db_ext
+
+
+def register_partition(partition_name, partition_file, period_start, period_end):
+    """
+    Add a partition database to the catalog, if it isn't already there.  The file name is
+    kept relative to the catalog database, so that the set of databases can be moved.
+
+    :param partition_name:  name of the partition
+    :param partition_file:  filename path of the partition database
+    :param period_start:    first date/time of records in the partition, in UTC (string)
+    :param period_end:      end of the period of records in the partition, in UTC (string)
+    :return:                True if successful, else False
+    """
+
+    conn = create_connection(ECCMQTTIoT_database)
+    if conn is None:
+        return False
+
+    try:
+        conn.execute(F"INSERT INTO {partition_catalog_table} "
+                     F"(partitionName, fileName, periodStartUTC, periodEndUTC, createdUTC) "
+                     F"VALUES (?,?,?,?,?) "
+                     F"ON CONFLICT(partitionName) DO NOTHING",
+                     (partition_name,
+                      os.path.relpath(partition_file, os.path.dirname(os.path.abspath(ECCMQTTIoT_database))),
+                      period_start,
+                      period_end,
+                      datetime.strftime(datetime.utcnow(), "%Y-%m-%d %H:%M:%S.%f")))
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(F"Error attempting to add partition {partition_name} to the catalog: {e}")
+        print(F"Error attempting to add partition {partition_name} to the catalog: {e}")
+        conn.close()
+        return False
+
+    conn.close()
+    return True
+
+
+def find_record_range(db_file):
+    """
+    Return the first and last recordWrittenUTC of the sensor data in the passed database, for
+    databases written before partitioning.
+
+    :param db_file:         filename path of the database
+    :return:                tuple of first, last recordWrittenUTC (strings), or None if no records
+    """
+
+    conn = create_connection(db_file)
+    if conn is None:
+        return None
+
+    try:
+        row = conn.execute("SELECT MIN(recordWrittenUTC), MAX(recordWrittenUTC) FROM ECCTempHum").fetchone()
+    except sqlite3.Error:
+        # No sensor data table in this database
+        row = None
+    conn.close()
+
+    if row is None or row[0] is None:
+        return None
+
+    return row
+
+
+def open_partition_catalog():
+    """
+    Create the partition catalog table in the main database if it doesn't exist, then add any
+    databases written before partitioning to it:  the main database itself (if it contains
+    sensor data), and archives renamed by the old size-based rotation, in the form
+    {db filename}-{create-date/time}-{mod-date/time}.{db extension}.  The old rotation left
+    these in the current folder, so any found there are first moved to the database folder.
+    These are cataloged with the range of records they actually contain, which may overlap.
+
+    :return:                none
+    """
+
+    conn = create_connection(ECCMQTTIoT_database)
+
+    # Check to ensure we have a valid db connection...if not, abort
+    if conn is None:
+        logger.error("No connection established to database...aborting.")
+        print(F"No connection established to database...aborting.")
+        sys.exit(1)
+
+    try:
+        conn.execute(F"CREATE TABLE IF NOT EXISTS {partition_catalog_table} ( "
+                     F"partitionName TEXT PRIMARY KEY, "
+                     F"fileName TEXT NOT NULL, "
+                     F"periodStartUTC TEXT NOT NULL, "
+                     F"periodEndUTC TEXT NOT NULL, "
+                     F"createdUTC TEXT )")
+        conn.execute(F"CREATE INDEX IF NOT EXISTS {partition_catalog_table}_period_idx "
+                     F"ON {partition_catalog_table} (periodStartUTC, periodEndUTC)")
+        conn.commit()
+        cataloged_files = [row[0] for row in conn.execute(F"SELECT fileName FROM {partition_catalog_table}")]
+    except sqlite3.Error as e:
+        logger.error(F"Error attempting to create the partition catalog: {e}...aborting...")
+        print(F"Error attempting to create the partition catalog: {e}...aborting...")
+        conn.close()
+        sys.exit(1)
+    conn.close()
+
+    db_dir = os.path.dirname(os.path.abspath(ECCMQTTIoT_database))
+    db_filename, db_ext = os.path.splitext(ECCMQTTIoT_database)
+    legacy_pattern = "-" + "[0-9]" * 12 + "-" + "[0-9]" * 12 + db_ext
+
+    # The old rotation renamed archives to a bare file name, i.e., into the current folder rather
+    # than the database folder; move any found there alongside the main database (where the
+    # partition databases are), so that they are cataloged relative to it and kept with it
+    for archive_file in glob.glob(os.path.basename(db_filename) + legacy_pattern):
+        db_dir_file = os.path.join(db_dir, os.path.basename(archive_file))
+        if os.path.abspath(archive_file) == db_dir_file:
+            continue
+        if os.path.exists(db_dir_file):
+            logger.warning(F"Archived database {archive_file} is also in {db_dir}...not moved")
+            print(F"Archived database {archive_file} is also in {db_dir}...not moved")
+            continue
+        try:
+            shutil.move(archive_file, db_dir_file)
+            logger.info(F"Moved archived database {archive_file} to {db_dir_file}")
+            print(F"Moved archived database {archive_file} to {db_dir_file}")
+        except OSError as e:
+            logger.error(F"Error attempting to move archived database {archive_file} to {db_dir}: {e}")
+            print(F"Error attempting to move archived database {archive_file} to {db_dir}: {e}")
+
+    legacy_files = [ECCMQTTIoT_database] + sorted(glob.glob(db_filename + legacy_pattern))
+
+    for legacy_file in legacy_files:
+        if os.path.relpath(legacy_file, db_dir) in cataloged_files:
+            continue
+
+        record_range = find_record_range(legacy_file)
+        if record_range is None:
+            continue
+
+        partition_name = os.path.splitext(os.path.basename(legacy_file))[0]
+        logger.info(F"Adding database {legacy_file} to the partition catalog, "
+                    F"records {record_range[0]} to {record_range[1]}")
+        print(F"Adding database {legacy_file} to the partition catalog, "
+              F"records {record_range[0]} to {record_range[1]}")
+        register_partition(partition_name, legacy_file, record_range[0], record_range[1])
+
+
+def open_partition(msg_time):
+    """
+    Return a connection to the partition database for the passed UTC date/time, adding the
+    partition to the catalog when we first start writing to it.  (The catalog is only
+    touched when the partition changes, not for every message.)
+
+    :param msg_time:        datetime of the record, in UTC
+    :return:                connection object or None
+    """
+
+    global current_partition
+
+    partition_name, period_start, period_end = partition_bounds(msg_time)
+    partition_file = partition_db_file(partition_name)
+
+    if partition_name != current_partition:
+        logger.info(F"Writing records to partition database:  {partition_file}")
+        print(F"Writing records to partition database:  {partition_file}")
+        register_partition(partition_name,
+                           partition_file,
+                           datetime.strftime(period_start, "%Y-%m-%d %H:%M:%S.%f"),
+                           datetime.strftime(period_end, "%Y-%m-%d %H:%M:%S.%f"))
+
+        # The new partition won't have any sensor ID data, so forget what was last written
+        if current_partition is not None:
+            sensor_id_cache.clear()
+
+        current_partition = partition_name
+
+    return create_connection(partition_file)
+
+
+def query_partitions(start_utc, end_utc, db_table='ECCTempHum', sensor_name=None):
     """
-    This routine will check the existing database size and compare it against the designated
-    threshold size.  If it exceeds it, a routine to archive the exiting database will be called.
-            Written by DK Fowler ... 13-Jun-2020
+    Return (as a generator) the records from the passed table written during the passed time
+    range, across all partition databases.  Only the partitions in the catalog that overlap
+    the time range are ATTACHed; if there are more of these than SQLite allows to be attached
+    at once, they are queried in groups, each on its own connection.  Records are returned in
+    order of recordWrittenUTC (then sensorName):  each group's query is ordered, and the groups'
+    results are merged, since the ranges of databases from before partitioning can overlap.
+
+    :param start_utc:       start of the time range, in UTC (datetime, inclusive)
+    :param end_utc:         end of the time range, in UTC (datetime, exclusive)
+    :param db_table:        the SQLite3 database table to be queried
+    :param sensor_name:     if specified, only return records for this sensor
+    :return:                generator of record tuples
     """
 
-    global max_db_file_size_bytes
+    start_str = datetime.strftime(start_utc, "%Y-%m-%d %H:%M:%S.%f")
+    end_str = datetime.strftime(end_utc, "%Y-%m-%d %H:%M:%S.%f")
+    db_dir = os.path.dirname(os.path.abspath(ECCMQTTIoT_database))
 
-    # Check if the database file currently exists; if not, simply return without further
-    # checking, as the database will be created at first connection if it doesn't exist
-    #       Added by DK Fowler ... 09-Aug-2020
-    db_exists = os.path.exists(ECCMQTTIoT_database)
-    if not db_exists:
+    conn = create_connection(ECCMQTTIoT_database)
+    if conn is None:
         return
 
-    db_size_bytes = os.path.getsize(ECCMQTTIoT_database)
+    group_conns = [conn]
+
+    def ordered_records(cursor):
+        # Pair each record with its sort key, for merging the groups' results
+        columns = [column[0] for column in cursor.description]
+        time_idx = columns.index('recordWrittenUTC')
+        name_idx = columns.index('sensorName')
+        for record in cursor:
+            yield (record[time_idx], record[name_idx]), record
+
+    try:
+        partitions = conn.execute(F"SELECT partitionName, fileName FROM {partition_catalog_table} "
+                                  F"WHERE periodStartUTC <= ? AND periodEndUTC >= ? "
+                                  F"ORDER BY periodStartUTC",
+                                  (end_str, start_str)).fetchall()
+
+        # Don't ATTACH a file that has gone missing, as that would create an empty one
+        partition_files = []
+        for partition_name, file_name in partitions:
+            partition_file = os.path.join(db_dir, file_name)
+            if os.path.exists(partition_file):
+                partition_files.append(partition_file)
+            else:
+                logger.warning(F"Partition database {partition_file} ({partition_name}) not found...skipping")
+
+        try:
+            max_attached = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        except AttributeError:      # Python versions prior to 3.11
+            max_attached = 10
+
+        group_results = []
+        for group_idx in range(0, len(partition_files), max_attached):
+            if group_idx > 0:
+                group_conn = create_connection(ECCMQTTIoT_database)
+                if group_conn is None:
+                    return
+                group_conns.append(group_conn)
+            group_conn = group_conns[-1]
+
+            schemas = []
+            for schema_idx, partition_file in enumerate(partition_files[group_idx:group_idx + max_attached]):
+                schema = F"p{schema_idx}"
+                group_conn.execute(F"ATTACH DATABASE ? AS {schema}", (partition_file,))
+                # Not every partition will contain every table (e.g., sensor ID data)
+                if group_conn.execute(F"SELECT 1 FROM {schema}.sqlite_master WHERE type='table' AND name=?",
+                                      (db_table,)).fetchone():
+                    schemas.append(schema)
+
+            select_sql = []
+            select_params = []
+            for schema in schemas:
+                sql = F"SELECT * FROM {schema}.{db_table} WHERE recordWrittenUTC >= ? AND recordWrittenUTC < ?"
+                select_params += [start_str, end_str]
+                if sensor_name is not None:
+                    sql += " AND sensorName = ?"
+                    select_params.append(sensor_name)
+                select_sql.append(sql)
+
+            if select_sql:
+                query_sql = " UNION ALL ".join(select_sql) + " ORDER BY recordWrittenUTC, sensorName"
+                logger.debug(F"Partition query: {query_sql}")
+                group_results.append(ordered_records(group_conn.execute(query_sql, select_params)))
+
+        for _, record in heapq.merge(*group_results, key=lambda keyed_record: keyed_record[0]):
+            yield record
+
+    except sqlite3.Error as e:
+        logger.error(F"Error occurred while querying partition databases: {e}")
+        print(F"Error occurred while querying partition databases: {e}")
+
+    finally:
+        for group_conn in group_conns:
+            group_conn.close()
+
+
+def get_db_change_signature(db_file):
+    """
+    Return values identifying the current state of the passed database, for determining if it
+    has changed since the last backup:  the file change counter and database size (in pages)
+    from the SQLite database header, which are updated with each transaction written, and the
+    file size / modification time (along with those of any write-ahead log).
 
-    if db_size_bytes >= max_db_file_size_bytes:
-        logger.info(F"Database size of {db_size_bytes} exceeds maximum ({max_db_file_size_bytes}), "
-                    F"archiving file...")
-        print(F"Database size of {db_size_bytes} exceeds maximum ({max_db_file_size_bytes}), "
-              F"archiving file...")
-        archive_db()
+    Kept identical to get_db_change_signature in "ECC Pycobee Data.py" (ECC-Ecobee); each
+    application is installed as a single script, so change both copies together.
+
+    :param db_file:         filename path of the database
+    :return:                dictionary of the values identifying the database state
+    """
+
+    with open(db_file, 'rb') as db:
+        db_header = db.read(100)
+    db_signature = {'change_counter': int.from_bytes(db_header[24:28], 'big'),
+                    'page_count': int.from_bytes(db_header[28:32], 'big'),
+                    'file_size': os.path.getsize(db_file),
+                    'file_mtime_ns': os.stat(db_file).st_mtime_ns}
+    if os.path.isfile(db_file + "-wal"):
+        db_signature['wal_size'] = os.path.getsize(db_file + "-wal")
+        db_signature['wal_mtime_ns'] = os.stat(db_file + "-wal").st_mtime_ns
+
+    return db_signature
 
 
-def archive_db():
+def backup_db(db_file, backup_dir, compress=False):
     """
-        This routine will "archive" the existing database file by renaming it, such that the next
-        program iteration will re-create a new one.  The archival file name will be in the form:
-        {db filename}-{create-date/time}-{mod-date/time}.{db extension}, where
-        create-date/time is the database creation date/time in the form "YYYYMMDDHHMM", and
-        mod-date/time is the database last-modified date/time in the form "YYYYMMDDHHMM".
-                Written by DK Fowler ... 24-Feb-2020
+    Back up the passed database to the passed folder, using the SQLite online backup API.  The
+    backup copies backup_pages_per_step pages at a time, releasing the database between steps,
+    so that the listener isn't held off from writing; if the listener writes to the database
+    during the backup, SQLite restarts it, so the copy is always consistent.  If the backup is
+    restarted more than backup_max_restarts times, it is abandoned and tried again after a
+    delay, up to backup_max_attempts times; the listener is never held off for a single-step
+    copy, so if it writes throughout, the database isn't backed up and False is returned.  The
+    copy is written to a temporary file, then (optionally) compressed, and then replaces the
+    previous backup, {backup folder}/{db filename}{db extension}[.gz].
+
+    The state of the database when backed up is saved alongside the backup, in
+    {db filename}{db extension}.backup.json; if the database hasn't changed since the last
+    backup, the backup is skipped.
+
+    Kept identical to backup_db in "ECC Pycobee Data.py" (ECC-Ecobee); each application is
+    installed as a single script, so change both copies together.
+
+    :param db_file:         filename path of the database
+    :param backup_dir:      folder to which the backup is written
+    :param compress:        True to compress the backup (gzip)
+    :return:                True if the backup was made or skipped as unchanged, else False
     """
 
-    logger.info(F"Beginning database archival...")
-    print(F"Beginning database archival...")
-
-    # Get the creation / last modified date/time of the existing file for use in constructing the archival file name...
-    db_modified_time = os.path.getmtime(ECCMQTTIoT_database)
-    db_create_time = os.path.getctime(ECCMQTTIoT_database)
-    # Convert timestamps to strings in proper form
-    db_create_string = datetime.fromtimestamp(db_create_time).strftime('%Y%m%d%H%M')
-    db_modified_string = datetime.fromtimestamp(db_modified_time).strftime('%Y%m%d%H%M')
-    # Get the filename/ext string of the existing database
-    db_basename = os.path.basename(ECCMQTTIoT_database)
-    # Split the filename into name/extension components
-    fn = os.path.splitext(db_basename)
-    db_filename = fn[0]
-    db_ext = fn[1]
-    # Construct the new archival filename
-    archival_db_name = db_filename + "-" + db_create_string + "-" + db_modified_string + db_ext
-    print(F"Archival database name:  {archival_db_name}.")
-
-    # Attempt to rename the existing database
+    logger.info(F"Beginning backup of database {db_file} to {backup_dir}...")
+    print(F"Beginning backup of database {db_file} to {backup_dir}...")
+
+    if not os.path.isfile(db_file):
+        logger.error(F"Database {db_file} not found...backup not made")
+        print(F"Database {db_file} not found...backup not made")
+        return False
+
+    db_basename = os.path.basename(db_file)
+    backup_file = os.path.join(backup_dir, db_basename + (".gz" if compress else ""))
+    backup_state_file = os.path.join(backup_dir, db_basename + ".backup.json")
+
     try:
-        os.rename(ECCMQTTIoT_database, archival_db_name)
-        logger.info(F"Renamed database to: {archival_db_name}.")
-        print(F"Renamed database to:  {archival_db_name}.")
-    except Error as e:
-        logger.error(F"Error attempting to archive (rename) database file: {e}...")
-        logger.error(F"...original database name:  {ECCMQTTIoT_database}")
-        logger.error(F"...archival database name:  {archival_db_name}")
-        print(F"Error attempting to archive (rename) database file: {e}...")
-        print(F"...original database name:  {ECCMQTTIoT_database}")
-        print(F"...archival database name:  {archival_db_name}")
+        os.makedirs(backup_dir, exist_ok=True)
+        # Get the state of the database before starting; if it changes during the backup, the next
+        # backup will see the change
+        db_signature = get_db_change_signature(db_file)
+        last_backup_state = {}
+        if os.path.isfile(backup_state_file):
+            with open(backup_state_file, 'r') as state_file:
+                last_backup_state = json.load(state_file)
+    except (OSError, ValueError) as e:
+        logger.error(F"Error checking database {db_file} for backup: {e}")
+        print(F"Error checking database {db_file} for backup: {e}")
+        return False
+
+    if last_backup_state.get('db_signature') == db_signature and \
+            last_backup_state.get('backup_file') == backup_file and os.path.isfile(backup_file):
+        logger.info(F"Database {db_file} unchanged since the last backup, {last_backup_state.get('backup_UTC')} UTC "
+                    F"(change counter {db_signature['change_counter']})...backup skipped")
+        print(F"Database {db_file} unchanged since the last backup, {last_backup_state.get('backup_UTC')} UTC "
+              F"(change counter {db_signature['change_counter']})...backup skipped")
+        return True
+
+    backup_start = time.time()
+    backup_tmp_file = os.path.join(backup_dir, db_basename + ".backup-tmp")
+    backup_copied_pages = 0
+    backup_restarts = 0
+
+    class BackupRestartLimit(Exception):
+        pass
+
+    def backup_progress(status, remaining, total):
+        nonlocal backup_copied_pages, backup_restarts
+        # A write to the database by another connection restarts the backup from the first page
+        if total - remaining <= backup_copied_pages:
+            backup_restarts += 1
+            logger.debug(F"...backup of {db_file} restarted by a database write ({backup_restarts})")
+            if backup_restarts > backup_max_restarts:
+                raise BackupRestartLimit
+        backup_copied_pages = total - remaining
+
+    try:
+        backup_pages = None
+        for backup_attempt in range(1, backup_max_attempts + 1):
+            if backup_attempt > 1:
+                retry_delay = backup_retry_delay_secs * 2 ** (backup_attempt - 2)
+                logger.info(F"...retrying backup of {db_file} in {retry_delay} seconds "
+                            F"(attempt {backup_attempt} of {backup_max_attempts})")
+                print(F"...retrying backup of {db_file} in {retry_delay} seconds "
+                      F"(attempt {backup_attempt} of {backup_max_attempts})")
+                time.sleep(retry_delay)
+            backup_copied_pages = 0
+            backup_restarts = 0
+
+            src_conn = sqlite3.connect(db_file)
+            dst_conn = sqlite3.connect(backup_tmp_file)
+            try:
+                src_conn.backup(dst_conn, pages=backup_pages_per_step, progress=backup_progress,
+                                sleep=backup_step_sleep_secs)
+                backup_pages = dst_conn.execute("PRAGMA page_count").fetchone()[0]
+                break
+            except BackupRestartLimit:
+                logger.warning(F"Backup of {db_file} restarted {backup_restarts} times by database writes")
+                print(F"Backup of {db_file} restarted {backup_restarts} times by database writes")
+            finally:
+                dst_conn.close()
+                src_conn.close()
+
+        # Don't hold off the writers with a single-step copy; give up until the next scheduled backup
+        if backup_pages is None:
+            raise BackupRestartLimit(F"database was being written during each of {backup_max_attempts} attempts")
+
+        if compress:
+            with open(backup_tmp_file, 'rb') as f_in, gzip.open(backup_tmp_file + ".gz", 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(backup_tmp_file)
+            backup_tmp_file += ".gz"
+        os.replace(backup_tmp_file, backup_file)
+    except (BackupRestartLimit, sqlite3.Error, OSError) as e:
+        logger.error(F"Error backing up database {db_file} to {backup_file}: {e}")
+        print(F"Error backing up database {db_file} to {backup_file}: {e}")
+        for tmp_file in (backup_tmp_file, backup_tmp_file + ".gz"):
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+        return False
+
+    backup_state = {'database': os.path.abspath(db_file),
+                    'backup_file': backup_file,
+                    'compressed': compress,
+                    'backup_UTC': datetime.strftime(datetime.utcnow(), "%Y-%m-%d %H:%M:%S"),
+                    'pages': backup_pages,
+                    'backup_bytes': os.path.getsize(backup_file),
+                    'db_signature': db_signature}
+    try:
+        with open(backup_state_file, 'w') as state_file:
+            json.dump(backup_state, state_file, indent=4)
+    except OSError as e:
+        # The backup is good; the next one just won't be skipped
+        logger.error(F"Error saving database backup state to {backup_state_file}: {e}")
+
+    logger.info(F"Database {db_file} backed up to {backup_file}:  {backup_pages} pages, "
+                F"{backup_state['backup_bytes']} bytes, {time.time() - backup_start:.1f} seconds")
+    print(F"Database {db_file} backed up to {backup_file}:  {backup_pages} pages, "
+          F"{backup_state['backup_bytes']} bytes, {time.time() - backup_start:.1f} seconds")
+
+    return True
+
+
+def backup_databases(backup_dir, compress=False):
+    """
+    Back up the main (catalog) database and each partition database in the catalog to the
+    passed folder.  The catalog isn't updated here, so a backup may be run alongside the
+    listener; the partition currently being written is copied consistently by backup_db.
+
+    :param backup_dir:      folder to which the backups are written
+    :param compress:        True to compress the backups (gzip)
+    :return:                True if all databases were backed up (or unchanged), else False
+    """
+
+    logger.info(F"*** Backing up ECC MQTT IoT databases to {backup_dir}, "
+                F"version {eccmqtt_iot_version}, {eccmqtt_iot_date} ***")
+    print(F"*** Backing up ECC MQTT IoT databases to {backup_dir}, "
+          F"version {eccmqtt_iot_version}, {eccmqtt_iot_date} ***")
+
+    if not os.path.isfile(ECCMQTTIoT_database):
+        logger.error(F"Database {ECCMQTTIoT_database} not found...backup not made")
+        print(F"Database {ECCMQTTIoT_database} not found...backup not made")
+        return False
+
+    try:
+        os.makedirs(backup_dir, exist_ok=True)
+    except OSError as e:
+        logger.error(F"Error creating backup folder {backup_dir}: {e}")
+        print(F"Error creating backup folder {backup_dir}: {e}")
+        return False
+
+    db_dir = os.path.dirname(os.path.abspath(ECCMQTTIoT_database))
+    backup_files = [os.path.abspath(ECCMQTTIoT_database)]
+
+    conn = create_connection(ECCMQTTIoT_database)
+    if conn is None:
+        return False
+    try:
+        for partition_name, file_name in conn.execute(F"SELECT partitionName, fileName "
+                                                      F"FROM {partition_catalog_table} ORDER BY periodStartUTC"):
+            partition_file = os.path.join(db_dir, file_name)
+            if not os.path.isfile(partition_file):
+                logger.warning(F"Partition database {partition_file} ({partition_name}) not found...skipping")
+            elif partition_file not in backup_files:
+                backup_files.append(partition_file)
+    except sqlite3.Error as e:
+        # No catalog yet (the listener hasn't been run since partitioning was added)
+        logger.warning(F"Unable to read the partition catalog: {e}...backing up the main database only")
+    conn.close()
+
+    backup_success = True
+    for db_file in backup_files:
+        if not backup_db(db_file, backup_dir, compress):
+            backup_success = False
+
+    return backup_success
 
 
 def cleanup_mqtt(mqttc):
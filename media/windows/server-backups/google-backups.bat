@@ -22,4 +22,21 @@ robocopy "C:\WinDSX" "%target%\WinSX" /mir /e /r:0 /w:0
 robocopy "C:\PDSChurch\Data" "%target%\PDSChurch\Data" /mir /e /r:0 /w:0
 robocopy "C:\PDSChurch\Backup" "%target%\PDSChurch\Backup" /mir /e /r:0 /w:0
 
-xcopy "C:\Users\coeadmin\Ubuntu1804\rootfs\home\coeadmin\git\epiphany\media\windows\ECC-Ecobee\ECCEcobee.db" "%target%\ECCEcobee" /y
+rem Copy the Ecobee database with the application's backup option (SQLite
+rem online backup), rather than xcopy, so that the copy is consistent even if
+rem a scheduled poll is writing to it.  The copy is compressed, and skipped if
+rem the database hasn't changed since the last backup.
+rem
+rem The Ecobee application (and its database) lives in WSL, so run the
+rem backup there, with WSL's python and modules: Windows python would not
+rem share SQLite's locks with the poll running in WSL.  Don't create files
+rem in the WSL rootfs from Windows; the copy and the log are written under
+rem C:\ (/mnt/c in WSL).
+set ecobee=/home/coeadmin/git/epiphany/media/windows/ECC-Ecobee
+set ecobee_logdir=C:\Users\coeadmin\logfiles
+if not exist "%ecobee_logdir%" mkdir "%ecobee_logdir%"
+wsl bash -c "cd %ecobee% && python3 'ECC Pycobee Data.py' --log-file-path /mnt/c/Users/coeadmin/logfiles/ECCEcobee-backup.log --backup-dir /mnt/c/Epiphany_backups/ECCEcobee --backup-compress"
+if %ERRORLEVEL% neq 0 (
+   echo ERROR: Ecobee database backup failed; see %ecobee_logdir%\ECCEcobee-backup.log
+   exit /b 1
+)
@@ -6,16 +6,145 @@
 
 import os
 import sys
+import json
+import hashlib
 
 import ECC
 import Google
 import GoogleAuth
 
-from apiclient.http import MediaFileUpload
+from apiclient.http import MediaIoBaseUpload
 from google.api_core import retry
 
 ###########################################################
 
+# Where we remember the MD5 checksums of local files that we have
+# already hashed (so that we don't have to re-read large, unchanged
+# media files every time we upload).
+hash_cache_filename = os.path.join(os.path.expanduser('~'), '.cache',
+                                   'ecc-upload-hashes.json')
+hash_chunk_size = 4 * 1024 * 1024
+
+class HashCache:
+    def __init__(self, filename=hash_cache_filename):
+        self.filename = filename
+        self.hashes   = dict()
+        self.dirty    = False
+
+        try:
+            with open(filename) as fp:
+                self.hashes = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    # Return the saved hex MD5 checksum of a local file, or None if we
+    # have not hashed it since its size or mtime last changed.
+    def cached(self, filename):
+        stat  = os.stat(filename)
+        entry = self.hashes.get(os.path.abspath(filename))
+        if (entry is not None and
+            entry['size'] == stat.st_size and
+            entry['mtime'] == stat.st_mtime):
+            return entry['md5']
+        return None
+
+    # Remember the hex MD5 checksum of a local file (e.g., computed
+    # while uploading it)
+    def put(self, filename, md5):
+        stat = os.stat(filename)
+        self.hashes[os.path.abspath(filename)] = {
+            'size'  : stat.st_size,
+            'mtime' : stat.st_mtime,
+            'md5'   : md5,
+        }
+        self.dirty = True
+        self.save()
+
+    # Return the hex MD5 checksum of a local file, reading the file only
+    # if we don't already have it.
+    def md5(self, filename):
+        md5 = self.cached(filename)
+        if md5 is not None:
+            return md5
+
+        # Stream the file through the hash a chunk at a time so that we
+        # don't read large media files into memory
+        md5 = hashlib.md5()
+        with open(filename, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(hash_chunk_size), b''):
+                md5.update(chunk)
+
+        self.put(filename, md5.hexdigest())
+        return md5.hexdigest()
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        # Write to a temp file and rename so that a crash doesn't leave
+        # us with a corrupt cache
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(self.hashes, fp)
+        os.replace(tmp, self.filename)
+        self.dirty = False
+
+# A read-only file for uploads that computes the MD5 checksum of the
+# file as the upload reads it, so that the file is only read once.
+# Resumable uploads read the file a chunk at a time, in order; a chunk
+# that is read again (e.g., when it is retried) is only hashed once.
+class HashingFile:
+    def __init__(self, filename):
+        self.fp     = open(filename, 'rb')
+        self.size   = os.fstat(self.fp.fileno()).st_size
+        self.hash   = hashlib.md5()
+        self.hashed = 0
+
+    def read(self, size=-1):
+        offset = self.fp.tell()
+        data   = self.fp.read(size)
+        if offset == self.hashed:
+            self.hash.update(data)
+            self.hashed += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.fp.seek(offset, whence)
+
+    def tell(self):
+        return self.fp.tell()
+
+    def close(self):
+        self.fp.close()
+
+    # The hex MD5 checksum of the file, or None if the upload did not
+    # read the whole file from the beginning
+    def md5(self):
+        if self.hashed != self.size:
+            return None
+        return self.hash.hexdigest()
+
+# After an upload, remember the MD5 checksum computed while uploading,
+# and check it against the one Google computed.
+def check_uploaded_md5(filename, content, google_md5, hash_cache, log):
+    md5 = content.md5()
+    if md5 is None:
+        return
+
+    if hash_cache is not None:
+        hash_cache.put(filename, md5)
+
+    if google_md5 is not None and google_md5 != md5:
+        log.error(f'MD5 checksum of uploaded file "{filename}" does not match: local {md5}, Google {google_md5}')
+        raise Exception(f'Uploaded file "{filename}" is corrupt in Google Drive')
+
+# Escape a string for use inside single quotes in a Drive "q" query
+def drive_query_escape(value):
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+###########################################################
+
 def setup_services(app_json, user_json, log):
     # Note: these logins have been configured on the Google cloud
     # console to only allow logins with @epiphanycatholicchurch.org
@@ -51,9 +180,50 @@ def verify_target_google_folder(service, folder_id, log):
 
 ###########################################################
 
-def upload_to_google(service, filename, filetype, folder_id, log):
+# Return the Drive file in folder_id with the same name and MD5
+# checksum as this local file, or None if there isn't one.  The local
+# file is only hashed here if there is a file with the same name (and
+# its hash is not cached); otherwise, it will be hashed as it is
+# uploaded.
+def find_identical_file(service, filename, folder_id, hash_cache, log):
+    name = drive_query_escape(filename)
+    query = f"'{folder_id}' in parents and name='{name}' and trashed=false"
+    http = service.files().list(q=query,
+                                fields='files(id,name,md5Checksum)',
+                                supportsTeamDrives=True,
+                                includeTeamDriveItems=True)
+    response = Google.call_api(http, log=log)
+    if response is None:
+        return None
+
+    files = response.get('files', [])
+    if len(files) == 0:
+        return None
+
+    md5 = hash_cache.md5(filename)
+    for file in files:
+        if file.get('md5Checksum') == md5:
+            return file
+
+    return None
+
+###########################################################
+
+# If a HashCache is passed in, we're in dedupe mode: don't upload the
+# file if there is already a file with the same name and content in the
+# target folder.
+def upload_to_google(service, filename, filetype, folder_id, log,
+                     hash_cache=None):
 
     try:
+        if hash_cache is not None:
+            existing = find_identical_file(service, filename, folder_id,
+                                           hash_cache, log)
+            if existing:
+                log.info('File already in Google with identical contents; skipping upload: "{filename}" (ID: {id})'
+                         .format(filename=filename, id=existing['id']))
+                return existing['id']
+
         log.info('Uploading file to google "{file}"'
                  .format(file=filename))
         metadata = {
@@ -62,18 +232,25 @@ def upload_to_google(service, filename, filetype, folder_id, log):
             'parents'  : [ folder_id ],
             'supportsTeamDrives' : True,
         }
-        media = MediaFileUpload(filename,
-                                mimetype=Google.mime_types[filetype],
-                                resumable=True)
-        http = service.files().create(body=metadata,
-                                      media_body=media,
-                                      supportsTeamDrives=True,
-                                      fields='id')
-        response = Google.call_api(http, log)
+        content = HashingFile(filename)
+        try:
+            media = MediaIoBaseUpload(content,
+                                      mimetype=Google.mime_types[filetype],
+                                      resumable=True)
+            http = service.files().create(body=metadata,
+                                          media_body=media,
+                                          supportsTeamDrives=True,
+                                          fields='id,md5Checksum')
+            response = Google.call_api(http, log)
+        finally:
+            content.close()
+
+        check_uploaded_md5(filename, content, response.get('md5Checksum'),
+                           hash_cache, log)
 
         log.info('Successfully uploaded file: "{filename}" (ID: {id})'
                  .format(filename=filename, id=response['id']))
-        return
+        return response['id']
 
     except Exception as e:
         log.error('Google upload failed for some reason:')
@@ -83,4 +260,4 @@ def upload_to_google(service, filename, filetype, folder_id, log):
     log.error("Google upload failed!")
 
 
-###########################################################
\ No newline at end of file
+###########################################################
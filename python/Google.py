@@ -8,7 +8,13 @@
 # pip3 install --upgrade google-api-python-client oauth2client
 #
 
+import os
+import json
 import time
+import atexit
+import threading
+import collections
+import concurrent.futures
 
 import httplib2
 import requests
@@ -88,35 +94,438 @@ retry_errors = retry.if_exception_type(
     HttpError,
 )
 
+####################################################################
+#
+# Instrumentation of call_api().
+#
+# Every Google API call made through call_api() is counted here, per
+# API and per method (e.g., "drive" / "files.list"), along with a
+# latency histogram, how many times the call was retried, and how much
+# wall-clock time was spent sleeping between retries.  The registry
+# lives in-process; dump it at the end of a script with
+# dump_api_metrics() (JSON or Prometheus text format).
+#
+# If the ECC_GOOGLE_API_METRICS environment variable is set to a
+# filename, the metrics are automatically written to that file when
+# the script exits.  Filenames ending in ".prom" get Prometheus text
+# format; everything else gets JSON.
+#
+####################################################################
+
+# Upper bounds (in seconds) of the latency histogram buckets
+latency_buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class ApiMetrics:
+    def __init__(self, buckets=latency_buckets):
+        self.buckets = tuple(buckets)
+        self.lock    = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.methods = dict()
+
+    def _entry(self, api, method):
+        key = (api, method)
+        if key not in self.methods:
+            self.methods[key] = {
+                'calls'          : 0,
+                'attempts'       : 0,
+                'ok'             : 0,
+                'forbidden'      : 0,
+                'rate_limited'   : 0,
+                'errors'         : 0,
+                'retries'        : 0,
+                'backoffs'       : 0,
+                'sleep_seconds'  : 0.0,
+                'throttled'      : 0,
+                'throttle_seconds' : 0.0,
+                'latency_sum'    : 0.0,
+                'latency_counts' : [0] * (len(self.buckets) + 1),
+            }
+        return self.methods[key]
+
+    def record_call(self, api, method):
+        with self.lock:
+            self._entry(api, method)['calls'] += 1
+
+    # Record a single execute() of the underlying HTTP request.
+    # "outcome" is one of "ok", "forbidden", "rate_limited", or "errors".
+    def record_attempt(self, api, method, seconds, outcome):
+        with self.lock:
+            entry = self._entry(api, method)
+            entry['attempts']    += 1
+            entry[outcome]       += 1
+            entry['latency_sum'] += seconds
+
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    index = i
+                    break
+            entry['latency_counts'][index] += 1
+
+    # A retry is any attempt after the first for a single call_api()
+    def record_retry(self, api, method):
+        with self.lock:
+            self._entry(api, method)['retries'] += 1
+
+    # A backoff is a sleep before retrying
+    def record_backoff(self, api, method, seconds, count=1):
+        with self.lock:
+            entry = self._entry(api, method)
+            entry['backoffs']      += count
+            entry['sleep_seconds'] += seconds
+
+    # Time spent waiting on the rate limiter before an attempt
+    def record_throttle(self, api, method, seconds):
+        with self.lock:
+            entry = self._entry(api, method)
+            entry['throttled']        += 1
+            entry['throttle_seconds'] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            out = dict()
+            for (api, method), entry in sorted(self.methods.items()):
+                data = dict(entry)
+
+                # Present the histogram cumulatively, Prometheus-style
+                cumulative = dict()
+                total      = 0
+                for i, count in enumerate(entry['latency_counts']):
+                    total += count
+                    bound  = self.buckets[i] if i < len(self.buckets) else '+Inf'
+                    cumulative[str(bound)] = total
+                data['latency_counts'] = cumulative
+
+                if api not in out:
+                    out[api] = dict()
+                out[api][method] = data
+
+            return out
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=4)
+
+    def to_prometheus(self):
+        counters = {
+            'calls'     : 'Number of call_api() invocations',
+            'attempts'  : 'Number of HTTP requests executed',
+            'ok'        : 'Number of successful HTTP requests',
+            'forbidden' : 'Number of HTTP requests that returned 403',
+            'rate_limited' : 'Number of HTTP requests rejected for exceeding quota',
+            'errors'    : 'Number of HTTP requests that raised an error',
+            'retries'   : 'Number of retried HTTP requests',
+            'backoffs'  : 'Number of retries that slept first',
+            'throttled' : 'Number of HTTP requests delayed by the rate limiter',
+        }
+
+        snapshot = self.snapshot()
+        lines    = list()
+
+        def _label(api, method, extra=''):
+            return f'{{api="{api}",method="{method}"{extra}}}'
+
+        for name, help in counters.items():
+            metric = f'google_api_{name}_total'
+            lines.append(f'# HELP {metric} {help}')
+            lines.append(f'# TYPE {metric} counter')
+            for api, methods in snapshot.items():
+                for method, data in methods.items():
+                    lines.append(f'{metric}{_label(api, method)} {data[name]}')
+
+        metric = 'google_api_sleep_seconds_total'
+        lines.append(f'# HELP {metric} Seconds spent sleeping between retries')
+        lines.append(f'# TYPE {metric} counter')
+        for api, methods in snapshot.items():
+            for method, data in methods.items():
+                lines.append(f'{metric}{_label(api, method)} {data["sleep_seconds"]:.6f}')
+
+        metric = 'google_api_throttle_seconds_total'
+        lines.append(f'# HELP {metric} Seconds spent waiting on the rate limiter')
+        lines.append(f'# TYPE {metric} counter')
+        for api, methods in snapshot.items():
+            for method, data in methods.items():
+                lines.append(f'{metric}{_label(api, method)} {data["throttle_seconds"]:.6f}')
+
+        metric = 'google_api_latency_seconds'
+        lines.append(f'# HELP {metric} Latency of each HTTP request')
+        lines.append(f'# TYPE {metric} histogram')
+        for api, methods in snapshot.items():
+            for method, data in methods.items():
+                for bound, count in data['latency_counts'].items():
+                    le = f',le="{bound}"'
+                    lines.append(f'{metric}_bucket{_label(api, method, le)} {count}')
+                lines.append(f'{metric}_sum{_label(api, method)} {data["latency_sum"]:.6f}')
+                lines.append(f'{metric}_count{_label(api, method)} {data["attempts"]}')
+
+        return '\n'.join(lines) + '\n'
+
+api_metrics = ApiMetrics()
+
+# Write the metrics to a file.  Filenames ending in ".prom" get
+# Prometheus text format; everything else gets JSON.
+def dump_api_metrics(filename, log=None):
+    if filename.endswith('.prom'):
+        content = api_metrics.to_prometheus()
+    else:
+        content = api_metrics.to_json()
+
+    with open(filename, 'w') as fp:
+        fp.write(content)
+
+    if log:
+        log.info(f"Wrote Google API metrics to {filename}")
+
+_metrics_env_filename = os.environ.get('ECC_GOOGLE_API_METRICS')
+if _metrics_env_filename:
+    atexit.register(dump_api_metrics, _metrics_env_filename)
+
+# googleapiclient HttpRequest objects carry a methodId of the form
+# "drive.files.list".  Split that into the API name and the method.
+def _api_method(httpref):
+    method_id = getattr(httpref, 'methodId', None)
+    if not method_id:
+        return 'unknown', 'unknown'
+
+    parts = method_id.split('.', 1)
+    if len(parts) == 1:
+        return parts[0], 'unknown'
+    return parts[0], parts[1]
+
+####################################################################
+#
+# Adaptive rate limiting of call_api().
+#
+# Each (API, user) pair gets its own token bucket.  Every HTTP attempt
+# made by call_api() first takes a token from the bucket, waiting if
+# the bucket is empty.  The refill rate adapts AIMD-style (like TCP
+# congestion control): a quota error (429, or 403 with a rate limit
+# reason) cuts the rate in half and empties the bucket; each success
+# adds a little back, up to a ceiling.  Concurrent threads calling
+# call_api() with the same API and user therefore share (and back off
+# on) the same quota instead of all stampeding into it.
+#
+####################################################################
+
+# HttpError reasons that Google uses for quota violations
+rate_limit_reasons = [
+    'rateLimitExceeded',
+    'userRateLimitExceeded',
+    'quotaExceeded',
+]
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate=10.0, min_rate=0.2, max_rate=50.0,
+                 increase=0.5, decrease=0.5):
+        self.rate     = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+
+        self.lock     = threading.Lock()
+        self.tokens   = self._capacity()
+        self.last     = time.monotonic()
+
+    # Allow a burst of up to one second's worth of calls
+    def _capacity(self):
+        return max(1.0, self.rate)
+
+    def _refill(self, now):
+        elapsed     = now - self.last
+        self.last   = now
+        self.tokens = min(self._capacity(), self.tokens + elapsed * self.rate)
+
+    # Take a token, sleeping until one is available.  Returns the
+    # number of seconds spent waiting.
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+
+            # Sleep outside the lock so that other threads can refill /
+            # adjust the rate in the meantime
+            time.sleep(delay)
+            waited += delay
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_rate_limited(self):
+        with self.lock:
+            self.rate   = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = 0.0
+
+# Default settings for newly-created limiters; scripts can change
+# these before making any API calls.
+rate_limiter_defaults = {
+    'rate'     : 10.0,
+    'min_rate' : 0.2,
+    'max_rate' : 50.0,
+    'increase' : 0.5,
+    'decrease' : 0.5,
+}
+
+_rate_limiters      = dict()
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(api, user='default'):
+    key = (api, user)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = AdaptiveRateLimiter(**rate_limiter_defaults)
+        return _rate_limiters[key]
+
+def _is_rate_limit_error(err):
+    status = err.resp.status
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+
+    details = getattr(err, 'error_details', None)
+    if isinstance(details, list):
+        for detail in details:
+            if isinstance(detail, dict) and detail.get('reason') in rate_limit_reasons:
+                return True
+
+    # Fall back to looking in the raw response content (which may be
+    # bytes, str, or missing)
+    content = err.content or b''
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+    elif not isinstance(content, str):
+        content = str(content)
+    for reason in rate_limit_reasons:
+        if reason in content:
+            return True
+
+    return False
+
+# GoogleAuth tags the authorized HTTP object with the user credentials
+# filename; use that to keep different users' quotas separate.
+def _api_user(httpref):
+    http = getattr(httpref, 'http', None)
+    return getattr(http, 'ecc_user', 'default')
+
+# State for the call_api() that is currently running in this thread
+_call_state = threading.local()
+
+# Invoked by retry.Retry each time it is about to sleep and retry
+def _on_retry_error(exc):
+    api    = getattr(_call_state, 'api', 'unknown')
+    method = getattr(_call_state, 'method', 'unknown')
+    _call_state.retry_errors = getattr(_call_state, 'retry_errors', 0) + 1
+    api_metrics.record_retry(api, method)
+
+####################################################################
+
 # Make a Google API call.  If it fails, try again.
 #
-@retry.Retry(predicate=retry_errors)
-def call_api(httpref, log, max_retries=3, can_fail=False):
+# We retry in two layers: the google.api_core Retry decorator (with
+# its exponential backoff) around _call_api(), and the loop inside
+# _call_api() for HTTP 500 / 503 and quota errors.  Both are recorded
+# in api_metrics.  Each attempt is paced by the (API, user) rate
+# limiter.
+#
+def call_api(httpref, log, max_retries=3, can_fail=False, user=None):
+    api, method = _api_method(httpref)
+    api_metrics.record_call(api, method)
+
+    if user is None:
+        user = _api_user(httpref)
+
+    _call_state.api           = api
+    _call_state.method        = method
+    _call_state.limiter       = get_rate_limiter(api, user)
+    _call_state.inner_seconds = 0.0
+    _call_state.retry_errors  = 0
+
+    start = time.monotonic()
+    try:
+        return _call_api(httpref, log, max_retries, can_fail)
+    finally:
+        # Whatever time was not spent inside _call_api() was spent
+        # sleeping in the api_core Retry backoff.
+        if _call_state.retry_errors > 0:
+            elapsed = time.monotonic() - start
+            slept   = max(0.0, elapsed - _call_state.inner_seconds)
+            api_metrics.record_backoff(api, method, slept,
+                                       count=_call_state.retry_errors)
+
+@retry.Retry(predicate=retry_errors, on_error=_on_retry_error)
+def _call_api(httpref, log, max_retries, can_fail):
+    api     = _call_state.api
+    method  = _call_state.method
+    limiter = _call_state.limiter
+
     log.debug("Executing Google API call (will try up to {count} times): {h}"
               .format(count=max_retries, h=httpref))
 
     for count in range(max_retries):
+        if count > 0:
+            api_metrics.record_retry(api, method)
+
+        waited = limiter.acquire()
+        if waited > 0:
+            _call_state.inner_seconds += waited
+            api_metrics.record_throttle(api, method, waited)
+
+        start = time.monotonic()
         try:
             ret = httpref.execute()
+            elapsed = time.monotonic() - start
+            _call_state.inner_seconds += elapsed
+            api_metrics.record_attempt(api, method, elapsed, 'ok')
+            limiter.on_success()
             return ret
 
         except HttpError as err:
+            elapsed = time.monotonic() - start
+            _call_state.inner_seconds += elapsed
+
             log.debug("*** Got HttpError:")
             log.debug(pformat(err))
-            if err.resp.status in [500, 503]:
+            if _is_rate_limit_error(err):
+                # The limiter will pace the next attempt.  If we're out
+                # of attempts, let the api_core Retry take over.
+                api_metrics.record_attempt(api, method, elapsed, 'rate_limited')
+                log.debug("*** Quota exceeded; slowing down and trying again...")
+                limiter.on_rate_limited()
+                if count < max_retries - 1:
+                    continue
+                raise
+            elif err.resp.status in [500, 503]:
+                api_metrics.record_attempt(api, method, elapsed, 'errors')
                 log.debug("*** Seems recoverable; let's sleep and try again...")
                 time.sleep(5)
+                _call_state.inner_seconds += 5
+                api_metrics.record_backoff(api, method, 5)
                 continue
             elif err.resp.status == 403:
+                api_metrics.record_attempt(api, method, elapsed, 'forbidden')
                 log.debug("*** Permission denied, but that's ok -- we'll skip it for now...")
                 return None
             else:
+                api_metrics.record_attempt(api, method, elapsed, 'errors')
                 log.debug("*** Doesn't seem recoverable (status {0}) -- aborting"
                           .format(err.resp.status))
                 log.debug(err)
                 raise
 
         except Exception as e:
+            elapsed = time.monotonic() - start
+            _call_state.inner_seconds += elapsed
+            api_metrics.record_attempt(api, method, elapsed, 'errors')
+
             log.error("*** Some unknown error occurred")
             log.error(e)
             raise
@@ -125,3 +534,107 @@ def call_api(httpref, log, max_retries=3, can_fail=False):
     log.error("Error: we failed this API call {count} times; there's no reason to believe it'll work if we do it again..."
               .format(count=max_retries))
     exit(1)
+
+####################################################################
+#
+# Breadth-first walk of a Google Drive folder tree.
+#
+# Rather than issuing one blocking files().list per folder, this:
+#
+# - keeps a FIFO queue of folders that still need to be listed
+# - lists up to parents_per_query folders in a single query (i.e.,
+#   "'a' in parents or 'b' in parents or ...")
+# - runs up to max_workers of those queries concurrently (each in its
+#   own thread with its own HTTP object; all are paced by the
+#   call_api() rate limiter)
+# - requests the next page of a query as soon as the current page
+#   arrives, before the current page is processed
+# - only asks Google for the file fields that the caller needs
+#
+# For each file found, visit(parent_id, file) is invoked, where file
+# is the dictionary from Google (with the fields from file_fields).  A
+# file with multiple parents in the tree is visited once per parent.
+# If visit() returns True for a folder, that folder is queued to be
+# listed, too.  visit() is only ever invoked from the calling thread,
+# so it does not need to be thread safe.
+#
+# list_kwargs are passed to files().list() (e.g., corpora,
+# supportsAllDrives, etc.).
+#
+####################################################################
+
+def walk_drive_tree(service, root_ids, visit, log,
+                    file_fields='id,name,mimeType,parents',
+                    list_kwargs=None, extra_query='trashed=false',
+                    max_workers=4, parents_per_query=10, page_size=1000):
+    # We need these fields to be able to walk the tree
+    fields = file_fields.split(',')
+    for required in ['id', 'mimeType', 'parents']:
+        if required not in fields:
+            fields.append(required)
+    fields = f"nextPageToken,files({','.join(fields)})"
+
+    if list_kwargs is None:
+        list_kwargs = dict()
+
+    # Import here to avoid a circular import
+    import GoogleAuth
+
+    def _list_page(folder_ids, page_token):
+        parents = ' or '.join([f"'{id}' in parents" for id in folder_ids])
+        query   = f"({parents})"
+        if extra_query:
+            query += f" and {extra_query}"
+
+        request = service.files().list(q=query,
+                                       fields=fields,
+                                       pageSize=page_size,
+                                       pageToken=page_token,
+                                       **list_kwargs)
+        request.http = GoogleAuth.thread_http(service)
+        response = call_api(request, log=log)
+        if response is None:
+            log.error(f"Permission denied listing folders: {folder_ids}")
+            response = dict()
+
+        return response
+
+    queue   = collections.deque(root_ids)
+    pending = dict()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def _submit(folder_ids, page_token=None):
+            log.debug(f"Listing contents of folders: {folder_ids}")
+            future = executor.submit(_list_page, folder_ids, page_token)
+            pending[future] = folder_ids
+
+        def _fill():
+            while queue and len(pending) < max_workers:
+                batch = list()
+                while queue and len(batch) < parents_per_query:
+                    batch.append(queue.popleft())
+                _submit(batch)
+
+        _fill()
+        while pending:
+            done, _ = concurrent.futures.wait(pending,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                folder_ids = pending.pop(future)
+                response   = future.result()
+
+                # Prefetch the next page before we process this one
+                page_token = response.get('nextPageToken', None)
+                if page_token:
+                    _submit(folder_ids, page_token)
+
+                batch = set(folder_ids)
+                for file in response.get('files', []):
+                    for parent_id in file.get('parents', []):
+                        if parent_id not in batch:
+                            continue
+
+                        traverse = visit(parent_id, file)
+                        if traverse and file['mimeType'] == mime_types['folder']:
+                            queue.append(file['id'])
+
+            _fill()
@@ -19,8 +19,11 @@ import os
 import json
 import time
 import httplib2
+import threading
 
-from googleapiclient.discovery import build
+from googleapiclient.discovery import DISCOVERY_URI
+from googleapiclient.discovery import V2_DISCOVERY_URI
+from googleapiclient.discovery import build_from_document
 from oauth2client import tools
 from oauth2client.file import Storage
 from oauth2client.client import AccessTokenRefreshError
@@ -33,12 +36,35 @@ app_cred_file = 'client_id.json'
 default_user_cred_file = 'user_credentials.json'
 user_agent = 'gxcopy'
 
+# Google API discovery documents are cached here (one JSON file per
+# API / version) so that building a service does not need a network
+# round trip.  Cached documents older than discovery_cache_max_age
+# seconds are re-fetched.
+discovery_cache_dir     = os.path.join(os.path.expanduser('~'), '.cache',
+                                       'ecc-google-discovery')
+discovery_cache_max_age = 7 * 24 * 60 * 60
+
+# If True, prefer the discovery documents that are bundled with the
+# googleapiclient module (i.e., googleapiclient's "static discovery").
+static_discovery = True
+
+# Per-process memoization of credentials, authorized HTTP objects, and
+# service objects
+_app_creds     = dict()
+_user_creds    = dict()
+_authed_https  = dict()
+_services      = dict()
+_thread_local  = threading.local()
+
 #-------------------------------------------------------------------
 
 def _load_app_credentials(app_cred_file, log=None):
     # Read in the JSON file to get the client ID and client secret
     cwd  = os.getcwd()
     file = os.path.join(cwd, app_cred_file)
+    if file in _app_creds:
+        return _app_creds[file]
+
     if not os.path.isfile(file):
         log.error("Error: JSON file {0} does not exist".format(file))
         exit(1)
@@ -48,6 +74,7 @@ def _load_app_credentials(app_cred_file, log=None):
 
     with open(file) as data_file:
         app_cred = json.load(data_file)
+    _app_creds[file] = app_cred
 
     if log:
         log.debug('Loaded application credentials from {0}'
@@ -57,6 +84,10 @@ def _load_app_credentials(app_cred_file, log=None):
 
 def _load_user_credentials(scopes, app_cred,
                            user_cred_file=default_user_cred_file, log=None):
+    key = (os.path.abspath(user_cred_file), tuple(sorted(scopes)))
+    if key in _user_creds and not _user_creds[key].invalid:
+        return _user_creds[key]
+
     # Get user consent
     client_id       = app_cred['installed']['client_id']
     client_secret   = app_cred['installed']['client_secret']
@@ -73,6 +104,7 @@ def _load_user_credentials(scopes, app_cred,
     if user_cred is None or user_cred.invalid:
         user_cred = tools.run_flow(flow, storage,
                                    tools.argparser.parse_args())
+    _user_creds[key] = user_cred
 
     if log:
         log.debug('Loaded user credentials from {0}'
@@ -80,10 +112,77 @@ def _load_user_credentials(scopes, app_cred,
 
     return user_cred
 
-def _authorize_user(user_cred, name, version, log=None):
-    http    = httplib2.Http()
-    http    = user_cred.authorize(http)
-    service = build(name, version, http=http)
+def _discovery_cache_filename(name, version):
+    return os.path.join(discovery_cache_dir, f'{name}.{version}.json')
+
+def _fetch_discovery_document(name, version, log=None):
+    http = httplib2.Http()
+    for uri in [DISCOVERY_URI, V2_DISCOVERY_URI]:
+        uri = uri.replace('{api}', name).replace('{apiVersion}', version)
+        resp, content = http.request(uri)
+        if resp.status < 400:
+            if log:
+                log.debug(f'Fetched discovery document from {uri}')
+            return content.decode('utf-8')
+
+    raise Exception(f'Unable to fetch discovery document for {name} / {version}')
+
+# Return the discovery document for an API / version.  Look (in order)
+# in the documents bundled with googleapiclient, then in our on-disk
+# cache, and only then go to the network (and save the result in the
+# on-disk cache for next time).
+def _discovery_document(name, version, log=None):
+    if static_discovery:
+        from googleapiclient.discovery_cache import get_static_doc
+        doc = get_static_doc(name, version)
+        if doc:
+            return doc
+
+    filename = _discovery_cache_filename(name, version)
+    if os.path.exists(filename):
+        age = time.time() - os.path.getmtime(filename)
+        if age < discovery_cache_max_age:
+            with open(filename) as fp:
+                return fp.read()
+
+    doc = _fetch_discovery_document(name, version, log=log)
+
+    # Write to a temp file and rename so that concurrent scripts never
+    # see a partially-written document.
+    os.makedirs(discovery_cache_dir, exist_ok=True)
+    tmp = f'{filename}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as fp:
+        fp.write(doc)
+    os.replace(tmp, filename)
+
+    return doc
+
+# Build a service object from the (cached) discovery document
+def _build(name, version, http=None, developerKey=None, log=None):
+    doc = _discovery_document(name, version, log=log)
+    return build_from_document(doc, http=http, developerKey=developerKey)
+
+def _authorize_user(user_cred, name, version, user_cred_file=None, log=None):
+    # Re-use the same authorized HTTP object for all services of the
+    # same user
+    http_key = id(user_cred)
+    if http_key not in _authed_https:
+        http = httplib2.Http()
+        http = user_cred.authorize(http)
+
+        # Google.call_api() uses this to rate limit each user separately
+        if user_cred_file:
+            http.ecc_user = user_cred_file
+
+        _authed_https[http_key] = http
+    http = _authed_https[http_key]
+
+    service_key = (http_key, name, version)
+    if service_key in _services:
+        return _services[service_key]
+
+    service = _build(name, version, http=http, log=log)
+    _services[service_key] = service
 
     if log:
         log.info('OAuth authorized to Google: {name} / {version}'
@@ -130,7 +229,9 @@ def service_oauth_login(apis, app_json, user_json,
             services  = dict()
             for name, data in apis.items():
                 services[name] = _authorize_user(user_cred, data['api_name'],
-                                                 data['api_version'], log=log)
+                                                 data['api_version'],
+                                                 user_cred_file=user_json,
+                                                 log=log)
             happy = True
             break
 
@@ -140,6 +241,11 @@ def service_oauth_login(apis, app_json, user_json,
             # expired.
             log.error("Failed to authenticate to Google (will sleep and try again)")
 
+            # Forget anything we memoized so that we start from scratch
+            _user_creds.clear()
+            _authed_https.clear()
+            _services.clear()
+
             # Delay a little and try to authenticate again
             time.sleep(10)
 
@@ -151,6 +257,28 @@ def service_oauth_login(apis, app_json, user_json,
 
     return services
 
+#-------------------------------------------------------------------
+
+# The httplib2.Http object inside a service object is not thread
+# safe, so threads must not share it.  Return an authorized HTTP
+# object for the same user as the service, but private to the calling
+# thread.  Use it via "request.http = GoogleAuth.thread_http(service)"
+# before executing a request in a worker thread.
+def thread_http(service):
+    if not hasattr(_thread_local, 'https'):
+        _thread_local.https = dict()
+
+    shared = service._http
+    key    = id(shared)
+    if key not in _thread_local.https:
+        credentials = shared.request.credentials
+        http        = credentials.authorize(httplib2.Http())
+        if hasattr(shared, 'ecc_user'):
+            http.ecc_user = shared.ecc_user
+        _thread_local.https[key] = http
+
+    return _thread_local.https[key]
+
 #===================================================================
 
 def service_api_key(api_name, api_version, api_key_filename, log=None):
@@ -166,7 +294,7 @@ def service_api_key(api_name, api_version, api_key_filename, log=None):
         log.info("Got key: {key}".format(key=key))
 
     # JMS Do we need to give http to service?
-    service = build(api_name, api_version, developerKey=key)
+    service = _build(api_name, api_version, developerKey=key, log=log)
 
     if log:
         log.info('API key authorized to Google: {name} / {version}'
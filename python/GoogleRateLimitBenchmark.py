@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+#
+# Benchmark the adaptive rate limiter in Google.call_api() against a
+# local fake HTTP transport, without talking to Google.
+#
+# QuotaFakeHttp stands in for the authorized httplib2.Http object (in
+# the style of googleapiclient.http.HttpMock): it answers every request
+# itself, and rejects requests above a fixed number per second with a
+# quota error -- either 429 or 403 with a userRateLimitExceeded reason,
+# as Google does.  Real googleapiclient HttpRequest objects are executed
+# through call_api() from a pool of threads, first with the limiter and
+# then with a pass-through limiter, and the achieved throughput and
+# quota error rate are reported for each.
+#
+# Usage (from this folder):
+#     python3 GoogleRateLimitBenchmark.py --calls 200 --threads 8 --quota 20
+#     python3 GoogleRateLimitBenchmark.py --error 403 --json results.json
+#
+
+import json
+import time
+import logging
+import argparse
+import threading
+import collections
+import concurrent.futures
+
+import httplib2
+
+from googleapiclient.http import HttpRequest
+from googleapiclient.model import JsonModel
+
+import Google
+
+#-------------------------------------------------------------------
+
+# Quota error bodies, as returned by the Drive API
+quota_error_content = {
+    429 : {
+        'error' : {
+            'code'    : 429,
+            'message' : 'Rate Limit Exceeded',
+            'errors'  : [ { 'domain'  : 'usageLimits',
+                            'reason'  : 'rateLimitExceeded',
+                            'message' : 'Rate Limit Exceeded' } ],
+        }
+    },
+    403 : {
+        'error' : {
+            'code'    : 403,
+            'message' : 'User rate limit exceeded.',
+            'errors'  : [ { 'domain'  : 'usageLimits',
+                            'reason'  : 'userRateLimitExceeded',
+                            'message' : 'User rate limit exceeded.' } ],
+        }
+    },
+}
+
+class QuotaFakeHttp:
+    def __init__(self, quota, latency, error_status):
+        self.quota        = quota
+        self.latency      = latency
+        self.error_status = error_status
+        self.ecc_user     = 'benchmark'
+
+        self.lock         = threading.Lock()
+        self.accepted     = collections.deque()
+        self.requests     = 0
+        self.rejected     = 0
+
+    # Same signature as httplib2.Http.request()
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=1, connection_type=None):
+        time.sleep(self.latency)
+
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+
+            # Allow "quota" requests in any one-second window
+            while self.accepted and now - self.accepted[0] >= 1.0:
+                self.accepted.popleft()
+            if len(self.accepted) >= self.quota:
+                self.rejected += 1
+                status  = self.error_status
+                content = quota_error_content[status]
+            else:
+                self.accepted.append(now)
+                status  = 200
+                content = { 'files' : [] }
+
+        response = httplib2.Response({ 'status' : status,
+                                       'content-type' : 'application/json' })
+        return response, json.dumps(content).encode('utf-8')
+
+# Stands in for the limiter, to measure call_api() without it
+class PassThroughLimiter:
+    def acquire(self):
+        return 0.0
+
+    def on_success(self):
+        pass
+
+    def on_rate_limited(self):
+        pass
+
+#-------------------------------------------------------------------
+
+def run(args, log, use_limiter):
+    http = QuotaFakeHttp(args.quota, args.latency, args.error)
+
+    # Start each run with a new limiter and new metrics
+    Google._rate_limiters.clear()
+    Google.api_metrics = Google.ApiMetrics()
+    if use_limiter:
+        get_rate_limiter = Google.get_rate_limiter
+    else:
+        passthrough = PassThroughLimiter()
+        get_rate_limiter = lambda api, user='default': passthrough
+
+    def one_call(i):
+        httpref = HttpRequest(http, JsonModel().response,
+                              f'https://www.googleapis.com/drive/v3/files?q={i}',
+                              method='GET', methodId='drive.files.list')
+        try:
+            Google.call_api(httpref, log)
+            return True
+        except Exception:
+            return False
+
+    saved = Google.get_rate_limiter
+    Google.get_rate_limiter = get_rate_limiter
+    try:
+        start = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = list(executor.map(one_call, range(args.calls)))
+        elapsed = time.monotonic() - start
+    finally:
+        Google.get_rate_limiter = saved
+
+    ok = results.count(True)
+    return {
+        'limiter'        : use_limiter,
+        'calls'          : args.calls,
+        'succeeded'      : ok,
+        'failed'         : args.calls - ok,
+        'requests'       : http.requests,
+        'quota_errors'   : http.rejected,
+        'error_rate'     : round(http.rejected / http.requests, 4) if http.requests else 0.0,
+        'elapsed_secs'   : round(elapsed, 3),
+        'achieved_rps'   : round(ok / elapsed, 2) if elapsed > 0 else None,
+    }
+
+def print_result(result):
+    label = 'with limiter' if result['limiter'] else 'without limiter'
+    print(f"{label:>16}: {result['achieved_rps']:7.2f} calls/s achieved, "
+          f"{result['requests']:5} requests, "
+          f"{result['quota_errors']:5} quota errors ({result['error_rate'] * 100:5.1f}%), "
+          f"{result['failed']} calls failed, "
+          f"{result['elapsed_secs']:.1f} seconds")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Google.call_api() rate limiter against a fake transport')
+    parser.add_argument('--calls', type=int, default=200,
+                        help='Number of API calls to make')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Number of threads making calls concurrently')
+    parser.add_argument('--quota', type=int, default=20,
+                        help='Requests per second the fake transport accepts')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Seconds the fake transport takes per request')
+    parser.add_argument('--error', type=int, default=429, choices=[429, 403],
+                        help='HTTP status of the quota errors returned')
+    parser.add_argument('--no-compare', action='store_true',
+                        help='Only run with the limiter, not also without it')
+    parser.add_argument('--json', default=None,
+                        help='Also write the results to this JSON filename')
+    args = parser.parse_args()
+
+    # call_api() logs every retry at debug level; keep the output quiet
+    log = logging.getLogger('GoogleRateLimitBenchmark')
+    log.addHandler(logging.NullHandler())
+    log.propagate = False
+
+    print(f"Fake transport: {args.quota} requests/s quota, "
+          f"{args.error} quota errors, {args.latency * 1000:.0f} ms latency")
+    print(f"Calls: {args.calls} from {args.threads} threads")
+
+    results = [run(args, log, use_limiter=True)]
+    print_result(results[0])
+    if not args.no_compare:
+        results.append(run(args, log, use_limiter=False))
+        print_result(results[1])
+
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump({ 'options' : vars(args), 'results' : results }, fp, indent=4)
+        print(f"Results written to {args.json}")
+
+if __name__ == '__main__':
+    main()